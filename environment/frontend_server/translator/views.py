@@ -235,17 +235,28 @@ def replay_persona_state(request, sim_code, step, persona_name):
     with open(memory + "/spatial_memory.json") as json_file:  
         spatial = json.load(json_file)
 
-    with open(memory + "/associative_memory/nodes.json") as json_file:  
-        associative = json.load(json_file)
+    # Memories saved by the backend are an append-only log, one node per
+    # line; older ones are a single nodes.json.
+    if os.path.exists(memory + "/associative_memory/nodes.jsonl"): 
+        associative = dict()
+        with open(memory + "/associative_memory/nodes.jsonl") as log_file: 
+            for line in log_file: 
+                if not line.endswith("\n"): 
+                    break
+                node_details = json.loads(line)
+                associative[node_details["node_id"]] = node_details
+    else: 
+        with open(memory + "/associative_memory/nodes.json") as json_file:  
+            associative = json.load(json_file)
 
     a_mem_event = []
     a_mem_chat = []
     a_mem_thought = []
 
-    for count in range(len(associative.keys()), 0, -1): 
-        node_id = f"node_{str(count)}"
-        node_details = associative[node_id]
-
+    # Newest first. Forgotten nodes leave gaps in the node numbers.
+    for node_details in sorted(associative.values(), 
+                               key=lambda node: node["node_count"], 
+                               reverse=True): 
         if node_details["type"] == "event":
             a_mem_event += [node_details]
 
@@ -0,0 +1,139 @@
+"""
+Indexed priority queue for the ED's patient queues.
+
+The doctor, bedside nurse, pager and assessment queues used to be lists of
+[priority, name] kept sorted with bisect.insort, so every membership test,
+removal and re-prioritization was a linear scan (plus a re-sort). Under surge
+loads these queues hold hundreds of patients and are scanned several times
+per persona per step.
+
+An EDQueue keeps a binary heap of [priority, arrival, name] entries and an
+index from patient name to the live entry, so push, pop, remove and changing
+a priority are O(log n) and membership is O(1). Removed and re-prioritized
+entries are only marked stale and skipped when they reach the top of the
+heap. A lower priority value is served first; patients with equal priority
+are served in the order they were queued (a re-prioritized patient keeps its
+place in that order).
+
+A patient is queued at most once: pushing a name that is already queued
+replaces its entry. In JSON (maze_status.json, the doctor scratch) a queue is
+stored as the [priority, name] list it used to be, in service order.
+"""
+import heapq
+import itertools
+
+
+class EDQueue:
+  def __init__(self, entries=None):
+    """
+    INPUT
+      entries: Optional [priority, name] pairs, in service order (e.g., a
+               queue as saved in maze_status.json).
+    """
+    # Heap of [priority, arrival, name]. Stale entries have name None.
+    self._heap = []
+    # name -> its live heap entry.
+    self._entries = dict()
+    self._arrivals = itertools.count()
+    for priority, name in entries or []:
+      self.push(priority, name)
+
+  def push(self, priority, name):
+    """
+    Queues <name> with <priority>, behind the patients already queued with
+    the same priority.
+    """
+    self.remove(name)
+    entry = [priority, next(self._arrivals), name]
+    self._entries[name] = entry
+    heapq.heappush(self._heap, entry)
+
+  def _discard_stale(self):
+    while self._heap and self._heap[0][2] is None:
+      heapq.heappop(self._heap)
+
+  def peek(self):
+    """
+    Returns the (priority, name) served next, without removing it.
+    """
+    self._discard_stale()
+    if not self._heap:
+      raise IndexError("peek from an empty EDQueue")
+    priority, _, name = self._heap[0]
+    return priority, name
+
+  def pop(self):
+    """
+    Removes and returns the (priority, name) served next.
+    """
+    self._discard_stale()
+    if not self._heap:
+      raise IndexError("pop from an empty EDQueue")
+    priority, _, name = heapq.heappop(self._heap)
+    del self._entries[name]
+    return priority, name
+
+  def remove(self, name):
+    """
+    Removes <name> from the queue. Returns whether it was queued.
+    """
+    entry = self._entries.pop(name, None)
+    if entry is None:
+      return False
+    entry[2] = None
+    # Rebuild once stale entries make up most of the heap.
+    if len(self._heap) > 2 * len(self._entries) + 16:
+      self._heap = [e for e in self._heap if e[2] is not None]
+      heapq.heapify(self._heap)
+    return True
+
+  def priority(self, name):
+    """
+    Returns the priority <name> is queued with (KeyError if not queued).
+    """
+    return self._entries[name][0]
+
+  def update(self, name, priority):
+    """
+    Changes the priority of the queued <name>, keeping its arrival order.
+    """
+    entry = self._entries[name]
+    if entry[0] == priority:
+      return
+    entry[2] = None
+    entry = [priority, entry[1], name]
+    self._entries[name] = entry
+    heapq.heappush(self._heap, entry)
+
+  def reprioritize(self, new_priority):
+    """
+    Sets every patient's priority to new_priority(priority) in one O(n)
+    rebuild (e.g., to age the whole queue).
+    """
+    self._heap = [[new_priority(priority), arrival, name]
+                  for priority, arrival, name in self._entries.values()]
+    heapq.heapify(self._heap)
+    self._entries = {entry[2]: entry for entry in self._heap}
+
+  def __contains__(self, name):
+    return name in self._entries
+
+  def __len__(self):
+    return len(self._entries)
+
+  def __iter__(self):
+    """
+    Iterates over the (priority, name) pairs in service order. The order is
+    taken when iteration starts, so the queue can be changed meanwhile.
+    """
+    return iter([(priority, name) for priority, _, name
+                 in sorted(self._entries.values())])
+
+  def to_list(self):
+    """
+    Returns the queue as [priority, name] lists in service order, for JSON.
+    """
+    return [[priority, name] for priority, name in self]
+
+  def __repr__(self):
+    return f"EDQueue({self.to_list()})"
@@ -7,9 +7,20 @@ import math
 import heapq
 from global_methods import *
 from utils import *
-import bisect
+from path_finder import (build_walkable_grid, FlowField, PathCache,
+                         path_finder_nearest, path_finder_meet_halfway)
+from collections import OrderedDict
+from tile_store import TileStore, TileView
+from ed_queue import EDQueue
 
 class Maze: 
+  # The injuries_zones entries that are patient queues rather than zones.
+  QUEUE_ZONES = ("bedside_nurse_waiting", "pager", "assessment_queue")
+  # Maximum number of flow fields kept in memory (see get_flow_field).
+  FLOW_FIELD_CACHE_SIZE = 128
+  # Maximum number of searched paths kept in memory (see find_path).
+  PATH_CACHE_SIZE = 2048
+
   def __init__(self, maze_name, fork_folder, sim_folder,seed): 
     random.seed(seed)
     # READING IN THE BASIC META INFORMATION ABOUT THE MAP
@@ -97,6 +108,17 @@ class Maze:
       layer_data[layer["name"]] = layer
 
     self.collision_maze  = array_to_2d(layer_data["Collisions"], self.maze_height, self.maze_width)
+    # Boolean walkability grid used by path_finder. Built once here so the
+    # path searches never have to re-read the collision layer. Collisions
+    # are static: nothing changes them during a run (removing beds below
+    # only clears their visuals and game objects), so the flow fields and
+    # cached paths built on this grid never go stale.
+    self.walkable_grid = build_walkable_grid(self.collision_maze)
+    # Flow fields (BFS distance fields) towards fixed destinations, keyed by
+    # the frozenset of target tiles. Kept in LRU order and capped so that a 
+    # long run with many distinct targets stays bounded in memory. 
+    self._flow_fields = OrderedDict()
+    self.path_cache = PathCache(self.PATH_CACHE_SIZE)
     sector_maze = array_to_2d(layer_data["Sector Layer"], self.maze_height, self.maze_width)
     arena_maze = array_to_2d(layer_data["Arena Layer"], self.maze_height, self.maze_width)
     game_object_maze = array_to_2d(layer_data["Object Interaction Layer"], self.maze_height, self.maze_width)
@@ -124,12 +146,12 @@ class Maze:
     #   game_object_maze += [game_object_maze_raw[i:i+tw]]
     #   spawning_location_maze += [spawning_location_maze_raw[i:i+tw]]
 
-    # Once we are done loading in the maze, we now set up self.tiles. This is
-    # a matrix accessed by row:col where each access point is a dictionary
-    # that contains all the things that are taking place in that tile. 
-    # More specifically, it contains information about its "world," "sector,"
-    # "arena," "game_object," "spawning_location," as well as whether it is a
-    # collision block, and a set of all events taking place in it. 
+    # Once we are done loading in the maze, we now set up self.tiles. Each 
+    # tile has a "world," "sector," "arena," "game_object," and 
+    # "spawning_location," whether it is a collision block, and a set of all
+    # events taking place in it. These are kept in a compact <TileStore>
+    # (interned name IDs in NumPy arrays, a collision bit array and a sparse
+    # event dict); self.tiles[y][x] and access_tile hand out dict-like views.
     # e.g., self.tiles[32][59] = {'world': 'double studio', 
     #            'sector': '', 'arena': '', 'game_object': '', 
     #            'spawning_location': '', 'collision': False, 'events': set()}
@@ -139,48 +161,20 @@ class Maze:
     #         'collision': False,
     #         'events': {('double studio:double studio:bedroom 2:bed',
     #                    None, None)}} 
+    self.tiles = TileStore(wb, self.maze_height, self.maze_width)
+    self.tiles.load_layer("sector", sector_maze, sb_dict)
+    self.tiles.load_layer("arena", arena_maze, ab_dict)
+    self.tiles.load_layer("game_object", game_object_maze, gob_dict)
+    self.tiles.load_layer("spawning_location", spawning_location_maze, slb_dict)
+    self.tiles.collision = ~self.walkable_grid
 
-    self.tiles = []
-    for i in range(self.maze_height): 
-      row = []
-      for j in range(self.maze_width):
-        tile_details = dict()
-        tile_details["world"] = wb
-        
-        tile_details["sector"] = ""
-        if str(sector_maze[i][j]) in sb_dict: 
-          tile_details["sector"] = sb_dict[str(sector_maze[i][j])]
-
-        tile_details["arena"] = ""
-        if str(arena_maze[i][j]) in ab_dict: 
-          tile_details["arena"] = ab_dict[str(arena_maze[i][j])]
-        
-        tile_details["game_object"] = ""
-        if str(game_object_maze[i][j]) in gob_dict: 
-          tile_details["game_object"] = gob_dict[str(game_object_maze[i][j])]
-        
-        tile_details["spawning_location"] = ""
-        if str(spawning_location_maze[i][j]) in slb_dict: 
-          tile_details["spawning_location"] = slb_dict[str(spawning_location_maze[i][j])]
-        
-        tile_details["collision"] = False
-        if self.collision_maze[i][j] != 0: 
-          tile_details["collision"] = True
-        tile_details["events"] = set()
-        
-        row += [tile_details]
-      self.tiles += [row]
     # Each game object occupies an event in the tile. We are setting up the 
     # default event value here. 
-    for i in range(self.maze_height):
-      for j in range(self.maze_width): 
-        if self.tiles[i][j]["game_object"]:
-          object_name = ":".join([self.tiles[i][j]["world"], 
-                                  self.tiles[i][j]["sector"], 
-                                  self.tiles[i][j]["arena"], 
-                                  self.tiles[i][j]["game_object"]])
-          go_event = (object_name, None, None, None)
-          self.tiles[i][j]["events"].add(go_event)
+    for i, j in zip(*numpy.nonzero(self.tiles.ids["game_object"])):
+      tile = (int(j), int(i))
+      object_name = self.tiles.address(tile, "game_object")
+      go_event = (object_name, None, None, None)
+      self.tiles.add_event(tile, go_event)
 
 
 
@@ -193,27 +187,25 @@ class Maze:
     # self.address_tiles['double studio:recreation:pool table'] 
     #   == {(29, 14), (31, 11), (30, 14), (32, 11), ...}, 
     self.address_tiles = dict()
+    names = self.tiles.names
+    sector_ids = self.tiles.ids["sector"].tolist()
+    arena_ids = self.tiles.ids["arena"].tolist()
+    object_ids = self.tiles.ids["game_object"].tolist()
+    spawn_ids = self.tiles.ids["spawning_location"].tolist()
     for i in range(self.maze_height):
       for j in range(self.maze_width): 
+        sector = names["sector"][sector_ids[i][j]]
+        arena = names["arena"][arena_ids[i][j]]
+        game_object = names["game_object"][object_ids[i][j]]
         addresses = []
-        if self.tiles[i][j]["sector"]: 
-          add = f'{self.tiles[i][j]["world"]}:'
-          add += f'{self.tiles[i][j]["sector"]}'
-          addresses += [add]
-        if self.tiles[i][j]["arena"]: 
-          add = f'{self.tiles[i][j]["world"]}:'
-          add += f'{self.tiles[i][j]["sector"]}:'
-          add += f'{self.tiles[i][j]["arena"]}'
-          addresses += [add]
-        if self.tiles[i][j]["game_object"]: 
-          add = f'{self.tiles[i][j]["world"]}:'
-          add += f'{self.tiles[i][j]["sector"]}:'
-          add += f'{self.tiles[i][j]["arena"]}:'
-          add += f'{self.tiles[i][j]["game_object"]}'
-          addresses += [add]
-        if self.tiles[i][j]["spawning_location"]: 
-          add = f'<spawn_loc>{self.tiles[i][j]["arena"]}'
-          addresses += [add]
+        if sector: 
+          addresses += [f'{wb}:{sector}']
+        if arena: 
+          addresses += [f'{wb}:{sector}:{arena}']
+        if game_object: 
+          addresses += [f'{wb}:{sector}:{arena}:{game_object}']
+        if spawn_ids[i][j]: 
+          addresses += [f'<spawn_loc>{arena}']
 
         for add in addresses: 
           if add in self.address_tiles: 
@@ -232,6 +224,8 @@ class Maze:
     self.triage_patients = meta_info["triage_patients"]
 
     self.injuries_zones = meta_info["injuries_zones"]
+    for queue in self.QUEUE_ZONES:
+      self.injuries_zones[queue] = EDQueue(self.injuries_zones.get(queue))
     self.triage_queue = meta_info["triage_queue"]
 
     # Removing Beds system
@@ -279,7 +273,7 @@ class Maze:
     with open(f"{sim_folder}/reverie/maze_visuals.json", "w") as outfile:  
       outfile.write(json.dumps(maze_visual_info))
 
-    self.patients_waiting_for_doctor = meta_info.get("patients_waiting_for_doctor", [])
+    self.patients_waiting_for_doctor = EDQueue(meta_info.get("patients_waiting_for_doctor"))
     self.doctors_taking_more_patients = meta_info.get("doctors_taking_more_patients", [])
     # Initialize beds
     self._initialize_beds()
@@ -291,9 +285,11 @@ class Maze:
 
     maze_meta = dict()
     maze_meta["triage_patients"] = self.triage_patients
-    maze_meta["injuries_zones"] = self.injuries_zones
+    maze_meta["injuries_zones"] = {
+      zone: zone_info.to_list() if isinstance(zone_info, EDQueue) else zone_info
+      for zone, zone_info in self.injuries_zones.items()}
     maze_meta["triage_queue"] = self.triage_queue
-    maze_meta["patients_waiting_for_doctor"] = self.patients_waiting_for_doctor
+    maze_meta["patients_waiting_for_doctor"] = self.patients_waiting_for_doctor.to_list()
     maze_meta["doctors_taking_more_patients"] = self.doctors_taking_more_patients
 
     # Atomic write to prevent corruption on crash
@@ -320,6 +316,68 @@ class Maze:
       for y in range(y_start, y_end + 1):
         visual_layer[tile[1] + y][tile[0] + x] = 0
 
+  def get_flow_field(self, target_tiles):
+    """
+    Returns the cached flow field towards <target_tiles>, building it on the
+    first request. Every persona heading to the same destination (a bed, the
+    triage chairs, the exit) then reads its path off the same field instead 
+    of running its own search. 
+
+    INPUT
+      target_tiles: iterable of (x, y) tile coordinates. 
+    OUTPUT
+      A <FlowField>; use .path_from(curr_tile) to get the path. 
+    """
+    key = frozenset(tuple(t) for t in target_tiles)
+    field = self._flow_fields.get(key)
+    if field is None:
+      field = FlowField(self.walkable_grid, key)
+      self._flow_fields[key] = field
+      if len(self._flow_fields) > self.FLOW_FIELD_CACHE_SIZE:
+        self._flow_fields.popitem(last=False)
+    else:
+      self._flow_fields.move_to_end(key)
+    return field
+
+
+  def find_path(self, start, targets):
+    """
+    Shortest path from <start> to the nearest of <targets>, served from the 
+    path cache when the same query was answered before. 
+
+    INPUT
+      start: The (x, y) tile the persona is on. 
+      targets: iterable of candidate (x, y) tiles. 
+    OUTPUT
+      list of (x, y) tuples, see path_finder_nearest. 
+    """
+    start = (start[0], start[1])
+    targets = frozenset(tuple(t) for t in targets)
+    key = ("nearest", start, targets)
+    path = self.path_cache.get(key)
+    if path is None:
+      path = path_finder_nearest(self.walkable_grid, start, targets,
+                                 collision_block_id)
+      self.path_cache.put(key, path)
+    return path
+
+
+  def find_meeting_path(self, start, end):
+    """
+    Path for a persona at <start> walking to meet a persona at <end>, served
+    from the path cache when possible. See path_finder_meet_halfway. 
+    """
+    start = (start[0], start[1])
+    end = (end[0], end[1])
+    key = ("halfway", start, end)
+    path = self.path_cache.get(key)
+    if path is None:
+      path = path_finder_meet_halfway(self.walkable_grid, start, end,
+                                      collision_block_id)
+      self.path_cache.put(key, path)
+    return path
+
+
   def turn_coordinate_to_tile(self, px_coordinate): 
     """
     Turns a pixel coordinate to a tile coordinate. 
@@ -356,9 +414,7 @@ class Maze:
             'events': {('double studio:double studio:bedroom 2:bed',
                        None, None)}} 
     """
-    x = tile[0]
-    y = tile[1]
-    return self.tiles[y][x]
+    return TileView(self.tiles, (tile[0], tile[1]))
 
 
   def get_tile_path(self, tile, level): 
@@ -375,27 +431,7 @@ class Maze:
       Given tile=(58, 9), and level=arena,
       "double studio:double studio:bedroom 2"
     """
-    x = tile[0]
-    y = tile[1]
-    tile = self.tiles[y][x]
-
-    path = f"{tile['world']}"
-    if level == "world": 
-      return path
-    else: 
-      path += f":{tile['sector']}"
-    
-    if level == "sector": 
-      return path
-    else: 
-      path += f":{tile['arena']}"
-
-    if level == "arena": 
-      return path
-    else: 
-      path += f":{tile['game_object']}"
-
-    return path
+    return self.tiles.address(tile, level)
 
 
   def get_nearby_tiles(self, tile, vision_r): 
@@ -416,6 +452,20 @@ class Maze:
     OUTPUT: 
       nearby_tiles: a list of tiles that are within the radius. 
     """
+    left_end, right_end, top_end, bottom_end = self._nearby_bounds(tile, 
+                                                                   vision_r)
+    nearby_tiles = []
+    for i in range(left_end, right_end): 
+      for j in range(top_end, bottom_end): 
+        nearby_tiles += [(i, j)]
+    return nearby_tiles
+
+
+  def _nearby_bounds(self, tile, vision_r): 
+    """
+    Returns the (left, right, top, bottom) bounds of the vision square of
+    get_nearby_tiles; right and bottom are exclusive. 
+    """
     left_end = 0
     if tile[0] - vision_r > left_end: 
       left_end = tile[0] - vision_r
@@ -432,11 +482,95 @@ class Maze:
     if tile[1] - vision_r > top_end: 
       top_end = tile[1] - vision_r 
 
-    nearby_tiles = []
-    for i in range(left_end, right_end): 
-      for j in range(top_end, bottom_end): 
-        nearby_tiles += [(i, j)]
-    return nearby_tiles
+    return left_end, right_end, top_end, bottom_end
+
+
+  def get_nearby_events(self, tile, vision_r): 
+    """
+    Returns the events taking place in the same arena as <tile> within the 
+    vision square of get_nearby_tiles, read from the event index instead of
+    scanning every tile of the square. An event that spans several tiles is
+    listed once. 
+
+    INPUT: 
+      tile: The tile coordinate of our interest in (x, y) form.
+      vision_r: The radius of the persona's vision. 
+    OUTPUT: 
+      a list of [distance, event] pairs, in the tile order of 
+      get_nearby_tiles (column by column). 
+    """
+    bounds = self._nearby_bounds(tile, vision_r)
+    event_tiles = sorted(self.tiles.region_event_tiles(tile, *bounds))
+    seen_events = set()
+    nearby_events = []
+    for event_tile in event_tiles: 
+      dist = math.dist(event_tile, (tile[0], tile[1]))
+      for event in self.tiles.events_at(event_tile): 
+        if event not in seen_events: 
+          nearby_events += [[dist, event]]
+          seen_events.add(event)
+    return nearby_events
+
+
+  def get_nearest_events(self, tile, vision_r, att_bandwidth): 
+    """
+    Returns the <att_bandwidth> events of get_nearby_events that are closest
+    to <tile>, nearest first. Ties keep the get_nearby_events order, so this
+    is the same as sorting the whole list by distance and cutting it, but 
+    the cut is done with a partial (linear time) selection. 
+
+    OUTPUT: 
+      a list of events. 
+    """
+    nearby_events = self.get_nearby_events(tile, vision_r)
+    if att_bandwidth <= 0 or not nearby_events: 
+      return []
+    dists = numpy.array([dist for dist, _ in nearby_events])
+    if len(nearby_events) > att_bandwidth: 
+      kth = numpy.partition(dists, att_bandwidth - 1)[att_bandwidth - 1]
+      closer = numpy.flatnonzero(dists < kth)
+      ties = numpy.flatnonzero(dists == kth)[:att_bandwidth - len(closer)]
+      chosen = numpy.sort(numpy.concatenate([closer, ties]))
+    else: 
+      chosen = numpy.arange(len(nearby_events))
+    chosen = chosen[numpy.argsort(dists[chosen], kind="stable")]
+    return [nearby_events[i][1] for i in chosen.tolist()]
+
+
+  def get_nearby_places(self, tile, vision_r, explored=None): 
+    """
+    Returns the distinct (sector, arena, game_object) names found in the 
+    vision square of get_nearby_tiles, in the order they are first met when
+    walking the square column by column. Computed by slicing the tile ID
+    arrays rather than visiting the tiles one by one. 
+
+    INPUT: 
+      tile: The tile coordinate of our interest in (x, y) form.
+      vision_r: The radius of the persona's vision. 
+      explored: optional bool bitmap of tiles already seen (see 
+                MemoryTree.get_explored). Tiles marked in it are skipped, 
+                and the square is marked as seen. 
+    OUTPUT: 
+      a list of (sector, arena, game_object) tuples. 
+    """
+    left_end, right_end, top_end, bottom_end = self._nearby_bounds(tile, 
+                                                                   vision_r)
+    if left_end >= right_end or top_end >= bottom_end: 
+      return []
+    ids = self.tiles.ids
+    window = numpy.stack(
+      [ids[level][top_end:bottom_end, left_end:right_end].T.ravel() 
+       for level in ("sector", "arena", "game_object")], axis=1)
+    if explored is not None: 
+      seen = explored[top_end:bottom_end, left_end:right_end].T.ravel()
+      if seen.all(): 
+        return []
+      explored[top_end:bottom_end, left_end:right_end] = True
+      window = window[~seen]
+    places, first_seen = numpy.unique(window, axis=0, return_index=True)
+    names = self.tiles.names
+    return [(names["sector"][s], names["arena"][a], names["game_object"][o])
+            for s, a, o in places[numpy.argsort(first_seen)].tolist()]
 
 
   def add_event_from_tile(self, curr_event, tile): 
@@ -452,7 +586,7 @@ class Maze:
       None
     """
     print(tile)
-    self.tiles[tile[1]][tile[0]]["events"].add(curr_event)
+    self.tiles.add_event(tile, curr_event)
 
 
   def remove_event_from_tile(self, curr_event, tile):
@@ -467,19 +601,14 @@ class Maze:
     OUPUT: 
       None
     """
-    curr_tile_ev_cp = self.tiles[tile[1]][tile[0]]["events"].copy()
-    for event in curr_tile_ev_cp: 
-      if event == curr_event:  
-        self.tiles[tile[1]][tile[0]]["events"].remove(event)
+    self.tiles.discard_event(tile, curr_event)
 
 
   def turn_event_from_tile_idle(self, curr_event, tile):
-    curr_tile_ev_cp = self.tiles[tile[1]][tile[0]]["events"].copy()
-    for event in curr_tile_ev_cp: 
-      if event == curr_event:  
-        self.tiles[tile[1]][tile[0]]["events"].remove(event)
-        new_event = (event[0], None, None, None)
-        self.tiles[tile[1]][tile[0]]["events"].add(new_event)
+    if curr_event in self.tiles.events_at(tile): 
+      self.tiles.discard_event(tile, curr_event)
+      new_event = (curr_event[0], None, None, None)
+      self.tiles.add_event(tile, new_event)
 
 
   def remove_subject_events_from_tile(self, subject, tile):
@@ -492,10 +621,7 @@ class Maze:
     OUPUT: 
       None
     """
-    curr_tile_ev_cp = self.tiles[tile[1]][tile[0]]["events"].copy()
-    for event in curr_tile_ev_cp: 
-      if event[0] == subject:  
-        self.tiles[tile[1]][tile[0]]["events"].remove(event)
+    self.tiles.discard_subject(tile, subject)
 
 
   def _initialize_beds(self):
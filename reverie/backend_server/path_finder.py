@@ -1,4 +1,5 @@
 import numpy as np
+from collections import deque, OrderedDict
 
 def print_maze(maze):
   for row in maze:
@@ -156,13 +157,212 @@ def path_finder_v2(a, start, end, collision_block_char, verbose=False):
   return the_path
 
 
+def build_walkable_grid(collision_maze):
+  """
+  Builds the boolean walkability grid used by the BFS engine. A tile is 
+  walkable when its entry in the collision layer is 0 (the same convention
+  path_finder_v2 uses). The Maze builds this once and hands it to every 
+  path_finder call so that no search has to re-read the collision layer. 
+
+  INPUT: 
+    collision_maze: 2-d list (row-major, [y][x]) from the Tiled 
+                    "Collisions" layer. 
+  OUTPUT: 
+    a NumPy bool array of shape (height, width). 
+  """
+  return np.asarray(collision_maze) == 0
+
+
+def as_walkable_grid(maze):
+  """
+  Returns <maze> as a walkability grid. Accepts either a grid that was 
+  already built with build_walkable_grid or a raw collision maze. 
+  """
+  if isinstance(maze, np.ndarray) and maze.dtype == np.bool_:
+    return maze
+  return build_walkable_grid(maze)
+
+
+def _bfs_distances(open_cells, width, sources, stop=None):
+  """
+  Breadth-first wavefront over a flattened walkability grid. 
+
+  INPUT: 
+    open_cells: flat list of bools (row-major) -- True if walkable. 
+    width: width of the grid the list was flattened from. 
+    sources: flat indices the wave starts from (distance 0). 
+    stop: optional set of flat indices; the search ends at the first of 
+          them it reaches, which is therefore the nearest one. 
+  OUTPUT: 
+    (dist, reached) -- a flat list with the step distance of every tile 
+    (-1 if unreached) and the stop index that was reached (-1 if none). 
+  """
+  size = len(open_cells)
+  dist = [-1] * size
+  frontier = deque()
+  for s in sources:
+    if dist[s] < 0:
+      dist[s] = 0
+      frontier.append(s)
+  while frontier:
+    cur = frontier.popleft()
+    if stop and cur in stop:
+      return dist, cur
+    k = dist[cur] + 1
+    col = cur % width
+    if cur >= width and dist[cur - width] < 0 and open_cells[cur - width]:
+      dist[cur - width] = k
+      frontier.append(cur - width)
+    if col > 0 and dist[cur - 1] < 0 and open_cells[cur - 1]:
+      dist[cur - 1] = k
+      frontier.append(cur - 1)
+    if cur + width < size and dist[cur + width] < 0 and open_cells[cur + width]:
+      dist[cur + width] = k
+      frontier.append(cur + width)
+    if col < width - 1 and dist[cur + 1] < 0 and open_cells[cur + 1]:
+      dist[cur + 1] = k
+      frontier.append(cur + 1)
+  return dist, -1
+
+
+def _descend(dist, width, cur):
+  """
+  Walks downhill on a distance list from flat index <cur> to a tile of 
+  distance 0, trying up, left, down, right in that order at every step. 
+  Returns the list of flat indices visited, <cur> included. 
+  """
+  size = len(dist)
+  the_path = [cur]
+  k = dist[cur]
+  while k > 0:
+    col = cur % width
+    if cur >= width and dist[cur - width] == k - 1:
+      cur -= width
+    elif col > 0 and dist[cur - 1] == k - 1:
+      cur -= 1
+    elif cur + width < size and dist[cur + width] == k - 1:
+      cur += width
+    else:
+      cur += 1
+    the_path.append(cur)
+    k -= 1
+  return the_path
+
+
+def path_finder_bfs(walkable, start, end, verbose=False):
+  """
+  Breadth-first search over a walkability grid. Every step costs the same, 
+  so BFS gives a shortest path; it expands each tile at most once and stops
+  as soon as <end> is labelled. The backtrack from <end> tries up, left, 
+  down, right in that order, which is the order path_finder_v2 used, so the 
+  two return the same path for the same maze (when there is one). 
+
+  INPUT: 
+    walkable: NumPy bool grid from build_walkable_grid. 
+    start: (row, col) of the starting tile. 
+    end: (row, col) of the target tile. 
+  OUTPUT: 
+    list of (row, col) tuples from <start> to <end>, both included. If no 
+    path exists, [start] is returned so that the persona stays where it is, 
+    as with path_finder_nearest and FlowField.path_from. 
+  """
+  width = walkable.shape[1]
+  s = start[0] * width + start[1]
+  e = end[0] * width + end[1]
+  dist, _ = _bfs_distances(walkable.ravel().tolist(), width, [s], stop={e})
+
+  if dist[e] < 0:
+    if verbose:
+      print("No path possible!")
+    return [(start[0], start[1])]
+
+  the_path = _descend(dist, width, e)
+  the_path.reverse()
+  return [divmod(i, width) for i in the_path]
+
+
+class FlowField:
+  """
+  A BFS distance field towards a fixed set of goal tiles (a "flow field"). 
+  It is built with one search from the goals outward; after that, the 
+  shortest path from any tile to the nearest goal is read off by walking 
+  downhill, in O(path length) and without any further search. The Maze 
+  keeps one of these per destination (see Maze.get_flow_field). 
+
+  All coordinates here are game coordinates, (x, y). 
+  """
+  def __init__(self, walkable, goals):
+    """
+    INPUT: 
+      walkable: NumPy bool grid from build_walkable_grid. 
+      goals: iterable of (x, y) goal tiles. Goals that are not walkable 
+             are dropped since no path can end on them. 
+    """
+    self.height, self.width = walkable.shape
+    open_cells = walkable.ravel().tolist()
+    self.goals = frozenset(tuple(g) for g in goals)
+    sources = [g[1] * self.width + g[0] for g in self.goals
+               if open_cells[g[1] * self.width + g[0]]]
+    self.dist, _ = _bfs_distances(open_cells, self.width, sources)
+
+  def distance(self, tile):
+    """
+    Number of steps from <tile> to the nearest goal, or None if no goal can
+    be reached from it. 
+    """
+    if tuple(tile) in self.goals:
+      return 0
+    i = tile[1] * self.width + tile[0]
+    best = self._best_neighbour(i)
+    if best is None:
+      return None
+    return self.dist[best] + 1
+
+  def path_from(self, tile):
+    """
+    Returns the shortest path from <tile> to the nearest goal as a list of 
+    (x, y) tuples, both ends included -- the same format path_finder 
+    returns. If no goal is reachable, [tile] is returned so that the 
+    persona stays where it is. 
+    """
+    tile = (tile[0], tile[1])
+    if tile in self.goals:
+      return [tile]
+    best = self._best_neighbour(tile[1] * self.width + tile[0])
+    if best is None:
+      return [tile]
+    the_path = [tile]
+    for i in _descend(self.dist, self.width, best):
+      the_path.append((i % self.width, i // self.width))
+    return the_path
+
+  def _best_neighbour(self, i):
+    # The starting tile itself may be unwalkable (e.g., a persona standing on
+    # an object), so the first step looks at its neighbours directly.
+    best = None
+    col = i % self.width
+    candidates = []
+    if i >= self.width:
+      candidates += [i - self.width]
+    if col > 0:
+      candidates += [i - 1]
+    if i + self.width < len(self.dist):
+      candidates += [i + self.width]
+    if col < self.width - 1:
+      candidates += [i + 1]
+    for j in candidates:
+      if self.dist[j] >= 0 and (best is None or self.dist[j] < self.dist[best]):
+        best = j
+    return best
+
+
 def path_finder(maze, start, end, collision_block_char, verbose=False):
   # EMERGENCY PATCH
   start = (start[1], start[0])
   end = (end[1], end[0])
   # END EMERGENCY PATCH
 
-  path = path_finder_v2(maze, start, end, collision_block_char, verbose)
+  path = path_finder_bfs(as_walkable_grid(maze), start, end, verbose)
 
   new_path = []
   for i in path: 
@@ -172,6 +372,112 @@ def path_finder(maze, start, end, collision_block_char, verbose=False):
   return path
 
 
+def path_finder_nearest(maze, start, targets, collision_block_char, verbose=False):
+  """
+  Finds the shortest path from <start> to whichever of <targets> is nearest,
+  with a single search (instead of one path_finder call per target). 
+
+  INPUT: 
+    maze: walkability grid or collision maze (see as_walkable_grid). 
+    start: (x, y) of the starting tile. 
+    targets: iterable of (x, y) candidate tiles. 
+  OUTPUT: 
+    list of (x, y) tuples from <start> to the nearest target, both 
+    included. If none of the targets can be reached, [start] is returned. 
+  """
+  walkable = as_walkable_grid(maze)
+  width = walkable.shape[1]
+  s = start[1] * width + start[0]
+  stop = set(t[1] * width + t[0] for t in targets)
+  dist, reached = _bfs_distances(walkable.ravel().tolist(), width, [s], stop=stop)
+
+  if reached < 0:
+    if verbose:
+      print("No path possible!")
+    return [(start[0], start[1])]
+
+  the_path = _descend(dist, width, reached)
+  the_path.reverse()
+  return [(i % width, i // width) for i in the_path]
+
+
+def path_finder_meet_halfway(maze, start, end, collision_block_char, verbose=False):
+  """
+  Path for a persona at <start> walking to meet a persona at <end>: it goes
+  to the middle tile of the shortest path between the two, so that both 
+  can cover half the distance. When the two are already (nearly) adjacent 
+  the path goes all the way to <end>. 
+
+  Since every prefix of a shortest path is itself a shortest path, the 
+  walk to the middle tile is just the first half of that one path; no 
+  extra search is needed. 
+
+  INPUT: 
+    maze: walkability grid or collision maze (see as_walkable_grid). 
+    start: (x, y) of the initiating persona. 
+    end: (x, y) of the persona to meet. 
+  OUTPUT: 
+    list of (x, y) tuples from <start> to the meeting tile, both included. 
+  """
+  curr_path = path_finder(maze, start, end, collision_block_char, verbose)
+  if len(curr_path) <= 2:
+    return curr_path
+  return curr_path[:int(len(curr_path)/2) + 1]
+
+
+class PathCache:
+  """
+  Bounded LRU cache of computed paths. Keys are built by the caller and 
+  should include everything the path depends on besides the (static) 
+  collisions of the maze: the start and the goal(s). Old entries just age 
+  out. 
+
+  Paths are stored as tuples and handed back as fresh lists, since callers
+  slice and extend the lists they get. 
+  """
+  def __init__(self, maxsize=2048, enabled=True):
+    self.maxsize = maxsize
+    self.enabled = enabled
+    self.hits = 0
+    self.misses = 0
+    self._paths = OrderedDict()
+
+  def get(self, key):
+    """
+    Returns the cached path for <key> as a list, or None on a miss. 
+    """
+    if not self.enabled:
+      return None
+    path = self._paths.get(key)
+    if path is None:
+      self.misses += 1
+      return None
+    self._paths.move_to_end(key)
+    self.hits += 1
+    return list(path)
+
+  def put(self, key, path):
+    if not self.enabled:
+      return
+    self._paths[key] = tuple(path)
+    self._paths.move_to_end(key)
+    if len(self._paths) > self.maxsize:
+      self._paths.popitem(last=False)
+
+  def clear(self):
+    self._paths.clear()
+
+  def stats(self):
+    """
+    Returns a dict with the hit/miss counters, current size and hit rate. 
+    """
+    lookups = self.hits + self.misses
+    return {"hits": self.hits,
+            "misses": self.misses,
+            "size": len(self._paths),
+            "hit_rate": self.hits / lookups if lookups else 0.0}
+
+
 def closest_coordinate(curr_coordinate, target_coordinates): 
   min_dist = None
   closest_coordinate = None
@@ -6,6 +6,26 @@ from global_methods import *
 from path_finder import *
 from utils import *
 
+def plan_target_reached(persona, maze, plan): 
+  """
+  Whether the persona already stands where <plan> takes it: on the tile of a 
+  "<tile> (x, y)" plan, or else in an arena of its act_address. 
+
+  INPUT: 
+    persona: Current <Persona> instance. 
+    maze: An instance of current <Maze>. 
+    plan: The string address of the action being executed. 
+  OUTPUT: 
+    True if the persona is there, False otherwise. 
+  """
+  x, y = persona.scratch.curr_tile[0], persona.scratch.curr_tile[1]
+  if "tile" in plan: 
+    cords = plan.split("<tile>")[-1].replace('(', "").replace(')', "")
+    return (int(cords.split(", ")[0].strip()) == x 
+            and int(cords.split(", ")[1].strip()) == y)
+  return maze.tiles[y][x]['arena'] in persona.scratch.act_address
+
+
 def execute(persona, maze, personas, plan): 
   """
   Given a plan (action's string address), we execute the plan (actually 
@@ -32,19 +52,16 @@ def execute(persona, maze, personas, plan):
   elif "<random>" in plan: 
     persona.scratch.act_path_set = False
   elif("tile" in plan):
-    cords = plan.split("<tile>")[-1].replace('(', "").replace(')', "")
-    x = int(cords.split(", ")[0].strip())
-    y = int(cords.split(", ")[1].strip())
-    if(persona.scratch.curr_tile[0] == x and persona.scratch.curr_tile[1] == y):
-      plan = f"<waiting> {x} {y}"
+    if plan_target_reached(persona, maze, plan):
+      plan = f"<waiting> {persona.scratch.curr_tile[0]} {persona.scratch.curr_tile[1]}"
       persona.scratch.act_path_set = True
 
     else:
       persona.scratch.act_path_set = False
-      print("RESETTING PATH | " + persona.name + str([x,y])) 
+      print("RESETTING PATH | " + persona.name + " " + plan) 
 
   elif(( "waiting" not in plan) and (persona.scratch.chatting_with == None)):
-    if(maze.tiles[persona.scratch.curr_tile[1]][persona.scratch.curr_tile[0]]['arena'] not in persona.scratch.act_address):
+    if not plan_target_reached(persona, maze, plan):
 
         persona.scratch.act_path_set = False
         print("RESETTING PATH | " + persona.name + " " + maze.tiles[persona.scratch.curr_tile[1]][persona.scratch.curr_tile[0]]['arena'])
@@ -56,6 +73,10 @@ def execute(persona, maze, personas, plan):
     # <target_tiles> is a list of tile coordinates where the persona may go 
     # to execute the current action. The goal is to pick one of them.
     target_tiles = None
+    # True when the targets are a fixed address of the maze (a bed, the exit,
+    # the triage chairs...). Paths to those are read off the maze's cached 
+    # flow fields instead of being searched for every time. 
+    fixed_destination = False
 
     if "<persona>" in plan: 
       # Executing persona-persona interaction.
@@ -76,25 +97,10 @@ def execute(persona, maze, personas, plan):
 
       target_p_tile = (personas[persona_name]
                        .scratch.curr_tile)
-      potential_path = path_finder(maze.collision_maze,
-                                   persona.scratch.curr_tile,
-                                   target_p_tile,
-                                   collision_block_id)
-      if len(potential_path) <= 2:
-        target_tiles = [potential_path[-1]]
-      else:
-        potential_1 = path_finder(maze.collision_maze,
-                                persona.scratch.curr_tile,
-                                potential_path[int(len(potential_path)/2)],
-                                collision_block_id)
-        potential_2 = path_finder(maze.collision_maze,
-                                persona.scratch.curr_tile,
-                                potential_path[int(len(potential_path)/2)+1],
-                                collision_block_id)
-        if len(potential_1) <= len(potential_2):
-          target_tiles = [potential_path[int(len(potential_path)/2)]]
-        else:
-          target_tiles = [potential_path[int(len(potential_path)/2+1)]]
+      # We walk to the middle of the shortest path between the two personas.
+      meeting_path = maze.find_meeting_path(persona.scratch.curr_tile,
+                                            target_p_tile)
+      target_tiles = [meeting_path[-1]]
     
     elif "<waiting>" in plan: 
       # Executing interaction where the persona has decided to wait before 
@@ -129,14 +135,12 @@ def execute(persona, maze, personas, plan):
         target_tiles = [persona.scratch.curr_tile]
       else:
         target_tiles = maze.address_tiles[plan]
+        fixed_destination = True
 
     # There are sometimes more than one tile returned from this (e.g., a tabe
-    # may stretch many coordinates). So, we sample a few here. And from that 
-    # random sample, we will take the closest ones. 
-    if len(target_tiles) < 4: 
-      target_tiles = random.sample(list(target_tiles), len(target_tiles))
-    else:
-      target_tiles = random.sample(list(target_tiles), 2)
+    # may stretch many coordinates). We consider all of them and take the 
+    # closest one below. 
+    target_tiles = list(target_tiles)
     # If possible, we want personas to occupy different tiles when they are 
     # headed to the same location on the maze. It is ok if they end up on the 
     # same time, but we try to lower that probability. 
@@ -155,28 +159,17 @@ def execute(persona, maze, personas, plan):
       new_target_tiles = target_tiles
     target_tiles = new_target_tiles
 
-    # Now that we've identified the target tile, we find the shortest path to
-    # one of the target tiles. 
+    # Now that we've identified the target tiles, we find the shortest path to
+    # the nearest of them with a single (cached) search. The path is a list of 
+    # coordinate tuples, e.g., [(0, 1), (1, 1), (1, 2), (1, 3), (1, 4)...]
     curr_tile = persona.scratch.curr_tile
-    collision_maze = maze.collision_maze
-    closest_target_tile = None
-    path = None
-    for i in target_tiles: 
-      # path_finder takes a collision_mze and the curr_tile coordinate as 
-      # an input, and returns a list of coordinate tuples that becomes the
-      # path. 
-      # e.g., [(0, 1), (1, 1), (1, 2), (1, 3), (1, 4)...]
-      curr_path = path_finder(maze.collision_maze, 
-                              curr_tile, 
-                              i, 
-                              collision_block_id)
-
-      if not closest_target_tile: 
-        closest_target_tile = i
-        path = curr_path
-      elif len(curr_path) < len(path): 
-        closest_target_tile = i
-        path = curr_path
+    if (fixed_destination 
+        and len(target_tiles) == len(maze.address_tiles[plan])): 
+      # None of the address' tiles is taken, so the cached flow field 
+      # towards the whole address gives us the path.
+      path = maze.get_flow_field(target_tiles).path_from(curr_tile)
+    else: 
+      path = maze.find_path(curr_tile, target_tiles)
 
     shorten_path_length = path[::1]
     if path[-1] not in shorten_path_length:
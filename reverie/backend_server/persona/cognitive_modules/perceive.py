@@ -1,7 +1,6 @@
 import sys
 sys.path.append('../../')
 
-from operator import itemgetter
 from global_methods import *
 from persona.prompt_template.gpt_structure import *
 from persona.prompt_template.run_gpt_prompt import *
@@ -41,6 +40,69 @@ def generate_poig_score(persona, event_type, description):
   # Default for unmatched events
   return 3
 
+def _describe_event(event):
+  """
+  Returns the (s, p, o, desc) of a maze event the way the persona memorizes
+  it: events without a predicate are idle, and <desc> is prefixed with the
+  subject's name.
+  """
+  s, p, o, desc = event
+  if not p: 
+    # If the object is not present, then we default the event to "idle".
+    p = "is"
+    o = "idle"
+    desc = "idle"
+  desc = f"{s.split(':')[-1]} is {desc}"
+  return s, p, o, desc
+
+
+def _embedding_text(desc):
+  """
+  Returns the part of an event description that gets embedded (the text in
+  parentheses, if any).
+  """
+  if "(" in desc: 
+    return desc.split("(")[1].split(")")[0].strip()
+  return desc
+
+
+def _is_new_event(persona, p_event):
+  latest_events = persona.a_mem.get_summarized_latest_events(
+                                  persona.scratch.retention)
+  return ((p_event not in latest_events) or 
+          (p_event[0] in str(persona.scratch.next_step) 
+           and persona.scratch.chatting_with == None))
+
+
+def perceive_embedding_requests(persona, maze, curr_tile):
+  """
+  Returns the texts that perceive() would need new embeddings for if 
+  <persona> perceived from <curr_tile> right now. Nothing is changed, so 
+  this can run for every persona before any of them moves, and the 
+  embeddings fetched together (see ReverieServer.start_server). 
+
+  INPUT: 
+    persona: An instance of <Persona>. 
+    maze: An instance of <Maze>. 
+    curr_tile: The (x, y) tile the persona will perceive from. 
+  OUTPUT: 
+    a list of str, without duplicates. 
+  """
+  texts = []
+  perceived_events = maze.get_nearest_events(curr_tile, 
+                                             persona.scratch.vision_r, 
+                                             persona.scratch.att_bandwidth)
+  for p_event in perceived_events: 
+    s, p, o, desc = _describe_event(p_event)
+    if not _is_new_event(persona, (s, p, o)): 
+      continue
+    texts += [_embedding_text(desc)]
+    if s == f"{persona.name}" and p == "chat with": 
+      texts += [persona.scratch.act_description]
+  return [t for t in dict.fromkeys(texts) 
+          if t and t not in persona.a_mem.embeddings]
+
+
 def perceive(persona, maze): 
   """
   Perceives events around the persona and saves it to the memory, both events 
@@ -60,107 +122,47 @@ def perceive(persona, maze):
     ret_events: a list of <ConceptNode> that are perceived and new. 
   """
   # PERCEIVE SPACE
-  # We get the nearby tiles given our current tile and the persona's vision
-  # radius. 
-  nearby_tiles = maze.get_nearby_tiles(persona.scratch.curr_tile, 
-                                       persona.scratch.vision_r)
-
-  # We then store the perceived space. Note that the s_mem of the persona is
-  # in the form of a tree constructed using dictionaries. 
-
-
-  for i in nearby_tiles: 
-    coord = i
-    i = maze.access_tile(i)
-    if i["world"]:
-      if (i["world"] not in persona.s_mem.tree): 
-        persona.s_mem.tree[i["world"]] = {}
-    if i["sector"]: 
-      if i["world"] == "":
-        print("Empty 'world' value at coordinate:", coord)
-      if (i["sector"] not in persona.s_mem.tree[i["world"]]): 
-        persona.s_mem.tree[i["world"]][i["sector"]] = {}
-    if i["arena"]: 
-      if i["world"] == "":
-        print("Empty 'world' value at coordinate:", coord)
-      if i["sector"] == "":
-        print("Empty 'sector' value at coordinate:", coord)
-      if (i["arena"] not in persona.s_mem.tree[i["world"]]
-                                              [i["sector"]]): 
-        persona.s_mem.tree[i["world"]][i["sector"]][i["arena"]] = []
-    if i["game_object"]:
-      if i["world"] == "":
-        print("Empty 'world' value at coordinate:", coord)
-      if i["sector"] == "":
-        print("Empty 'sector' value at coordinate:", coord)
-      if i["arena"] == "":
-        print("Empty 'arena' value at coordinate:", coord)
-      if (i["game_object"] not in persona.s_mem.tree[i["world"]]
-                                                    [i["sector"]]
-                                                    [i["arena"]]): 
-        persona.s_mem.tree[i["world"]][i["sector"]][i["arena"]] += [
-                                                             i["game_object"]]
+  # We get the places (sector, arena, game object) that are within the 
+  # persona's vision radius of its current tile. Only tiles the persona has
+  # never seen before are looked at; the others are already in its s_mem. 
+  world = maze.access_tile(persona.scratch.curr_tile)["world"]
+  nearby_places = maze.get_nearby_places(persona.scratch.curr_tile, 
+                                         persona.scratch.vision_r, 
+                                         persona.s_mem.get_explored(maze))
+
+  # We then store the perceived space in the persona's s_mem. 
+  for sector, arena, game_object in nearby_places: 
+    if sector and world == "":
+      print("Empty 'world' value near:", persona.scratch.curr_tile)
+    if arena and sector == "":
+      print("Empty 'sector' value near:", persona.scratch.curr_tile)
+    if game_object and arena == "":
+      print("Empty 'arena' value near:", persona.scratch.curr_tile)
+    persona.s_mem.add_place(world, sector, arena, game_object)
 
   # PERCEIVE EVENTS. 
   # We will perceive events that take place in the same arena as the
-  # persona's current arena. 
-  curr_arena_path = maze.get_tile_path(persona.scratch.curr_tile, "arena")
-  # We do not perceive the same event twice (this can happen if an object is
-  # extended across multiple tiles).
-  percept_events_set = set()
-  # We will order our percept based on the distance, with the closest ones
-  # getting priorities. 
-  percept_events_list = []
-  # First, we put all events that are occuring in the nearby tiles into the
-  # percept_events_list
-  for tile in nearby_tiles: 
-    tile_details = maze.access_tile(tile)
-    if tile_details["events"]: 
-      if maze.get_tile_path(tile, "arena") == curr_arena_path:  
-        # This calculates the distance between the persona's current tile, 
-        # and the target tile.
-        dist = math.dist([tile[0], tile[1]], 
-                         [persona.scratch.curr_tile[0], 
-                          persona.scratch.curr_tile[1]])
-        # Add any relevant events to our temp set/list with the distant info. 
-        for event in tile_details["events"]: 
-          if event not in percept_events_set: 
-            percept_events_list += [[dist, event]]
-            percept_events_set.add(event)
-
-  # We sort, and perceive only persona.scratch.att_bandwidth of the closest
-  # events. If the bandwidth is larger, then it means the persona can perceive
-  # more elements within a small area. 
-
-
-  percept_events_list = sorted(percept_events_list, key=itemgetter(0))
-  perceived_events = []
-  for dist, event in percept_events_list[:persona.scratch.att_bandwidth]: 
-    perceived_events += [event]
+  # persona's current arena, within its vision radius; an event spanning 
+  # multiple tiles (e.g., an extended object) is only counted once. Of 
+  # those, we perceive only persona.scratch.att_bandwidth of the closest 
+  # events. If the bandwidth is larger, then it means the persona can 
+  # perceive more elements within a small area. 
+  perceived_events = maze.get_nearest_events(persona.scratch.curr_tile, 
+                                             persona.scratch.vision_r, 
+                                             persona.scratch.att_bandwidth)
 
   # Storing events. 
   # <ret_events> is a list of <ConceptNode> instances from the persona's 
   # associative memory. 
   ret_events = []
   for p_event in perceived_events: 
-    s, p, o, desc = p_event
-    if not p: 
-      # If the object is not present, then we default the event to "idle".
-      p = "is"
-      o = "idle"
-      desc = "idle"
-    desc = f"{s.split(':')[-1]} is {desc}"
+    s, p, o, desc = _describe_event(p_event)
     p_event = (s, p, o)
 
-
     # We retrieve the latest persona.scratch.retention events. If there is  
     # something new that is happening (that is, p_event not in latest_events),
     # then we add that event to the a_mem and return it. 
-    latest_events = persona.a_mem.get_summarized_latest_events(
-                                    persona.scratch.retention)
-
-    if ((p_event not in latest_events) or 
-        (p_event[0] in str(persona.scratch.next_step) and persona.scratch.chatting_with == None)):
+    if _is_new_event(persona, p_event):
       # We start by managing keywords. 
       keywords = set()
       sub = p_event[0]
@@ -172,11 +174,7 @@ def perceive(persona, maze):
       keywords.update([sub, obj])
 
       # Get event embedding
-      desc_embedding_in = desc
-      if "(" in desc: 
-        desc_embedding_in = (desc_embedding_in.split("(")[1]
-                                              .split(")")[0]
-                                              .strip())
+      desc_embedding_in = _embedding_text(desc)
       if desc_embedding_in in persona.a_mem.embeddings: 
         event_embedding = persona.a_mem.embeddings[desc_embedding_in]
       else: 
@@ -1,4 +1,5 @@
 import datetime
+import functools
 import math
 import random 
 import sys
@@ -772,18 +773,14 @@ def _should_react(persona, retrieved, personas):
         != target_persona.scratch.act_address): 
       return False
 
-    react_mode = generate_decide_to_react(init_persona, 
-                                          target_persona, retrieved)
-
-    if react_mode == "1": 
-      wait_until = ((target_persona.scratch.act_start_time 
-        + datetime.timedelta(minutes=target_persona.scratch.act_duration - 1))
-        .strftime("%B %d, %Y, %H:%M:%S"))
-      return f"wait: {wait_until}"
-    elif react_mode == "2":
-      return False
-    else:
-      return False #"keep" 
+    # The prompt is sent with the other LLM requests of the tick, and the
+    # reaction it decides on is applied after the personas have moved.
+    init_persona.llm_requests.append((
+      functools.partial(generate_decide_to_react, init_persona, 
+                        target_persona, retrieved),
+      functools.partial(_apply_decide_to_react, init_persona, 
+                        target_persona)))
+    return False
 
   # If the persona is chatting right now, default to no reaction 
   if persona.scratch.chatting_with: 
@@ -808,6 +805,21 @@ def _should_react(persona, retrieved, personas):
   return False
 
 
+def _apply_decide_to_react(init_persona, target_persona, react_mode): 
+  """
+  Applies what generate_decide_to_react() decided for <init_persona> (see
+  _should_react()). A chat started with it meanwhile comes first. 
+  """
+  if init_persona.scratch.chatting_with: 
+    return
+  if react_mode == "1": 
+    wait_until = ((target_persona.scratch.act_start_time 
+      + datetime.timedelta(minutes=target_persona.scratch.act_duration - 1))
+      .strftime("%B %d, %Y, %H:%M:%S"))
+    _wait_react(init_persona, f"wait: {wait_until}")
+  # "2" and anything else: keep doing what it does. 
+
+
 def _create_react(persona, inserted_act, inserted_act_dur,
                   act_address, act_event, chatting_with, chat, chatting_with_buffer,
                   chatting_end_time, 
@@ -871,12 +883,40 @@ def _chat_react(maze, persona, focused_event, reaction_mode, personas):
   target_persona = personas.get(target_name)
   if not target_persona:
     return
-  curr_personas = [init_persona, target_persona]
+  # The chat changes the target too, so a dormant one joins the step again.
+  personas.wake(target_name)
+
+  # The conversation is generated with the other LLM requests of the tick, 
+  # once all personas have moved, and only then applied. Until then both 
+  # personas are held in the chat, so neither starts another one. 
+  for p, other in [(init_persona, target_persona), 
+                   (target_persona, init_persona)]: 
+    p.scratch.chatting_with = other.name
+    p.scratch.act_address = f"<persona> {other.name}"
+  init_persona.llm_requests.append((
+    functools.partial(_generate_chat, maze, init_persona, target_persona),
+    functools.partial(_apply_chat, maze, init_persona, target_persona)))
+
+
+def _generate_chat(maze, init_persona, target_persona): 
+  """
+  Generates the conversation of a chat _chat_react() started, and its 
+  summary. Only reads the personas and the maze. 
 
-  # Actually creating the conversation here. 
+  OUTPUT: 
+    (convo, duration_min, convo_summary)
+  """
   convo, duration_min = generate_convo(maze, init_persona, target_persona)
-  convo_summary = generate_convo_summary(init_persona, convo)
-  
+  return convo, duration_min, generate_convo_summary(init_persona, convo)
+
+
+def _apply_chat(maze, init_persona, target_persona, chat): 
+  """
+  Commits a chat _chat_react() started, given what _generate_chat() 
+  returned for it. 
+  """
+  convo, duration_min, convo_summary = chat
+
   # Each persona in convosation has different reaction depending on if it needs to be scripted
   init_persona.react_to_chat(convo_summary, target_persona, maze)
   target_persona.react_to_chat(convo_summary, init_persona, maze)
@@ -0,0 +1,166 @@
+"""
+Approximate nearest-neighbour (IVF) index over a persona's memory embeddings.
+
+Staff personas in long runs accumulate thousands of event and thought nodes,
+and new_retrieve scores all of them against every focal point. An IVFIndex
+clusters the (unit length) embeddings with k-means into about sqrt(n)
+lists; a search only looks at the lists whose centroids are closest to the
+query, so RetrievalIndex re-scores those candidates exactly instead of every
+node.
+
+How many lists are probed is calibrated whenever the index is trained: it is
+the smallest number for which, on a sample of the memories themselves used as
+queries, at least <recall> of the true top-<k> neighbours are found. The index
+is trained once a persona has <min_nodes> nodes and again each time the
+number of nodes doubles; nodes added in between go to their nearest list.
+
+Run this file to compare approximate and exact retrieval on synthetic
+memories.
+"""
+import numpy as np
+
+
+class IVFIndex:
+  def __init__(self, recall=0.95, min_nodes=2000, k=30, n_iter=10, seed=0):
+    """
+    INPUT
+      recall: Target fraction of the true top-<k> neighbours of a query that
+              the probed lists must contain.
+      min_nodes: Personas with fewer (non-idle) nodes are scored exactly.
+      k: The neighbourhood size the recall is calibrated for (new_retrieve's
+         default n_count).
+      n_iter: k-means iterations per training.
+      seed: Seed of the k-means initialisation and calibration sample.
+    """
+    self.recall = recall
+    self.min_nodes = min_nodes
+    self.k = k
+    self.n_iter = n_iter
+    self.rng = np.random.default_rng(seed)
+
+    self.centroids = None
+    # <lists[c]> are the entries (RetrievalIndex rows) nearest centroid c.
+    self.lists = []
+    self.n_probe = 0
+    self.n_trained = 0
+
+  @property
+  def trained(self):
+    return self.centroids is not None
+
+  def needs_training(self, n):
+    if n < self.min_nodes:
+      return False
+    return not self.trained or n >= 2 * self.n_trained
+
+  def _kmeans(self, vectors, n_lists):
+    centroids = vectors[self.rng.choice(len(vectors), n_lists,
+                                        replace=False)].copy()
+    for _ in range(self.n_iter):
+      assign = np.argmax(vectors @ centroids.T, axis=1)
+      members = np.zeros((n_lists, len(vectors)), dtype=vectors.dtype)
+      members[assign, np.arange(len(vectors))] = 1
+      sums = members @ vectors
+      norms = np.linalg.norm(sums, axis=1)
+      # A list that lost all its members keeps its old centroid.
+      filled = norms > 0
+      centroids[filled] = sums[filled] / norms[filled, None]
+    return centroids
+
+  def train(self, entries, vectors):
+    """
+    Rebuilds the index.
+
+    INPUT
+      entries: The entries to index, as an int array.
+      vectors: Their embeddings scaled to unit length, one row per entry.
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    n_lists = max(1, int(round(np.sqrt(len(entries)))))
+    centroids = self._kmeans(vectors, n_lists)
+    assign = np.argmax(vectors @ centroids.T, axis=1)
+
+    # Calibrate n_probe: for sample queries, find how many of the closest
+    # lists must be probed to reach each true neighbour.
+    queries = vectors[self.rng.choice(len(vectors), min(64, len(vectors)),
+                                      replace=False)]
+    k = min(self.k, len(vectors))
+    neighbours = np.argpartition(-(queries @ vectors.T), k - 1, axis=1)[:, :k]
+    probe_order = np.argsort(-(queries @ centroids.T), axis=1)
+    probe_rank = np.empty_like(probe_order)
+    rows = np.arange(len(queries))[:, None]
+    probe_rank[rows, probe_order] = np.arange(n_lists)
+    needed = probe_rank[rows, assign[neighbours]].ravel()
+    recall_at = np.cumsum(np.bincount(needed, minlength=n_lists)) / needed.size
+    self.n_probe = min(n_lists,
+                       int(np.searchsorted(recall_at, self.recall)) + 1)
+
+    self.centroids = centroids
+    self.lists = [entries[assign == c].tolist() for c in range(n_lists)]
+    self.n_trained = len(entries)
+
+  def add(self, entry, vector):
+    """
+    Puts a new entry, with a unit length <vector>, in its nearest list.
+    """
+    self.lists[int(np.argmax(self.centroids @ vector))] += [entry]
+
+  def search(self, query):
+    """
+    Returns the candidate entries for a unit length <query>: those in the
+    <n_probe> closest lists, and in the farthest list, which holds the
+    least relevant nodes that relevance is normalized against.
+    """
+    order = np.argsort(-(self.centroids @ query))
+    probed = list(order[:self.n_probe])
+    if order[-1] not in probed:
+      probed += [order[-1]]
+    return np.concatenate([np.asarray(self.lists[c], dtype=np.int64)
+                           for c in probed])
+
+
+if __name__ == '__main__':
+  import datetime
+  import os
+  import sys
+  import tempfile
+  import time
+  import types
+  sys.path.append(os.path.join(os.path.dirname(__file__), "../../"))
+  from persona.memory_structures.embedding_matrix import EmbeddingMatrix
+  from persona.memory_structures.retrieval_index import RetrievalIndex
+
+  rng = np.random.default_rng(0)
+  n_nodes, dim, n_topics, n_count = 5000, 1536, 80, 30
+  topics = rng.normal(size=(n_topics, dim))
+  start = datetime.datetime(2024, 1, 1)
+  folder = tempfile.TemporaryDirectory()
+  embeddings = EmbeddingMatrix(folder.name)
+  exact, approximate = RetrievalIndex(), RetrievalIndex(IVFIndex())
+  for i in range(n_nodes):
+    key = f"memory {i}"
+    embeddings[key] = (topics[rng.integers(n_topics)]
+                       + 2 * rng.normal(size=dim))
+    node = types.SimpleNamespace(
+      node_id=f"node_{i + 1}", type="event", type_count=i + 1,
+      embedding_key=key, poignancy=int(rng.integers(1, 10)),
+      last_accessed=start + datetime.timedelta(minutes=i))
+    exact.add(node, embeddings[key])
+    approximate.add(node, embeddings[key])
+
+  focal_points = [topics[rng.integers(n_topics)] + 2 * rng.normal(size=dim)
+                  for _ in range(50)]
+  approximate.rank(embeddings, focal_points[0], 0.99, 1, 1, 1, n_count)
+
+  results = dict()
+  for name, index in (("exact", exact), ("approximate", approximate)):
+    begin = time.perf_counter()
+    results[name] = [index.rank(embeddings, focal, 0.99, 1, 1, 1, n_count)
+                     for focal in focal_points]
+    seconds = time.perf_counter() - begin
+    print (f"{name:>11}: {1000 * seconds / len(focal_points):.2f} ms/query")
+  overlap = [len(set(map(id, a)) & set(map(id, b))) / n_count
+             for a, b in zip(results["exact"], results["approximate"])]
+  print (f"lists probed: {approximate.ann.n_probe}/"
+         f"{len(approximate.ann.lists)}, top-{n_count} recall: "
+         f"{np.mean(overlap):.3f}")
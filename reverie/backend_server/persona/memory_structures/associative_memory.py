@@ -1,10 +1,15 @@
 import sys
 sys.path.append('../../')
 
+import os
 import json
 import datetime
+from collections.abc import Sequence
 
 from global_methods import *
+from persona.memory_structures.embedding_matrix import EmbeddingMatrix
+from persona.memory_structures.retrieval_index import RetrievalIndex
+from persona.memory_structures.ann_index import IVFIndex
 
 
 class ConceptNode: 
@@ -32,19 +37,143 @@ class ConceptNode:
     self.poignancy = poignancy
     self.keywords = keywords
     self.filling = filling
+    # How many times this was observed; repeats of an idle event are 
+    # merged into one node by AssociativeMemory.forget. 
+    self.count = 1
 
 
   def spo_summary(self): 
     return (self.subject, self.predicate, self.object)
 
 
+def node_record(node): 
+  """
+  Returns the JSON record of <node> in nodes.jsonl. 
+  """
+  r = dict()
+  r["node_id"] = node.node_id
+  r["node_count"] = node.node_count
+  r["type_count"] = node.type_count
+  r["type"] = node.type
+  r["depth"] = node.depth
+
+  r["created"] = node.created.strftime('%Y-%m-%d %H:%M:%S')
+  r["expiration"] = None
+  if node.expiration: 
+    r["expiration"] = node.expiration.strftime('%Y-%m-%d %H:%M:%S')
+
+  r["subject"] = node.subject
+  r["predicate"] = node.predicate
+  r["object"] = node.object
+
+  r["description"] = node.description
+  r["embedding_key"] = node.embedding_key
+  r["poignancy"] = node.poignancy
+  r["keywords"] = list(node.keywords)
+  r["filling"] = node.filling
+  r["count"] = node.count
+  return r
+
+
+def read_node_log(f_node_log): 
+  """
+  Reads a nodes.jsonl file. 
+
+  OUTPUT: 
+    The node records in the order they were written, and the size in bytes
+    of the part of the file they were read from. A last line that was cut
+    short (e.g., by a crash during a save) is left out. 
+  """
+  records = []
+  size = 0
+  with open(f_node_log, "rb") as f: 
+    for line in f: 
+      if not line.endswith(b"\n"): 
+        break
+      records += [json.loads(line)]
+      size += len(line)
+  return records, size
+
+
+class NodeSequence(Sequence): 
+  """
+  A list of nodes, newest first. Nodes are kept in the order they were 
+  added, so adding one is an append rather than an insert at the front, 
+  and s[i] and s[:n] are looked up from the end. 
+  """
+  def __init__(self, nodes=()): 
+    # Oldest first. 
+    self._nodes = list(nodes)
+
+  def push(self, node): 
+    """
+    Adds <node> as the newest node (i.e., at index 0). 
+    """
+    self._nodes += [node]
+
+  def discard(self, nodes): 
+    """
+    Removes the nodes in the set <nodes>. 
+    """
+    self._nodes = [node for node in self._nodes if node not in nodes]
+
+  def __len__(self): 
+    return len(self._nodes)
+
+  def __getitem__(self, i): 
+    n = len(self._nodes)
+    if isinstance(i, slice): 
+      return [self._nodes[n - 1 - j] for j in range(*i.indices(n))]
+    if i < 0: 
+      i += n
+    if not 0 <= i < n: 
+      raise IndexError("NodeSequence index out of range")
+    return self._nodes[n - 1 - i]
+
+  def __iter__(self): 
+    return reversed(self._nodes)
+
+  def __reversed__(self): 
+    return iter(self._nodes)
+
+  def __add__(self, other): 
+    return list(self) + list(other)
+
+  def __radd__(self, other): 
+    return list(other) + list(self)
+
+  def __eq__(self, other): 
+    if isinstance(other, (NodeSequence, list)): 
+      return list(self) == list(other)
+    return NotImplemented
+
+  def __repr__(self): 
+    return f"NodeSequence({list(self)!r})"
+
+
 class AssociativeMemory: 
+  # The simulation's shared EmbeddingMatrix (see embedding_matrix.py). When 
+  # it is set, <embeddings> is that matrix rather than a per-persona dict 
+  # loaded from (and saved to) embeddings.json. Set by ReverieServer. 
+  embedding_matrix = None
+  # Keyword arguments of the IVFIndex that pre-filters retrieval on large
+  # memories (see ann_index.py), or None to always score every node. Set by
+  # ReverieServer from the "ann_retrieval" entry of meta.json. 
+  ann_config = None
+
   def __init__(self, f_saved): 
     self.id_to_node = dict()
-
-    self.seq_event = []
-    self.seq_thought = []
-    self.seq_chat = []
+    # The last node_count and type_count given out. Forgotten nodes leave 
+    # gaps, so these can be larger than the number of nodes. 
+    self.node_count = 0
+    self.type_counts = {"event": 0, "thought": 0, "chat": 0}
+
+    # Newest first (see NodeSequence), as are the values of kw_to_*. 
+    self.seq_event = NodeSequence()
+    self.seq_thought = NodeSequence()
+    self.seq_chat = NodeSequence()
+    # The event and thought nodes in array form, for new_retrieve. 
+    self.retrieval_index = self.new_retrieval_index()
 
     self.kw_to_event = dict()
     self.kw_to_thought = dict()
@@ -53,24 +182,48 @@ class AssociativeMemory:
     self.kw_strength_event = dict()
     self.kw_strength_thought = dict()
 
-    self.embeddings = json.load(open(f_saved + "/embeddings.json"))
-
-    nodes_load = json.load(open(f_saved + "/nodes.json"))
-    for count in range(len(nodes_load.keys())): 
-      node_id = f"node_{str(count+1)}"
-      node_details = nodes_load[node_id]
-
+    f_embeddings = f_saved + "/embeddings.json"
+    if AssociativeMemory.embedding_matrix is not None: 
+      self.embeddings = AssociativeMemory.embedding_matrix
+      # Memories saved before the shared matrix (and persona templates) 
+      # still have their own embeddings.json. 
+      if os.path.exists(f_embeddings): 
+        self.embeddings.import_json(f_embeddings)
+    else: 
+      self.embeddings = json.load(open(f_embeddings))
+
+    # nodes.jsonl is the append-only log written by save(); older memories
+    # (and persona templates) have a nodes.json instead. 
+    self.f_node_log = None
+    self.logged_count = 0
+    self.log_size = 0
+    # Set when nodes that are in the log are forgotten. 
+    self.log_stale = False
+    f_node_log = f_saved + "/nodes.jsonl"
+    if os.path.exists(f_node_log): 
+      nodes_load, self.log_size = read_node_log(f_node_log)
+      self.f_node_log = os.path.abspath(f_node_log)
+      if nodes_load: 
+        self.logged_count = nodes_load[-1]["node_count"]
+    else: 
+      nodes_load = json.load(open(f_saved + "/nodes.json"))
+      nodes_load = [nodes_load[f"node_{str(count+1)}"] 
+                    for count in range(len(nodes_load.keys()))]
+    for node_details in nodes_load: 
       node_count = node_details["node_count"]
       type_count = node_details["type_count"]
       node_type = node_details["type"]
       depth = node_details["depth"]
+      # The add_* functions below give the node the next counts; this keeps
+      # the saved ones. 
+      self.node_count = node_count - 1
+      self.type_counts[node_type] = type_count - 1
 
-      created = datetime.datetime.strptime(node_details["created"], 
-                                           '%Y-%m-%d %H:%M:%S')
+      created = datetime.datetime.fromisoformat(node_details["created"])
       expiration = None
       if node_details["expiration"]: 
-        expiration = datetime.datetime.strptime(node_details["expiration"],
-                                                '%Y-%m-%d %H:%M:%S')
+        expiration = datetime.datetime.fromisoformat(
+          node_details["expiration"])
 
       s = node_details["subject"]
       p = node_details["predicate"]
@@ -84,14 +237,15 @@ class AssociativeMemory:
       filling = node_details["filling"]
       
       if node_type == "event": 
-        self.add_event(created, expiration, s, p, o, 
+        node = self.add_event(created, expiration, s, p, o, 
                    description, keywords, poignancy, embedding_pair, filling)
       elif node_type == "chat": 
-        self.add_chat(created, expiration, s, p, o, 
+        node = self.add_chat(created, expiration, s, p, o, 
                    description, keywords, poignancy, embedding_pair, filling)
       elif node_type == "thought": 
-        self.add_thought(created, expiration, s, p, o, 
+        node = self.add_thought(created, expiration, s, p, o, 
                    description, keywords, poignancy, embedding_pair, filling)
+      node.count = node_details.get("count", 1)
 
     kw_strength_load = json.load(open(f_saved + "/kw_strength.json"))
     if kw_strength_load["kw_strength_event"]: 
@@ -100,36 +254,50 @@ class AssociativeMemory:
       self.kw_strength_thought = kw_strength_load["kw_strength_thought"]
 
     
+  def new_retrieval_index(self): 
+    ann = None
+    if AssociativeMemory.ann_config is not None: 
+      ann = IVFIndex(**AssociativeMemory.ann_config)
+    return RetrievalIndex(ann)
+
+
   def save(self, out_json): 
-    r = dict()
-    for count in range(len(self.id_to_node.keys()), 0, -1): 
-      node_id = f"node_{str(count)}"
-      node = self.id_to_node[node_id]
-
-      r[node_id] = dict()
-      r[node_id]["node_count"] = node.node_count
-      r[node_id]["type_count"] = node.type_count
-      r[node_id]["type"] = node.type
-      r[node_id]["depth"] = node.depth
-
-      r[node_id]["created"] = node.created.strftime('%Y-%m-%d %H:%M:%S')
-      r[node_id]["expiration"] = None
-      if node.expiration: 
-        r[node_id]["expiration"] = (node.expiration
-                                        .strftime('%Y-%m-%d %H:%M:%S'))
-
-      r[node_id]["subject"] = node.subject
-      r[node_id]["predicate"] = node.predicate
-      r[node_id]["object"] = node.object
-
-      r[node_id]["description"] = node.description
-      r[node_id]["embedding_key"] = node.embedding_key
-      r[node_id]["poignancy"] = node.poignancy
-      r[node_id]["keywords"] = list(node.keywords)
-      r[node_id]["filling"] = node.filling
-
-    with open(out_json+"/nodes.json", "w") as outfile:
-      json.dump(r, outfile)
+    """
+    Saves the memory to the folder <out_json>. Only the nodes added since 
+    the last save are appended to its nodes.jsonl; the log is rewritten 
+    in full (see compact) if it is not the one this memory last wrote, or 
+    if nodes in it have been forgotten since. 
+    """
+    # The embeddings go first, so that every node in the log has its 
+    # embedding on disk. 
+    if AssociativeMemory.embedding_matrix is not None: 
+      self.embeddings.save()
+      # The embeddings now live in the shared matrix; an embeddings.json 
+      # left from before would only be imported again on the next load. 
+      if os.path.exists(out_json+"/embeddings.json"): 
+        os.remove(out_json+"/embeddings.json")
+    else: 
+      with open(out_json+"/embeddings.json", "w") as outfile:
+        json.dump(self.embeddings, outfile)
+
+    f_node_log = os.path.abspath(out_json + "/nodes.jsonl")
+    if (self.log_stale
+        or f_node_log != self.f_node_log
+        or not os.path.exists(f_node_log)
+        or os.path.getsize(f_node_log) != self.log_size): 
+      self.compact(out_json)
+    else: 
+      # <id_to_node> is in node_count order, so the new nodes are at its end.
+      new_nodes = []
+      for node in reversed(self.id_to_node.values()): 
+        if node.node_count <= self.logged_count: 
+          break
+        new_nodes += [node]
+      with open(f_node_log, "a") as outfile: 
+        for node in reversed(new_nodes): 
+          outfile.write(json.dumps(node_record(node)) + "\n")
+      self.logged_count = self.node_count
+      self.log_size = os.path.getsize(f_node_log)
 
     r = dict()
     r["kw_strength_event"] = self.kw_strength_event
@@ -137,16 +305,133 @@ class AssociativeMemory:
     with open(out_json+"/kw_strength.json", "w") as outfile:
       json.dump(r, outfile)
 
-    with open(out_json+"/embeddings.json", "w") as outfile:
-      json.dump(self.embeddings, outfile)
+
+  def compact(self, out_json): 
+    """
+    Writes every node to a new <out_json>/nodes.jsonl, replacing the old 
+    log (and any nodes.json) only once the new one is complete. 
+    """
+    f_node_log = out_json + "/nodes.jsonl"
+    with open(f_node_log + ".tmp", "w") as outfile: 
+      for node in self.id_to_node.values(): 
+        outfile.write(json.dumps(node_record(node)) + "\n")
+    os.replace(f_node_log + ".tmp", f_node_log)
+    if os.path.exists(out_json + "/nodes.json"): 
+      os.remove(out_json + "/nodes.json")
+    self.f_node_log = os.path.abspath(f_node_log)
+    self.logged_count = self.node_count
+    self.log_stale = False
+    self.log_size = os.path.getsize(f_node_log)
+
+
+  def forget(self, curr_time, keep_recent): 
+    """
+    Bounds the memory of a long-running persona. Events and thoughts whose 
+    expiration has passed are dropped, and each unbroken run of the same 
+    idle event ("X is idle", with no other event of X in between) is merged
+    into the latest of them, whose count goes up by theirs. The 
+    <keep_recent> latest events are not merged, so what the persona 
+    perceived lately (see get_summarized_latest_events) is kept as is. 
+    Nodes that a remaining thought was drawn from (its <filling>) are kept,
+    so that the thought still finds them. Chats are never forgotten. 
+
+    INPUT
+      curr_time: The current simulation time. 
+      keep_recent: How many of the latest events are left unmerged 
+                   (scratch.concept_forget). 
+    OUTPUT
+      The number of nodes forgotten. 
+    """
+    def expired(node): 
+      return node.expiration and node.expiration <= curr_time
+
+    # The nodes the remaining thoughts were drawn from, and in turn the 
+    # nodes those were drawn from. 
+    in_filling = set()
+    fillings = [node.filling for node in self.seq_thought 
+                if not expired(node)]
+    while fillings: 
+      for node_id in fillings.pop() or []: 
+        node = self.id_to_node.get(node_id) if isinstance(node_id, str) else None
+        if node is not None and node not in in_filling: 
+          in_filling.add(node)
+          if node.type == "thought": 
+            fillings += [node.filling]
+
+    gone = set()
+    # subject -> the latest idle event of its current run. 
+    idle_run = dict()
+    for count, node in enumerate(self.seq_event): 
+      idle = f"{node.predicate} {node.object}" == "is idle"
+      if not idle: 
+        # Any other event of the subject ends its run of idle events. 
+        idle_run.pop(node.subject, None)
+        if expired(node) and node not in in_filling: 
+          gone.add(node)
+      elif expired(node) and node not in in_filling: 
+        gone.add(node)
+      elif count >= keep_recent: 
+        head = idle_run.get(node.subject)
+        if (head is not None and head.spo_summary() == node.spo_summary() 
+            and node not in in_filling): 
+          head.count += node.count
+          gone.add(node)
+        else: 
+          idle_run[node.subject] = node
+    for node in self.seq_thought: 
+      if expired(node) and node not in in_filling: 
+        gone.add(node)
+    if not gone: 
+      return 0
+
+    self.seq_event.discard(gone)
+    self.seq_thought.discard(gone)
+    touched = {"event": set(), "thought": set()}
+    for node in gone: 
+      del self.id_to_node[node.node_id]
+      if node.node_count <= self.logged_count: 
+        self.log_stale = True
+      keywords = set(i.lower() for i in node.keywords)
+      touched[node.type].update(keywords)
+      # add_event and add_thought only count keywords of non-idle nodes.
+      if f"{node.predicate} {node.object}" != "is idle": 
+        kw_strength = (self.kw_strength_event if node.type == "event" 
+                       else self.kw_strength_thought)
+        for kw in keywords: 
+          if kw in kw_strength: 
+            kw_strength[kw] -= 1
+            if kw_strength[kw] <= 0: 
+              del kw_strength[kw]
+    for kw_to, keywords in ((self.kw_to_event, touched["event"]), 
+                            (self.kw_to_thought, touched["thought"])): 
+      for kw in keywords: 
+        if kw in kw_to: 
+          kw_to[kw].discard(gone)
+          if not kw_to[kw]: 
+            del kw_to[kw]
+
+    # The shared embedding matrix keeps every embedding; a persona's own 
+    # embeddings only need those its nodes still use. 
+    if AssociativeMemory.embedding_matrix is None: 
+      in_use = set(node.embedding_key for node in self.id_to_node.values())
+      for key in [key for key in self.embeddings if key not in in_use]: 
+        del self.embeddings[key]
+
+    self.retrieval_index = self.new_retrieval_index()
+    for node in self.id_to_node.values(): 
+      if node.type in ("event", "thought"): 
+        self.retrieval_index.add(node, self.embeddings[node.embedding_key])
+    return len(gone)
 
 
   def add_event(self, created, expiration, s, p, o, 
                       description, keywords, poignancy, 
                       embedding_pair, filling):
     # Setting up the node ID and counts.
-    node_count = len(self.id_to_node.keys()) + 1
-    type_count = len(self.seq_event) + 1
+    self.node_count += 1
+    self.type_counts["event"] += 1
+    node_count = self.node_count
+    type_count = self.type_counts["event"]
     node_type = "event"
     node_id = f"node_{str(node_count)}"
     depth = 0
@@ -165,13 +450,13 @@ class AssociativeMemory:
                        poignancy, keywords, filling)
 
     # Creating various dictionary cache for fast access. 
-    self.seq_event[0:0] = [node]
+    self.seq_event.push(node)
     keywords = [i.lower() for i in keywords]
     for kw in keywords: 
       if kw in self.kw_to_event: 
-        self.kw_to_event[kw][0:0] = [node]
+        self.kw_to_event[kw].push(node)
       else: 
-        self.kw_to_event[kw] = [node]
+        self.kw_to_event[kw] = NodeSequence([node])
     self.id_to_node[node_id] = node 
 
     # Adding in the kw_strength
@@ -183,6 +468,7 @@ class AssociativeMemory:
           self.kw_strength_event[kw] = 1
 
     self.embeddings[embedding_pair[0]] = embedding_pair[1]
+    self.retrieval_index.add(node, self.embeddings[embedding_pair[0]])
 
     return node
 
@@ -191,8 +477,10 @@ class AssociativeMemory:
                         description, keywords, poignancy, 
                         embedding_pair, filling):
     # Setting up the node ID and counts.
-    node_count = len(self.id_to_node.keys()) + 1
-    type_count = len(self.seq_thought) + 1
+    self.node_count += 1
+    self.type_counts["thought"] += 1
+    node_count = self.node_count
+    type_count = self.type_counts["thought"]
     node_type = "thought"
     node_id = f"node_{str(node_count)}"
     depth = 1 
@@ -209,13 +497,13 @@ class AssociativeMemory:
                        description, embedding_pair[0], poignancy, keywords, filling)
 
     # Creating various dictionary cache for fast access. 
-    self.seq_thought[0:0] = [node]
+    self.seq_thought.push(node)
     keywords = [i.lower() for i in keywords]
     for kw in keywords: 
       if kw in self.kw_to_thought: 
-        self.kw_to_thought[kw][0:0] = [node]
+        self.kw_to_thought[kw].push(node)
       else: 
-        self.kw_to_thought[kw] = [node]
+        self.kw_to_thought[kw] = NodeSequence([node])
     self.id_to_node[node_id] = node 
 
     # Adding in the kw_strength
@@ -227,6 +515,7 @@ class AssociativeMemory:
           self.kw_strength_thought[kw] = 1
 
     self.embeddings[embedding_pair[0]] = embedding_pair[1]
+    self.retrieval_index.add(node, self.embeddings[embedding_pair[0]])
 
     return node
 
@@ -235,8 +524,10 @@ class AssociativeMemory:
                      description, keywords, poignancy, 
                      embedding_pair, filling): 
     # Setting up the node ID and counts.
-    node_count = len(self.id_to_node.keys()) + 1
-    type_count = len(self.seq_chat) + 1
+    self.node_count += 1
+    self.type_counts["chat"] += 1
+    node_count = self.node_count
+    type_count = self.type_counts["chat"]
     node_type = "chat"
     node_id = f"node_{str(node_count)}"
     depth = 0
@@ -248,13 +539,13 @@ class AssociativeMemory:
                        description, embedding_pair[0], poignancy, keywords, filling)
 
     # Creating various dictionary cache for fast access. 
-    self.seq_chat[0:0] = [node]
+    self.seq_chat.push(node)
     keywords = [i.lower() for i in keywords]
     for kw in keywords: 
       if kw in self.kw_to_chat: 
-        self.kw_to_chat[kw][0:0] = [node]
+        self.kw_to_chat[kw].push(node)
       else: 
-        self.kw_to_chat[kw] = [node]
+        self.kw_to_chat[kw] = NodeSequence([node])
     self.id_to_node[node_id] = node 
 
     self.embeddings[embedding_pair[0]] = embedding_pair[1]
@@ -0,0 +1,145 @@
+"""
+One embedding matrix per simulation, shared by all its personas.
+
+Each persona used to keep its own embeddings.json (text -> list of floats),
+so the same event descriptions were stored, and rewritten on every save,
+once per persona. Here every distinct text gets one row of a float32 matrix
+that is memory-mapped from <folder>/matrix.f32, and <folder>/index.jsonl
+lists the texts in row order (line i is the text of row i). Both files only
+ever grow, so saving writes just the rows added since the last save.
+
+AssociativeMemory uses the matrix in place of its embeddings dict when
+AssociativeMemory.embedding_matrix is set (ReverieServer does this); a
+ConceptNode's embedding_key is then looked up through it.
+"""
+import json
+import os
+from collections.abc import Mapping
+
+import numpy as np
+
+
+class EmbeddingMatrix(Mapping):
+  def __init__(self, folder):
+    """
+    INPUT
+      folder: The folder holding matrix.f32 and index.jsonl. It is created
+              if needed; existing files are loaded.
+    """
+    self.folder = folder
+    self.f_matrix = f"{folder}/matrix.f32"
+    self.f_index = f"{folder}/index.jsonl"
+    os.makedirs(folder, exist_ok=True)
+
+    # <texts[i]> is the text of row i and <rows> maps a text to its row.
+    self.texts = []
+    if os.path.exists(self.f_index):
+      with open(self.f_index) as f:
+        self.texts = [json.loads(line) for line in f if line.strip()]
+    self.rows = {text: row for row, text in enumerate(self.texts)}
+    # Rows (and texts) up to <n_saved> are already in index.jsonl.
+    self.n_saved = len(self.texts)
+
+    self.dim = None
+    self._mm = None
+    self._capacity = 0
+    if self.texts: 
+      # The file may have spare rows past the last text, so the dimension
+      # is kept in a file of its own. 
+      with open(f"{folder}/dim") as f:
+        self.dim = int(f.read())
+      self._map(os.path.getsize(self.f_matrix) // (4 * self.dim))
+    # Template memories whose embeddings.json has been imported already.
+    self._imported = set()
+
+  def _map(self, capacity):
+    self._mm = np.memmap(self.f_matrix, dtype=np.float32, mode="r+",
+                         shape=(capacity, self.dim))
+    self._capacity = capacity
+
+  def _grow(self, min_rows):
+    capacity = max(64, 2 * self._capacity, min_rows)
+    if self._mm is not None:
+      self._mm.flush()
+    with open(self.f_matrix, "ab") as f:
+      f.truncate(capacity * self.dim * 4)
+    self._map(capacity)
+
+  def add(self, text, vector):
+    """
+    Returns the row of <text>, adding <vector> as a new row if the text is
+    not in the matrix yet. A text keeps the first vector it was added with.
+    """
+    row = self.rows.get(text)
+    if row is not None:
+      return row
+    vector = np.asarray(vector, dtype=np.float32)
+    if self.dim is None:
+      self.dim = len(vector)
+      with open(f"{self.folder}/dim", "w") as f:
+        f.write(str(self.dim))
+    if len(vector) != self.dim:
+      raise ValueError(f"Embedding of {text!r} has {len(vector)} values, "
+                       f"expected {self.dim}")
+    row = len(self.texts)
+    if row >= self._capacity:
+      self._grow(row + 1)
+    self._mm[row] = vector
+    self.texts += [text]
+    self.rows[text] = row
+    return row
+
+  def __setitem__(self, text, vector):
+    self.add(text, vector)
+
+  def update(self, embeddings):
+    for text, vector in embeddings.items():
+      self.add(text, vector)
+
+  def __getitem__(self, text):
+    return self._mm[self.rows[text]]
+
+  def __contains__(self, text):
+    return text in self.rows
+
+  def __iter__(self):
+    return iter(self.texts)
+
+  def __len__(self):
+    return len(self.texts)
+
+  @property
+  def matrix(self):
+    """
+    The (len(self), dim) float32 matrix of all embeddings, in row order.
+    """
+    if self._mm is None:
+      return np.zeros((0, self.dim or 0), dtype=np.float32)
+    return self._mm[:len(self.texts)]
+
+  def import_json(self, f_embeddings):
+    """
+    Adds the embeddings of an old-style embeddings.json file. Each file is
+    only read once, so that new personas made from the same template do not
+    parse it again.
+    """
+    key = os.path.abspath(f_embeddings)
+    if key in self._imported:
+      return
+    with open(f_embeddings) as f:
+      self.update(json.load(f))
+    self._imported.add(key)
+
+  def save(self):
+    """
+    Writes the rows added since the last save. The matrix is flushed before
+    their texts are appended to the index, so the index never lists a row
+    that is not on disk.
+    """
+    if len(self.texts) == self.n_saved:
+      return
+    self._mm.flush()
+    with open(self.f_index, "a") as f:
+      for text in self.texts[self.n_saved:]:
+        f.write(json.dumps(text) + "\n")
+    self.n_saved = len(self.texts)
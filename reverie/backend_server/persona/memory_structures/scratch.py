@@ -4,9 +4,17 @@ import sys
 sys.path.append('../../')
 
 from global_methods import *
+from sim_clock import Deadline
 
 class Scratch: 
+  # Sim-time deadlines; setting one (re)schedules its timer (see sim_clock).
+  chatting_end_time = Deadline()
+
   def __init__(self, f_saved): 
+    # Called as deadline_listener(name, when) whenever a Deadline is set; set
+    # by the PersonaRegistry the persona is registered in.
+    self.deadline_listener = None
+
     # PERSONA HYPERPARAMETERS
     # <vision_r> denotes the number of tiles that the persona can see around 
     # them. 
@@ -8,6 +8,8 @@ from persona.memory_structures.scratch import *
 from global_methods import *
 
 class bedside_nurse_scratch(Scratch):
+    time_to_next = Deadline()
+
     def __init__(self, f_saved):
         super().__init__(f_saved)
         self.occupied = None
@@ -6,15 +6,18 @@ import sys
 sys.path.append('../../')
 from persona.memory_structures.scratch import *
 from global_methods import *
+from ed_queue import EDQueue
 
 class doctor_scratch(Scratch):
+    time_to_next = Deadline()
+
     def __init__(self, f_saved):
         super().__init__(f_saved)
         self.chatting_patient = None
         self.time_to_next = None
         self.last_idle_move_time = None
         self.assigned_patients = []
-        self.assigned_patients_waitlist = []
+        self.assigned_patients_waitlist = EDQueue()
         if check_if_file_exists(f_saved): 
             scratch_load = json.load(open(f_saved))
             if("chatting_patient" in scratch_load):
@@ -28,7 +31,8 @@ class doctor_scratch(Scratch):
                     scratch_load["last_idle_move_time"], "%B %d, %Y, %H:%M:%S"
                 )
             self.assigned_patients = scratch_load.get("assigned_patients", [])
-            self.assigned_patients_waitlist = scratch_load.get("assigned_patients_waitlist", [])
+            self.assigned_patients_waitlist = EDQueue(
+                scratch_load.get("assigned_patients_waitlist"))
 
                 
     def save(self, out_json):
@@ -47,7 +51,7 @@ class doctor_scratch(Scratch):
             scratch["last_idle_move_time"] = None
 
         scratch["assigned_patients"] = self.assigned_patients
-        scratch["assigned_patients_waitlist"] = self.assigned_patients_waitlist
+        scratch["assigned_patients_waitlist"] = self.assigned_patients_waitlist.to_list()
         with open(out_json, "w") as outfile:
             json.dump(scratch, outfile, indent=2)  
 
@@ -7,7 +7,19 @@ from persona.memory_structures.scratch import *
 from global_methods import *
 
 class patient_scratch(Scratch):
+    time_to_next = Deadline()
+    testing_end_time = Deadline()
+    initial_assessment_ready_at = Deadline()
+    disposition_ready_at = Deadline()
+    exit_ready_at = Deadline()
+    linger_end_time = Deadline()
+    admission_boarding_end = Deadline()
+    preload_departure_at = Deadline()
+
     def __init__(self, f_saved):
+        # Called as state_listener(old_state, new_state) whenever the state
+        # changes; set by the PersonaRegistry the patient is registered in.
+        self.state_listener = None
         super().__init__(f_saved)
         self.ICD = None
         self.CTAS = None
@@ -113,6 +125,17 @@ class patient_scratch(Scratch):
             if boarding_end:
                 self.admission_boarding_end = datetime.datetime.strptime(boarding_end, "%B %d, %Y, %H:%M:%S")
 
+    @property
+    def state(self):
+        return self._state
+
+    @state.setter
+    def state(self, state):
+        old_state = getattr(self, "_state", None)
+        self._state = state
+        if self.state_listener is not None and state != old_state:
+            self.state_listener(old_state, state)
+
     def save(self, out_json):
         scratch = super().save(out_json)
         scratch["ICD"] = self.ICD
@@ -1,15 +1,221 @@
 import json
 import sys
+import copy
+import numpy as np
 sys.path.append('../../')
 
 from utils import *
 from global_methods import *
 
+class WorldCatalog: 
+  """
+  Immutable world -> sector -> arena -> game object catalog of the maze, 
+  built once from Maze.address_tiles and shared by every persona. Each place
+  is a node with an integer id, so a persona's MemoryTree only needs to 
+  record which nodes it has seen instead of keeping its own copy of the 
+  names. 
+  """
+  def __init__(self, address_tiles): 
+    # <paths> maps a node id to its place, e.g. 
+    #   ("ed map", "emergency department", "triage room", "chair")
+    self.paths = []
+    self.node_ids = dict()
+    # <children> maps a place to the node ids of the places right under it,
+    # in map order. The root's children are under the empty tuple.
+    children = dict()
+    for address in address_tiles: 
+      # Spawn locations and per-bed addresses (which end in the bed's x and
+      # y) are not places a persona remembers. 
+      if address.startswith("<"): 
+        continue
+      parts = tuple(address.split(":"))
+      if len(parts) > 4 or not all(parts): 
+        continue
+      for depth in range(1, len(parts) + 1): 
+        path = parts[:depth]
+        if path not in self.node_ids: 
+          self.node_ids[path] = len(self.paths)
+          self.paths += [path]
+          children.setdefault(path[:-1], []).append(self.node_ids[path])
+    self.children = {path: tuple(ids) for path, ids in children.items()}
+
+  def __len__(self): 
+    return len(self.paths)
+
+
 class MemoryTree: 
+  # The shared <WorldCatalog> of the current maze. ReverieServer sets it once
+  # the maze is loaded; from then on new trees are kept as a visibility 
+  # overlay on the catalog. Without it, the tree is a plain nested dict. 
+  catalog = None
+  # Overlays already built from spatial_memory.json contents, so personas 
+  # created from the same template (e.g., every new patient) skip the 
+  # spatial bootstrap. 
+  _overlay_cache = dict()
+  _OVERLAY_CACHE_SIZE = 64
+
   def __init__(self, f_saved): 
-    self.tree = {}
+    self.catalog = MemoryTree.catalog
+    # <seen_rank> holds, for each catalog node, the order in which the 
+    # persona came to know about it (0 if it does not), so places are listed
+    # in the order they were discovered, as with a plain dict tree. <_tree> 
+    # holds the whole tree when there is no catalog, and otherwise only the
+    # places that are not in the catalog. 
+    self.seen_rank = None
+    self._next_rank = 1
+    self._tree = {}
+    saved = None
     if check_if_file_exists(f_saved): 
-      self.tree = json.load(open(f_saved))
+      with open(f_saved) as f: 
+        saved = f.read()
+
+    if self.catalog is None: 
+      if saved is not None: 
+        self._tree = json.loads(saved)
+    else: 
+      cache_key = (self.catalog, saved)
+      if cache_key not in MemoryTree._overlay_cache: 
+        self.seen_rank = np.zeros(len(self.catalog), dtype=np.int32)
+        if saved is not None: 
+          self._add_tree(json.loads(saved))
+        if len(MemoryTree._overlay_cache) >= MemoryTree._OVERLAY_CACHE_SIZE: 
+          MemoryTree._overlay_cache.clear()
+        MemoryTree._overlay_cache[cache_key] = (self.seen_rank.copy(), 
+                                                self._next_rank,
+                                                copy.deepcopy(self._tree))
+      seen_rank, next_rank, extra = MemoryTree._overlay_cache[cache_key]
+      self.seen_rank = seen_rank.copy()
+      self._next_rank = next_rank
+      self._tree = copy.deepcopy(extra)
+
+    # <explored> is a bitmap ([y][x]) of the maze tiles whose places are 
+    # already in the tree, so that perceive only has to look at tiles the 
+    # persona has never seen. It is rebuilt as the persona looks around and
+    # is not part of spatial_memory.json. 
+    self.explored = None
+    self.explored_version = None
+
+
+  @property
+  def tree(self): 
+    """
+    The spatial memory as a nested dict, e.g., 
+      {"ed map": {"emergency department": {"triage room": ["chair"]}}}
+    With a catalog this is built on request, so it should be read (or 
+    replaced as a whole) but not edited in place; use add_place for that. 
+    """
+    if self.catalog is None: 
+      return self._tree
+    tree = {}
+    seen = np.flatnonzero(self.seen_rank)
+    for node_id in seen[np.argsort(self.seen_rank[seen])].tolist(): 
+      self._insert(tree, self.catalog.paths[node_id])
+    for path in self._walk(self._tree): 
+      self._insert(tree, path)
+    return tree
+
+
+  @tree.setter
+  def tree(self, tree): 
+    if self.catalog is None: 
+      self._tree = tree
+      return
+    self.seen_rank[:] = 0
+    self._next_rank = 1
+    self._tree = {}
+    self._add_tree(tree)
+
+
+  def add_place(self, world, sector, arena, game_object): 
+    """
+    Records that the persona has seen a place. Empty names end the place, 
+    e.g., a tile with no game object only adds its world, sector and arena.
+    """
+    path = ()
+    for name in (world, sector, arena, game_object): 
+      if not name: 
+        break
+      path += (name,)
+      node_id = None
+      if self.catalog is not None: 
+        node_id = self.catalog.node_ids.get(path)
+      if node_id is None: 
+        self._insert(self._tree, path)
+      elif not self.seen_rank[node_id]: 
+        self.seen_rank[node_id] = self._next_rank
+        self._next_rank += 1
+
+
+  def _add_tree(self, tree): 
+    for path in self._walk(tree): 
+      self.add_place(*(path + ("",) * (4 - len(path))))
+
+
+  def _walk(self, tree, path=()): 
+    # Yields every place of a nested dict tree, parents before children.
+    if isinstance(tree, dict): 
+      for key, val in tree.items(): 
+        yield path + (key,)
+        for sub_path in self._walk(val, path + (key,)): 
+          yield sub_path
+    else: 
+      for game_object in tree: 
+        yield path + (game_object,)
+
+
+  def _insert(self, tree, path): 
+    # Worlds and sectors hold dicts, arenas hold a list of game objects.
+    node = tree
+    for depth, name in enumerate(path): 
+      if depth < 2: 
+        node = node.setdefault(name, {})
+      elif depth == 2: 
+        node = node.setdefault(name, [])
+      elif name not in node: 
+        node += [name]
+
+
+  def _children(self, path): 
+    """
+    Returns the names of the known places right under <path>, or None if the
+    persona does not know <path> itself. 
+    """
+    names = None
+    if self.catalog is not None: 
+      node_id = self.catalog.node_ids.get(path)
+      if node_id is not None and self.seen_rank[node_id]: 
+        seen = [c for c in self.catalog.children.get(path, ()) 
+                if self.seen_rank[c]]
+        seen.sort(key=lambda c: self.seen_rank[c])
+        names = [self.catalog.paths[c][-1] for c in seen]
+    node = self._tree
+    for name in path: 
+      if name not in node: 
+        return names
+      node = node[name]
+    names = names or []
+    for name in node: 
+      if name not in names: 
+        names += [name]
+    return names
+
+
+  def get_explored(self, maze): 
+    """
+    Returns the explored-tile bitmap for <maze>, starting a fresh one if 
+    there is none yet or if the maze's tiles changed since it was made. 
+
+    INPUT
+      maze: The current <Maze>. 
+    OUTPUT 
+      A NumPy bool array of shape (maze_height, maze_width). 
+    """
+    shape = (maze.maze_height, maze.maze_width)
+    if (self.explored is None or self.explored.shape != shape 
+        or self.explored_version != maze.tiles.version): 
+      self.explored = np.zeros(shape, dtype=bool)
+      self.explored_version = maze.tiles.version
+    return self.explored
 
 
   def print_tree(self): 
@@ -49,7 +255,7 @@ class MemoryTree:
     EXAMPLE STR OUTPUT
       "bedroom, kitchen, dining room, office, bathroom"
     """
-    x = ", ".join(list(self.tree[curr_world].keys()))
+    x = ", ".join(self._children((curr_world,)) or [])
     return x
 
 
@@ -71,7 +277,7 @@ class MemoryTree:
     curr_world, curr_sector = sector.split(":")
     if not curr_sector: 
       return ""
-    x = ", ".join(list(self.tree[curr_world][curr_sector].keys()))
+    x = ", ".join(self._children((curr_world, curr_sector)) or [])
     return x
 
 
@@ -94,10 +300,11 @@ class MemoryTree:
     if not curr_arena: 
       return ""
 
-    try: 
-      x = ", ".join(list(self.tree[curr_world][curr_sector][curr_arena]))
-    except: 
-      x = ", ".join(list(self.tree[curr_world][curr_sector][curr_arena.lower()]))
+    game_objects = self._children((curr_world, curr_sector, curr_arena))
+    if game_objects is None: 
+      game_objects = self._children((curr_world, curr_sector, 
+                                     curr_arena.lower()))
+    x = ", ".join(game_objects or [])
     return x
 
 
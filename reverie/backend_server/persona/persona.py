@@ -118,6 +118,11 @@ class Persona:
 
     #Find role for persona using their what was in the meta.json file
     self.role = role
+
+    # <llm_requests> holds the (run, apply) pairs of the LLM-backed steps of
+    # this tick's move() (e.g., a chat it started), which the server runs
+    # with the other personas' once they have all moved (see tick_dispatch).
+    self.llm_requests = []
     
 
   def save(self, save_folder): 
@@ -325,6 +330,23 @@ class Persona:
     return False
 
 
+  def embedding_requests(self, maze, curr_tile):
+    """
+    Returns the texts this persona's next move() will need embeddings for,
+    so that the server can fetch them for all personas at once before they
+    move. Changes no state; personas that skip cognition need none.
+
+    INPUT:
+      maze: Current <Maze> instance of the world.
+      curr_tile: The (x, y) tile the persona will move from.
+    OUTPUT:
+      a list of str.
+    """
+    if self._should_skip_cognition():
+      return []
+    return perceive_embedding_requests(self, maze, curr_tile)
+
+
   def _tick_chat_cleanup(self):
     """Duplicate of the chat-state cleanup from plan.py (lines 1023-1039).
     Must run every tick even when we skip the full plan() call, so that
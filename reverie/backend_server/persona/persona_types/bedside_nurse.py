@@ -5,7 +5,6 @@ import random
 import sys
 import time
 import heapq
-import bisect
 import utils
 sys.path.append('../../')
 from persona.persona import *
@@ -143,19 +142,20 @@ class Bedside_Nurse(Persona):
 
 
         # CTAS 1 patients get placed in a separate pager queue
-        if(maze.injuries_zones["pager"] != [] and not self.scratch.occupied):
-            pager_patient_name = maze.injuries_zones["pager"][0][1]
+        if(maze.injuries_zones["pager"] and not self.scratch.occupied):
+            _, pager_patient_name = maze.injuries_zones["pager"].peek()
             if pager_patient_name not in personas:
-                maze.injuries_zones["pager"].pop(0)
+                maze.injuries_zones["pager"].pop()
             else:
                 selected_patient = personas[pager_patient_name]
+                personas.wake(pager_patient_name)
                 print(selected_patient.name)
                 target_zone = selected_patient.scratch.next_room
                 # CTAS 1 (pager) patients always get placed — they override
                 # bed capacity.  In a real ED a life-threatening patient is
                 # never turned away for lack of beds.
                 reserve_bed(selected_patient, target_zone)   # best-effort
-                maze.injuries_zones["pager"].pop(0)
+                maze.injuries_zones["pager"].pop()
 
                 # Reset all actions for both personas
                 selected_patient.scratch.chat = None
@@ -211,18 +211,19 @@ class Bedside_Nurse(Persona):
                 self.scratch.act_path_set = False
                 reserved_bed = None
 
-                # Check the whole sorted array to see if there is a Patient ready and injuries zone open for another Patient
-                for p_info in maze.injuries_zones["bedside_nurse_waiting"][:]:
+                # Check the whole queue, in priority order, to see if there is a Patient ready and injuries zone open for another Patient
+                waiting = maze.injuries_zones["bedside_nurse_waiting"]
+                for p_info in waiting:
                     curr_persona = personas.get(p_info[1])
                     if not curr_persona:
-                        maze.injuries_zones["bedside_nurse_waiting"].remove(p_info)
+                        waiting.remove(p_info[1])
                         continue
                     zone = curr_persona.scratch.next_room
                     if not zone:
-                        maze.injuries_zones["bedside_nurse_waiting"].remove(p_info)
+                        waiting.remove(p_info[1])
                         continue
                     if curr_persona.scratch.state != "WAITING_FOR_NURSE" and curr_persona.scratch.state != "WAITING_FOR_TEST":
-                        maze.injuries_zones["bedside_nurse_waiting"].remove(p_info)
+                        waiting.remove(p_info[1])
                         continue
                     print(p_info)
                     # Check if injuries zone is open for another Patient and Patient hasn't been selected yet
@@ -231,15 +232,16 @@ class Bedside_Nurse(Persona):
                         if(zone in getattr(maze, "available_beds", {}) and not reserved_bed):
                             continue
                         selected_patient = curr_persona
-                        maze.injuries_zones["bedside_nurse_waiting"].remove(p_info)
+                        waiting.remove(p_info[1])
 
                     # Increase priority for other Patients based on time waiting only if a Patient has been selected already in the queue
                     else:
                         if (p_info[0] > 3):
-                            p_info[0] -= 1
+                            waiting.update(p_info[1], p_info[0] - 1)
                 
                 # Check if a Patient has been found
                 if(selected_patient):
+                    personas.wake(selected_patient.name)
                     data_collection["Patients_Attended"].append([selected_patient.name, p_info[0]])
 
                     # Add patient to one of the patients in the zones
@@ -5,7 +5,6 @@ import random
 import sys
 import time
 import heapq
-import bisect
 
 sys.path.append('../../')
 from persona.persona import *
@@ -53,10 +52,9 @@ class Doctor(Persona):
             if p_name not in personas or personas[p_name].scratch.state == "LEAVING":
                 self.scratch.assigned_patients.remove(p_name)
                 print(f"(Doctor) {self.name}: removed stale patient {p_name} from assigned_patients")
-        self.scratch.assigned_patients_waitlist[:] = [
-            entry for entry in self.scratch.assigned_patients_waitlist
-            if entry[1] in personas and personas[entry[1]].scratch.state != "LEAVING"
-        ]
+        for _, p_name in self.scratch.assigned_patients_waitlist:
+            if p_name not in personas or personas[p_name].scratch.state == "LEAVING":
+                self.scratch.assigned_patients_waitlist.remove(p_name)
         # If next_step targets a persona that left, clear it
         if self.scratch.next_step and "<persona>" in str(self.scratch.next_step):
             target = str(self.scratch.next_step).split("<persona>")[-1].strip()
@@ -67,7 +65,7 @@ class Doctor(Persona):
         # Keep the "available doctors" list consistent and free of duplicates.
         in_list = self.name in maze.doctors_taking_more_patients
         active_count = self._active_patient_count(personas)
-        if active_count < self.max_patients and maze.patients_waiting_for_doctor != []:
+        if active_count < self.max_patients and maze.patients_waiting_for_doctor:
             # Only assign patients who are actually in a bed and ready for
             # assessment.  Patients still in WAITING_FOR_NURSE have not been
             # transported by a bedside nurse yet, so assigning them wastes a
@@ -76,21 +74,20 @@ class Doctor(Persona):
                             "GOING_FOR_TEST", "WAITING_FOR_RESULT",
                             "WAITING_FOR_DOCTOR"}
             selected = None
-            i = 0
-            while i < len(maze.patients_waiting_for_doctor):
-                entry = maze.patients_waiting_for_doctor[i]
-                p = personas.get(entry[1])
+            for _, p_name in maze.patients_waiting_for_doctor:
+                p = personas.get(p_name)
                 if not p:
                     # Stale entry — clean it and keep looking
-                    maze.patients_waiting_for_doctor.pop(i)
+                    maze.patients_waiting_for_doctor.remove(p_name)
                     continue
                 if p.scratch.state in ready_states:
-                    selected = maze.patients_waiting_for_doctor.pop(i)
+                    maze.patients_waiting_for_doctor.remove(p_name)
+                    selected = p_name
                     break
-                i += 1
             if selected:
-                patient = personas.get(selected[1])
+                patient = personas.get(selected)
                 if patient:
+                    personas.wake(selected)
                     self.assign_patient(maze.doctors_taking_more_patients, patient, personas)
             if not in_list and active_count < self.max_patients:
                 maze.doctors_taking_more_patients.append(self.name)
@@ -110,10 +107,9 @@ class Doctor(Persona):
                 last_aged = getattr(self.scratch, '_last_queue_aging_time', None)
                 if not last_aged or (curr_time - last_aged) >= datetime.timedelta(minutes=self.queue_aging_interval_minutes):
                     self.scratch._last_queue_aging_time = curr_time
-                    for entry in queue:
-                        entry[0] = max(1, entry[0] - self.queue_aging_decrement)
-                    # Sort by priority only; Python's sort is stable, so FIFO is preserved for ties.
-                    queue.sort(key=lambda entry: entry[0])
+                    # Ties keep their arrival (FIFO) order.
+                    queue.reprioritize(
+                        lambda priority: max(1, priority - self.queue_aging_decrement))
 
             # If they were chatting with Patient add them to the bedside nurse queue for transfer to testing
             # self.scratch.chatting is assigned in react_to_chat method
@@ -125,10 +121,10 @@ class Doctor(Persona):
                 
             # Check if any Patients are in Queue
             # Also that they are not occupied with another task
-            elif(queue != [] and self.scratch.next_step == None):
+            elif(queue and self.scratch.next_step == None):
                 # Deterministic selection — queue is already sorted by
                 # priority (lowest CTAS first, aged over time for fairness).
-                patient_assessment = queue.pop(0)
+                patient_assessment = queue.pop()
 
                 data_collection["Patients_Attended"].append([patient_assessment[0], patient_assessment[1]])
 
@@ -140,6 +136,7 @@ class Doctor(Persona):
                 # the patient's state advances immediately.
                 patient = personas.get(target_name)
                 if patient:
+                    personas.wake(target_name)
                     patient.do_initial_assessment(self, maze)
                     patient.do_disposition(self, maze)
  
@@ -2,7 +2,6 @@
 import datetime
 import random
 import sys
-import bisect
 sys.path.append('../../')
 from persona.persona import *
 from persona.memory_structures.scratch_types.patient_scratch import patient_scratch
@@ -44,6 +43,14 @@ class Patient(Persona):
         "WAITING_FOR_EXIT",
         "WAITING_FOR_FIRST_ASSESSMENT",
     }
+    # States in which a patient only waits in its bed, with the scratch
+    # deadline that ends the wait. See _settled().
+    dormant_states = {
+        "WAITING_FOR_RESULT": "time_to_next",
+        "ADMITTED_BOARDING": "admission_boarding_end",
+        "WAITING_FOR_EXIT": "exit_ready_at",
+        "DISCHARGED_WAITING": "linger_end_time",
+    }
     def __init__(self, name, folder_mem_saved=False, role=None, ICD = None, seed=0):
         super().__init__(name,folder_mem_saved,role, seed)
         
@@ -51,6 +58,13 @@ class Patient(Persona):
         scratch_saved = f"{folder_mem_saved}/bootstrap_memory/scratch.json"
         self.scratch = patient_scratch(scratch_saved)
         self.role = role
+        # The server's TimeAccounts, where the time the patient spends in
+        # each state is kept during the run. Without one, move() reads it off
+        # the patient's data_collection entry.
+        self.time_accounts = None
+        # Whether the patient was settled at the end of its last move(); the
+        # server then puts it to sleep (see _settled()).
+        self.settled = False
         # Default settings
         if(self.scratch.state == None):
             self.scratch.state = "WAITING_FOR_TRIAGE"
@@ -81,18 +95,66 @@ class Patient(Persona):
         self.scratch.bed_assignment = None
 
 
-    def move(self, maze, personas, curr_tile, curr_time, data_collection):
-        # Area
-        if( maze.tiles[curr_tile[1]][curr_tile[0]]['arena'] not in data_collection["time_spent_area"].keys()):
-            data_collection["time_spent_area"][maze.tiles[curr_tile[1]][curr_tile[0]]['arena']] = self.time_increment
-        else:
-            data_collection["time_spent_area"][maze.tiles[curr_tile[1]][curr_tile[0]]['arena']] += self.time_increment
+    def embedding_requests(self, maze, curr_tile):
+        # Patients are driven by their state machine in move() and do not
+        # perceive, so they never need embeddings.
+        return []
 
-        # State
-        if ( self.scratch.state not in data_collection["time_spent_state"].keys()):
-            data_collection["time_spent_state"][self.scratch.state] = self.time_increment
-        else:
-            data_collection["time_spent_state"][self.scratch.state] += self.time_increment
+    def _may_walk_out(self):
+        return (
+            self.walkout_probability > 0
+            and not self.scratch.left_without_being_seen
+            and self.scratch.state in self.walkout_states
+            and not self.scratch.chatting_with
+            and not self.scratch.time_to_next
+        )
+
+    def _settled(self, maze, personas, curr_time):
+        """
+        Whether, as things stand, move() would do nothing for the patient
+        but add to its time accounting until the deadline of its dormant
+        state: it stands where its plan puts it, is not chatting, and none of
+        the other checks in move() apply to it. Nor would the server's tile
+        event upkeep change anything for it.
+
+        A patient that is settled after its move() is put to sleep by the
+        server, which leaves it out of its steps until it is woken: when that
+        deadline is reached, or by whatever changes it from outside (see
+        PersonaRegistry.wake()).
+        """
+        scratch = self.scratch
+        deadline = self.dormant_states.get(scratch.state)
+        if (deadline is None
+            or scratch.chatting_with is not None
+            or scratch.chatting_end_time
+            or scratch.planned_path
+            or not scratch.act_path_set
+            or self._may_walk_out()
+            or (scratch.lingering_after_discharge and not scratch.linger_recorded)
+            or (scratch.assigned_doctor is not None
+                and str(scratch.assigned_doctor) not in personas)):
+            return False
+        wake_at = getattr(scratch, deadline)
+        if not wake_at or curr_time >= wake_at:
+            return False
+
+        # Mirrors execute(): the plan must not make it look for a new path.
+        plan = str(scratch.next_step)
+        if "<random>" in plan or "<persona>" in plan or "waiting" in plan:
+            return False
+        events = maze.tiles.events_at(scratch.curr_tile)
+        obj_event = scratch.get_curr_obj_event_and_desc()
+        if (scratch.get_curr_event_and_desc() not in events
+            or obj_event[1:] != (None, None, None)
+            or obj_event in events):
+            return False
+        if "tile" not in plan and plan != scratch.act_address:
+            return False
+        return plan_target_reached(self, maze, plan)
+
+    def move(self, maze, personas, curr_tile, curr_time, data_collection):
+        # The step's time_spent_state/time_spent_area are accounted by the
+        # server (see time_accounts.py).
 
         # Free up the bed once the patient has started leaving so capacity is not blocked.
         if self.scratch.state == "LEAVING":
@@ -103,14 +165,11 @@ class Patient(Persona):
         data_collection.setdefault("admitted_to_hospital", {"occurred": False})
 
         # Generate if Patient should leave the ED right now
-        if (
-            self.walkout_probability > 0
-            and not self.scratch.left_without_being_seen
-            and self.scratch.state in self.walkout_states
-            and not self.scratch.chatting_with
-            and not self.scratch.time_to_next
-        ):
-            waited_minutes = data_collection["time_spent_state"][self.scratch.state]
+        if self._may_walk_out():
+            if self.time_accounts is not None:
+                waited_minutes = self.time_accounts.minutes(self.name, self.scratch.state)
+            else:
+                waited_minutes = data_collection.get("time_spent_state", {}).get(self.scratch.state, 0.0)
             last_check = getattr(self.scratch, "walkout_last_check_minute", 0.0) or 0.0
             if waited_minutes - last_check >= self.walkout_check_minutes:
                 self.scratch.walkout_last_check_minute = waited_minutes
@@ -187,10 +246,8 @@ class Patient(Persona):
                     and self.scratch.curr_time >= self.scratch.time_to_next):
                     self.scratch.state = "WAITING_FOR_DOCTOR"
                     priority = self.scratch.CTAS * (self.priority_factor / 2) if self.scratch.CTAS else 3
-                    already_queued = any(entry[1] == self.name for entry in maze.patients_waiting_for_doctor)
-                    if not already_queued:
-                        bisect.insort_right(maze.patients_waiting_for_doctor,
-                                            [priority, self.name])
+                    if self.name not in maze.patients_waiting_for_doctor:
+                        maze.patients_waiting_for_doctor.push(priority, self.name)
                     print(f"(Patient) {self.name}: no doctor assigned, moved from "
                           f"WAITING_FOR_RESULT to WAITING_FOR_DOCTOR")
 
@@ -207,10 +264,8 @@ class Patient(Persona):
                 # If a staged disposition time is set, ensure we've reached it
                 if self.scratch.disposition_ready_at and self.scratch.curr_time < self.scratch.disposition_ready_at:
                     ready_for_disposition = False
-                already_in_queue = any(entry[1] == self.name for entry in queue)
-                if ready_for_disposition and not already_in_queue:
-                    bisect.insort_right(queue,
-                                    [self.scratch.CTAS * (self.priority_factor / 2), self.name])
+                if ready_for_disposition and self.name not in queue:
+                    queue.push(self.scratch.CTAS * (self.priority_factor / 2), self.name)
                     self.scratch.state = "WAITING_FOR_DOCTOR"
 
             elif(self.scratch.state == "WAITING_FOR_FIRST_ASSESSMENT" and assigned_doctor is not None):
@@ -224,9 +279,8 @@ class Patient(Persona):
                         and bed_target[0] == curr_tile[0]
                         and bed_target[1] == curr_tile[1]):
                         self.scratch.in_queue = True
-                        if not any(entry[1] == self.name for entry in queue):
-                            bisect.insort_right(queue,
-                                            [self.scratch.CTAS * self.priority_factor, self.name])
+                        if self.name not in queue:
+                            queue.push(self.scratch.CTAS * self.priority_factor, self.name)
 
             # Patient self-manages testing: check if diagnostic room has space, go directly
             elif self.scratch.state == "WAITING_FOR_TEST":
@@ -242,10 +296,7 @@ class Patient(Persona):
                     self.scratch.testing_end_time = self.scratch.curr_time + datetime.timedelta(minutes=self.testing_time)
                     self.scratch.act_path_set = False
                     # Remove from bedside_nurse_waiting if present
-                    for entry in maze.injuries_zones.get("bedside_nurse_waiting", [])[:]:
-                        if entry[1] == self.name:
-                            maze.injuries_zones["bedside_nurse_waiting"].remove(entry)
-                            break
+                    maze.injuries_zones["bedside_nurse_waiting"].remove(self.name)
 
             # Patient self-manages diagnostic testing: when testing_end_time expires,
             # leave diagnostic room and walk back to bed.
@@ -309,7 +360,11 @@ class Patient(Persona):
             
         self.scratch.act_pronunciatio = self.state_to_act_pronunciatio.get(self.scratch.state, "\ud83e\udd22")
 
-        return self.execute(maze, personas, plan)
+        execution = self.execute(maze, personas, plan)
+        self.settled = (execution[0][0] == curr_tile[0]
+                        and execution[0][1] == curr_tile[1]
+                        and self._settled(maze, personas, curr_time))
+        return execution
 
     def _initiate_walkout(self, maze, data_collection, waited_minutes, curr_time, personas):
         """
@@ -334,15 +389,8 @@ class Patient(Persona):
         if self.name in maze.triage_queue:
             maze.triage_queue.remove(self.name)
 
-        for entry in maze.injuries_zones["bedside_nurse_waiting"][:]:
-            if entry[1] == self.name:
-                maze.injuries_zones["bedside_nurse_waiting"].remove(entry)
-                break
-
-        maze.patients_waiting_for_doctor[:] = [
-            entry for entry in maze.patients_waiting_for_doctor
-            if not (isinstance(entry, (list, tuple)) and len(entry) >= 2 and str(entry[1]).strip() == self.name)
-        ]
+        maze.injuries_zones["bedside_nurse_waiting"].remove(self.name)
+        maze.patients_waiting_for_doctor.remove(self.name)
 
         self._release_bed(maze)
         assigned_doctor = personas.get(str(self.scratch.assigned_doctor), None)
@@ -350,21 +398,10 @@ class Patient(Persona):
             assigned_doctor.remove_patient(self, maze)
             # Ensure the doctor won't keep trying to see a patient who has left.
             queue = getattr(assigned_doctor.scratch, "assigned_patients_waitlist", None)
-            if isinstance(queue, list):
-                queue[:] = [
-                    entry
-                    for entry in queue
-                    if not (
-                        isinstance(entry, (list, tuple))
-                        and len(entry) >= 2
-                        and str(entry[1]).strip() == self.name
-                    )
-                ]
+            if queue is not None:
+                queue.remove(self.name)
 
-        for entry in maze.injuries_zones["assessment_queue"][:]:
-            if entry[1] == self.name:
-                maze.injuries_zones["assessment_queue"].remove(entry)
-                break
+        maze.injuries_zones["assessment_queue"].remove(self.name)
 
 
     def _stay_after_discharge(self, maze):
@@ -627,15 +664,9 @@ class Patient(Persona):
         if self.name in maze.triage_queue:
             maze.triage_queue.remove(self.name)
         # Bedside nurse waiting queue
-        for entry in maze.injuries_zones.get("bedside_nurse_waiting", [])[:]:
-            if entry[1] == self.name:
-                maze.injuries_zones["bedside_nurse_waiting"].remove(entry)
-                break
+        maze.injuries_zones["bedside_nurse_waiting"].remove(self.name)
         # Assessment queue
-        for entry in maze.injuries_zones.get("assessment_queue", [])[:]:
-            if entry[1] == self.name:
-                maze.injuries_zones["assessment_queue"].remove(entry)
-                break
+        maze.injuries_zones["assessment_queue"].remove(self.name)
         # Diagnostic room current_patients
         diag_patients = maze.injuries_zones.get("diagnostic room", {}).get("current_patients", [])
         if self.name in diag_patients:
@@ -658,26 +689,15 @@ class Patient(Persona):
         # Ensure bed capacity is freed and the patient is removed from zone tracking.
         self._release_bed(maze)
 
-        maze.patients_waiting_for_doctor[:] = [
-            entry for entry in maze.patients_waiting_for_doctor
-            if not (isinstance(entry, (list, tuple)) and len(entry) >= 2 and str(entry[1]).strip() == self.name)
-        ]
+        maze.patients_waiting_for_doctor.remove(self.name)
 
         # Ensure the doctor won't keep tracking / queuing this patient.
         assigned_doctor = personas.get(str(self.scratch.assigned_doctor), None)
         if assigned_doctor:
             assigned_doctor.remove_patient(self, maze)
             queue = getattr(assigned_doctor.scratch, "assigned_patients_waitlist", None)
-            if isinstance(queue, list):
-                queue[:] = [
-                    entry
-                    for entry in queue
-                    if not (
-                        isinstance(entry, (list, tuple))
-                        and len(entry) >= 2
-                        and str(entry[1]).strip() == self.name
-                    )
-                ]
+            if queue is not None:
+                queue.remove(self.name)
 
         # Save info to scratch file
         self.save(f"{sim_folder}/personas/{persona_key}/bootstrap_memory")
@@ -5,7 +5,6 @@ import random
 import sys
 import time
 import heapq
-import bisect
 import utils
 sys.path.append('../../')
 from persona.persona import *
@@ -48,23 +47,17 @@ class Triage_Nurse(Persona):
                 patient = personas.get(patient_name)
                 if patient:
                     ctas = patient.scratch.CTAS if patient.scratch.CTAS is not None else 3
-                    bisect.insort_right(
-                        maze.patients_waiting_for_doctor,
-                        [ctas * self.priority_factor, patient_name]
-                    )
+                    maze.patients_waiting_for_doctor.push(
+                        ctas * self.priority_factor, patient_name)
 
                     # Add patient to priority list for bedside nurse assisstance
                     if ctas != 1:
-                        bisect.insort_right(
-                            maze.injuries_zones["bedside_nurse_waiting"],
-                            [ctas * self.priority_factor, patient_name]
-                        )
+                        maze.injuries_zones["bedside_nurse_waiting"].push(
+                            ctas * self.priority_factor, patient_name)
                     # If they have been assigned a CTAS page a nurse to treat patient as quickly as possible.
                     else:
-                        bisect.insort_right(
-                            maze.injuries_zones["pager"],
-                            [ctas * self.priority_factor, patient.name]
-                        )
+                        maze.injuries_zones["pager"].push(
+                            ctas * self.priority_factor, patient.name)
                 self.scratch.chatting_patient = None
 
             # Move patient into triage room when there is room to fit them
@@ -73,6 +66,7 @@ class Triage_Nurse(Persona):
                 persona_name = maze.triage_queue.pop(0)
                 patient = personas.get(persona_name)
                 if patient:
+                    personas.wake(persona_name)
                     patient.to_triage(self)
                     maze.triage_patients += 1
                 self.scratch.next_step = f"<persona> {persona_name}"
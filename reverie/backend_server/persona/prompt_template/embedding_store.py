@@ -0,0 +1,107 @@
+"""
+Persistent store of text embeddings, shared by all personas and simulations.
+
+Embeddings are keyed on (model, normalized text), so a description such as
+"Patient 12 is idle" is embedded once and then reused by every persona that
+perceives it, in this run and in later ones. The store is a small SQLite
+file; vectors are kept as float64 blobs so they come back exactly as the API
+returned them.
+
+This module does not import openai.
+"""
+import os
+import sqlite3
+import threading
+
+import numpy as np
+
+
+def normalize_embedding_text(text):
+  """
+  Returns the text that is actually sent for embedding (and used as the
+  store key): newlines become spaces, and an empty text is replaced by a
+  placeholder since the API rejects empty input.
+  """
+  text = text.replace("\n", " ")
+  if not text:
+    text = "this is blank"
+  return text
+
+
+class EmbeddingStore:
+  def __init__(self, path=None):
+    """
+    INPUT
+      path: The SQLite file holding the store. None keeps the store in
+            memory for this process only.
+    """
+    self.path = path
+    if path:
+      folder = os.path.dirname(path)
+      if folder:
+        os.makedirs(folder, exist_ok=True)
+    self.lock = threading.Lock()
+    self._db = sqlite3.connect(path or ":memory:", check_same_thread=False)
+    self._db.execute("CREATE TABLE IF NOT EXISTS embeddings ("
+                     "model TEXT NOT NULL, "
+                     "text TEXT NOT NULL, "
+                     "vector BLOB NOT NULL, "
+                     "PRIMARY KEY (model, text))")
+    self._db.commit()
+    self.hits = 0
+    self.misses = 0
+
+  def get_many(self, model, texts):
+    """
+    Returns a dict from each of <texts> (normalized) that is in the store to
+    its embedding, as a list of floats.
+    """
+    keys = list(dict.fromkeys(normalize_embedding_text(t) for t in texts))
+    found = dict()
+    with self.lock:
+      # SQLite limits the number of bound parameters per statement.
+      for start in range(0, len(keys), 500):
+        chunk = keys[start:start + 500]
+        marks = ",".join("?" * len(chunk))
+        rows = self._db.execute(
+          f"SELECT text, vector FROM embeddings "
+          f"WHERE model = ? AND text IN ({marks})", [model] + chunk)
+        for text, vector in rows:
+          found[text] = np.frombuffer(vector, dtype=np.float64).tolist()
+      self.hits += len(found)
+      self.misses += len(keys) - len(found)
+    return found
+
+  def get(self, model, text):
+    """
+    Returns the embedding of <text>, or None if it is not in the store.
+    """
+    return self.get_many(model, [text]).get(normalize_embedding_text(text))
+
+  def put_many(self, model, embeddings):
+    """
+    INPUT
+      model: The embedding model.
+      embeddings: dict from text to embedding (a list of floats).
+    """
+    rows = [(model, normalize_embedding_text(text),
+             np.asarray(vector, dtype=np.float64).tobytes())
+            for text, vector in embeddings.items()]
+    with self.lock:
+      self._db.executemany("INSERT OR REPLACE INTO embeddings "
+                           "(model, text, vector) VALUES (?, ?, ?)", rows)
+      self._db.commit()
+
+  def __len__(self):
+    with self.lock:
+      return self._db.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+  def stats(self):
+    lookups = self.hits + self.misses
+    return {"hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0}
+
+  def close(self):
+    with self.lock:
+      self._db.close()
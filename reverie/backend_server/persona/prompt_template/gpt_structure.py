@@ -1,29 +1,19 @@
 import os
 import time
 import json
+import asyncio
 from pathlib import Path
-from openai import AzureOpenAI, OpenAI
+import httpx
+from openai import AsyncAzureOpenAI, AsyncOpenAI
 
 from utils import *
 from openai_cost_logger import DEFAULT_LOG_PATH
 from persona.prompt_template.openai_logger_singleton import OpenAICostLogger_Singleton
-
-
-# ---------------------------------------------------------------------------
-# Retry helper for transient OpenAI errors (500, 502, 503, 429, etc.)
-# Uses exponential backoff: 60s -> 120s -> 300s (1 min, 2 min, 5 min)
-# ---------------------------------------------------------------------------
-_RETRYABLE_STATUS_CODES = {429, 500, 502, 503}
-_RETRY_DELAYS = [60, 120, 300]  # seconds
-
-
-def _is_retryable(exc):
-    """Return True if the exception looks like a transient OpenAI error."""
-    status = getattr(exc, "status_code", None) or getattr(exc, "http_status", None)
-    if status and int(status) in _RETRYABLE_STATUS_CODES:
-        return True
-    msg = str(exc).lower()
-    return any(k in msg for k in ("server_error", "rate limit", "overloaded", "502", "503"))
+from persona.prompt_template.llm_cache import LLMCache, CacheMiss
+from persona.prompt_template.llm_async import TokenBucket, AsyncRequestRunner
+from persona.prompt_template.retry_policy import RetryPolicy
+from persona.prompt_template.embedding_store import (EmbeddingStore,
+                                                     normalize_embedding_text)
 
 
 def _config_from_env() -> dict:
@@ -49,6 +39,15 @@ def _config_from_env() -> dict:
         },
         "experiment-name": os.environ.get("EXPERIMENT_NAME", "edsim"),
         "cost-upperbound": float(os.environ.get("COST_UPPERBOUND", "100.0")),
+        "llm-cache-mode": os.environ.get("LLM_CACHE_MODE", "off"),
+        "llm-cache-path": os.environ.get("LLM_CACHE_PATH", ""),
+        "llm-cache-max-entries": int(os.environ.get("LLM_CACHE_MAX_ENTRIES", "100000")),
+        "max-in-flight": int(os.environ.get("OPENAI_MAX_IN_FLIGHT", "8")),
+        "requests-per-second": float(os.environ.get("OPENAI_REQUESTS_PER_SECOND", "10")),
+        "retry-max-attempts": int(os.environ.get("OPENAI_RETRY_MAX_ATTEMPTS", "8")),
+        "retry-max-delay": float(os.environ.get("OPENAI_RETRY_MAX_DELAY", "60")),
+        "embeddings-batch-size": int(os.environ.get("EMBEDDINGS_BATCH_SIZE", "64")),
+        "embedding-store-path": os.environ.get("EMBEDDING_STORE_PATH", ""),
     }
 
 
@@ -65,6 +64,34 @@ else:
         "Set OPENAI_KEY (and related env vars) or create openai_config.json."
     )
 
+# Requests are made with the asyncio clients on one background event loop
+# (see llm_async.py); the functions below block on them. At most
+# <max-in-flight> requests run at once, and <requests-per-second> is the
+# sustained request rate (it replaces a fixed sleep before each request).
+MAX_IN_FLIGHT = openai_config.get("max-in-flight", 8)
+request_runner = AsyncRequestRunner(MAX_IN_FLIGHT)
+request_bucket = TokenBucket(openai_config.get("requests-per-second", 10))
+# Transient errors are retried here (see retry_policy.py), so the clients'
+# own retries are turned off.
+retry_policy = RetryPolicy(
+  max_attempts = openai_config.get("retry-max-attempts", 8),
+  max_delay = openai_config.get("retry-max-delay", 60.0)
+)
+
+# One pooled HTTP connection pool per endpoint, shared by the clients that
+# talk to it.
+_http_clients = dict()
+
+
+def _http_client(endpoint):
+  if endpoint not in _http_clients:
+    _http_clients[endpoint] = httpx.AsyncClient(
+      limits=httpx.Limits(max_connections=MAX_IN_FLIGHT,
+                          max_keepalive_connections=MAX_IN_FLIGHT),
+      timeout=httpx.Timeout(600.0, connect=10.0))
+  return _http_clients[endpoint]
+
+
 def setup_client(type: str, config: dict):
   """Setup the OpenAI client.
 
@@ -76,17 +103,22 @@ def setup_client(type: str, config: dict):
       ValueError: if the client is invalid.
 
   Returns:
-      The client object created, either AzureOpenAI or OpenAI.
+      The client object created, either AsyncAzureOpenAI or AsyncOpenAI.
   """
   if type == "azure":
-    client = AzureOpenAI(
+    client = AsyncAzureOpenAI(
         azure_endpoint=config["endpoint"],
         api_key=config["key"],
         api_version=config["api-version"],
+        http_client=_http_client(config["endpoint"]),
+        max_retries=0,
     )
   elif type == "openai":
-    client = OpenAI(
+    client = AsyncOpenAI(
         api_key=config["key"],
+        base_url=config.get("endpoint") or None,
+        http_client=_http_client(config.get("endpoint", "")),
+        max_retries=0,
     )
   else:
     raise ValueError("Invalid client")
@@ -99,7 +131,10 @@ if openai_config["client"] == "azure":
       "api-version": openai_config["model-api-version"],
   })
 elif openai_config["client"] == "openai":
-  client = setup_client("openai", { "key": openai_config["model-key"] })
+  client = setup_client("openai", {
+      "key": openai_config["model-key"],
+      "endpoint": openai_config.get("model-endpoint", ""),
+  })
 
 if openai_config["embeddings-client"] == "azure":  
   embeddings_client = setup_client("azure", {
@@ -108,7 +143,10 @@ if openai_config["embeddings-client"] == "azure":
       "api-version": openai_config["embeddings-api-version"],
   })
 elif openai_config["embeddings-client"] == "openai":
-  embeddings_client = setup_client("openai", { "key": openai_config["embeddings-key"] })
+  embeddings_client = setup_client("openai", {
+      "key": openai_config["embeddings-key"],
+      "endpoint": openai_config.get("embeddings-endpoint", ""),
+  })
 else:
   raise ValueError("Invalid embeddings client")
 
@@ -119,30 +157,63 @@ cost_logger = OpenAICostLogger_Singleton(
 )
 
 
-def temp_sleep(seconds=0.1):
-  time.sleep(seconds)
+# Persistent cache of LLM responses (see llm_cache.py). Off unless
+# LLM_CACHE_MODE (or "llm-cache-mode" in openai_config.json) is set to
+# "readwrite" or "replay".
+DEFAULT_LLM_CACHE_PATH = Path(DEFAULT_LOG_PATH) / "llm_cache.sqlite3"
+
+llm_cache = LLMCache(
+  path = openai_config.get("llm-cache-path") or str(DEFAULT_LLM_CACHE_PATH),
+  max_entries = openai_config.get("llm-cache-max-entries", 100000),
+  mode = openai_config.get("llm-cache-mode", "off")
+)
 
 
-def ChatGPT_single_request(prompt):
-  temp_sleep()
-  for attempt, delay in enumerate(_RETRY_DELAYS + [None]):
-    try:
-      completion = client.chat.completions.create(
-        model=openai_config["model"],
-        messages=[{"role": "user", "content": prompt}]
-      )
-      cost_logger.update_cost(completion, input_cost=openai_config["model-costs"]["input"], output_cost=openai_config["model-costs"]["output"])
-      return completion.choices[0].message.content
-    except Exception as e:
-      if delay is not None and _is_retryable(e):
-        print(f"ChatGPT_single_request retry {attempt+1}/{len(_RETRY_DELAYS)}, "
-              f"waiting {delay}s: {e}")
-        time.sleep(delay)
-      else:
-        raise
-
-
-def ChatGPT_request(prompt):
+async def _achat_completion(label, model, messages, params):
+  """
+  Sends one chat completion request, retrying transient errors, and returns
+  the response text. Raises once the retries are used up.
+  """
+  async def attempt():
+    await request_bucket.acquire_async()
+    completion = await client.chat.completions.create(
+      model=model,
+      messages=messages,
+      **params
+    )
+    cost_logger.update_cost(completion, input_cost=openai_config["model-costs"]["input"], output_cost=openai_config["model-costs"]["output"])
+    return completion.choices[0].message.content
+  return await retry_policy.call_async(attempt, label)
+
+
+def _chat_completion(label, model, messages, params):
+  return request_runner.run(
+    _achat_completion(label, model, messages, params))
+
+
+def _cached_chat_completion(label, model, messages, params=None,
+                            cache_slot=0):
+  """
+  Like _chat_completion, but served from <llm_cache> when possible. Raises
+  CacheMiss in replay mode if the request was never cached.
+  """
+  params = params or dict()
+  response, hit = llm_cache.fetch(
+    model, messages, params,
+    lambda: _chat_completion(label, model, messages, params),
+    cache_slot)
+  if llm_cache.enabled:
+    cost_logger.record_cache_lookup(hit)
+  return response
+
+
+def ChatGPT_single_request(prompt, cache_slot=0):
+  return _cached_chat_completion(
+    "ChatGPT_single_request", openai_config["model"],
+    [{"role": "user", "content": prompt}], cache_slot=cache_slot)
+
+
+def ChatGPT_request(prompt, cache_slot=0):
   """
   Given a prompt and a dictionary of GPT parameters, make a request to OpenAI
   server and returns the response.
@@ -151,26 +222,21 @@ def ChatGPT_request(prompt):
     gpt_parameter: a python dictionary with the keys indicating the names of
                    the parameter and the values indicating the parameter
                    values.
+    cache_slot: which cached answer to use for this prompt; callers that
+                re-ask the same prompt after a bad answer pass the attempt
+                number so that they do not get the same answer back.
   RETURNS:
     a str of GPT-3's response.
   """
-  # temp_sleep()
-  for attempt, delay in enumerate(_RETRY_DELAYS + [None]):
-    try:
-      completion = client.chat.completions.create(
-      model=openai_config["model"],
-      messages=[{"role": "user", "content": prompt}]
-      )
-      cost_logger.update_cost(completion, input_cost=openai_config["model-costs"]["input"], output_cost=openai_config["model-costs"]["output"])
-      return completion.choices[0].message.content
-    except Exception as e:
-      if delay is not None and _is_retryable(e):
-        print(f"ChatGPT_request retry {attempt+1}/{len(_RETRY_DELAYS)}, "
-              f"waiting {delay}s: {e}")
-        time.sleep(delay)
-      else:
-        print(f"Error: {e}")
-        return "ChatGPT ERROR"
+  try:
+    return _cached_chat_completion(
+      "ChatGPT_request", openai_config["model"],
+      [{"role": "user", "content": prompt}], cache_slot=cache_slot)
+  except CacheMiss:
+    raise
+  except Exception as e:
+    print(f"Error: {e}")
+    return "ChatGPT ERROR"
 
 
 def ChatGPT_safe_generate_response(prompt, 
@@ -194,7 +260,7 @@ def ChatGPT_safe_generate_response(prompt,
   for i in range(repeat): 
 
     try: 
-      curr_gpt_response = ChatGPT_request(prompt).strip()
+      curr_gpt_response = ChatGPT_request(prompt, cache_slot=i).strip()
       end_index = curr_gpt_response.rfind('}') + 1
       curr_gpt_response = curr_gpt_response[:end_index]
       curr_gpt_response = json.loads(curr_gpt_response)["output"]
@@ -207,6 +273,8 @@ def ChatGPT_safe_generate_response(prompt,
         print (curr_gpt_response)
         print ("~~~~")
 
+    except CacheMiss:
+      raise
     except: 
       pass
 
@@ -225,7 +293,7 @@ def ChatGPT_safe_generate_response_OLD(prompt,
 
   for i in range(repeat): 
     try: 
-      curr_gpt_response = ChatGPT_request(prompt).strip()
+      curr_gpt_response = ChatGPT_request(prompt, cache_slot=i).strip()
       print(curr_gpt_response)
       if func_validate(curr_gpt_response, prompt=prompt): 
         return func_clean_up(curr_gpt_response, prompt=prompt)
@@ -234,13 +302,15 @@ def ChatGPT_safe_generate_response_OLD(prompt,
         print (curr_gpt_response)
         print ("~~~~")
 
+    except CacheMiss:
+      raise
     except: 
       pass
   print ("FAIL SAFE TRIGGERED") 
   return fail_safe_response
 
 
-def GPT_request(prompt, gpt_parameter):
+def GPT_request(prompt, gpt_parameter, cache_slot=0):
   """
   Given a prompt and a dictionary of GPT parameters, make a request to OpenAI
   server and returns the response.
@@ -249,35 +319,28 @@ def GPT_request(prompt, gpt_parameter):
     gpt_parameter: a python dictionary with the keys indicating the names of
                    the parameter and the values indicating the parameter
                    values.
+    cache_slot: see ChatGPT_request.
   RETURNS:
     a str of GPT-3's response.
   """
-  temp_sleep()
-  for attempt, delay in enumerate(_RETRY_DELAYS + [None]):
-    try:
-      messages = [{
-        "role": "system", "content": prompt
-      }]
-      response = client.chat.completions.create(
-                  model=gpt_parameter["engine"],
-                  messages=messages,
-                  temperature=gpt_parameter["temperature"],
-                  max_tokens=gpt_parameter["max_tokens"],
-                  top_p=gpt_parameter["top_p"],
-                  frequency_penalty=gpt_parameter["frequency_penalty"],
-                  presence_penalty=gpt_parameter["presence_penalty"],
-                  stream=gpt_parameter["stream"],
-                  stop=gpt_parameter["stop"],)
-      cost_logger.update_cost(response=response, input_cost=openai_config["model-costs"]["input"], output_cost=openai_config["model-costs"]["output"])
-      return response.choices[0].message.content
-    except Exception as e:
-      if delay is not None and _is_retryable(e):
-        print(f"GPT_request retry {attempt+1}/{len(_RETRY_DELAYS)}, "
-              f"waiting {delay}s: {e}")
-        time.sleep(delay)
-      else:
-        print(f"Error: {e}")
-        return "TOKEN LIMIT EXCEEDED"
+  messages = [{
+    "role": "system", "content": prompt
+  }]
+  params = {"temperature": gpt_parameter["temperature"],
+            "max_tokens": gpt_parameter["max_tokens"],
+            "top_p": gpt_parameter["top_p"],
+            "frequency_penalty": gpt_parameter["frequency_penalty"],
+            "presence_penalty": gpt_parameter["presence_penalty"],
+            "stream": gpt_parameter["stream"],
+            "stop": gpt_parameter["stop"]}
+  try:
+    return _cached_chat_completion("GPT_request", gpt_parameter["engine"],
+                                   messages, params, cache_slot)
+  except CacheMiss:
+    raise
+  except Exception as e:
+    print(f"Error: {e}")
+    return "TOKEN LIMIT EXCEEDED"
 
 
 def generate_prompt(curr_input, prompt_lib_file): 
@@ -319,7 +382,7 @@ def safe_generate_response(prompt,
     print (prompt)
 
   for i in range(repeat): 
-    curr_gpt_response = GPT_request(prompt, gpt_parameter)
+    curr_gpt_response = GPT_request(prompt, gpt_parameter, cache_slot=i)
     try:
       if func_validate(curr_gpt_response, prompt=prompt): 
         return func_clean_up(curr_gpt_response, prompt=prompt)
@@ -332,23 +395,76 @@ def safe_generate_response(prompt,
   return fail_safe_response
 
 
+# Embeddings are kept in a store shared by every persona and simulation
+# (see embedding_store.py), so each text is only embedded once. Texts that
+# are not in it yet are sent <EMBEDDINGS_BATCH_SIZE> per request.
+DEFAULT_EMBEDDING_STORE_PATH = Path(DEFAULT_LOG_PATH) / "embeddings.sqlite3"
+EMBEDDINGS_BATCH_SIZE = openai_config.get("embeddings-batch-size", 64)
+
+embedding_store = EmbeddingStore(
+  openai_config.get("embedding-store-path") or str(DEFAULT_EMBEDDING_STORE_PATH))
+
+
+def get_embeddings(texts, model=openai_config["embeddings"], dispatcher=None):
+  """
+  Returns the embeddings of <texts>, in the same order. Texts that are not
+  in <embedding_store> are embedded in batches, and the results stored.
+  ARGS:
+    texts: a list of str.
+    model: the embedding model.
+    dispatcher: a TickDispatcher to send the batches concurrently with; by
+                default they are sent one after another.
+  RETURNS:
+    a list of embeddings (lists of floats).
+  """
+  keys = [normalize_embedding_text(t) for t in texts]
+  found = embedding_store.get_many(model, keys)
+  missing = [t for t in dict.fromkeys(keys) if t not in found]
+  batches = [missing[i:i + EMBEDDINGS_BATCH_SIZE]
+             for i in range(0, len(missing), EMBEDDINGS_BATCH_SIZE)]
+  request = lambda batch: _request_embeddings(batch, model)
+  if dispatcher is not None:
+    results = dispatcher.map(request, batches)
+  else:
+    results = [request(batch) for batch in batches]
+  for batch, vectors in zip(batches, results):
+    new = dict(zip(batch, vectors))
+    embedding_store.put_many(model, new)
+    found.update(new)
+  return [found[k] for k in keys]
+
+
+def prefetch_embeddings(texts, dispatcher, model=openai_config["embeddings"]):
+  """
+  Embeds <texts> ahead of time (see get_embeddings) so that the
+  get_embedding calls made afterwards for them are served from the store.
+  If a request fails, the texts are left for get_embedding to retry.
+  """
+  try:
+    get_embeddings(texts, model, dispatcher)
+  except Exception as e:
+    print(f"prefetch_embeddings: skipping {len(texts)} texts: {e}")
+
+
 def get_embedding(text, model=openai_config["embeddings"]):
-  text = text.replace("\n", " ")
-  if not text:
-    text = "this is blank"
-  for attempt, delay in enumerate(_RETRY_DELAYS + [None]):
-    try:
-      response = embeddings_client.embeddings.create(input=[text], model=model)
-      cost_logger.update_cost(response=response, input_cost=openai_config["embeddings-costs"]["input"], output_cost=openai_config["embeddings-costs"]["output"])
-      return response.data[0].embedding
-    except Exception as e:
-      if delay is not None and _is_retryable(e):
-        print(f"get_embedding retry {attempt+1}/{len(_RETRY_DELAYS)}, "
-              f"waiting {delay}s: {e}")
-        time.sleep(delay)
-      else:
-        print(f"get_embedding failed after retries: {e}")
-        raise
+  return get_embeddings([text], model)[0]
+
+
+async def _arequest_embeddings(texts, model):
+  async def attempt():
+    await request_bucket.acquire_async()
+    response = await embeddings_client.embeddings.create(input=texts, model=model)
+    cost_logger.update_cost(response=response, input_cost=openai_config["embeddings-costs"]["input"], output_cost=openai_config["embeddings-costs"]["output"])
+    return [d.embedding for d in sorted(response.data, key=lambda d: d.index)]
+  try:
+    return await retry_policy.call_async(attempt, "get_embedding")
+  except Exception as e:
+    print(f"get_embedding failed after retries: {e}")
+    raise
+
+
+def _request_embeddings(texts, model):
+  return request_runner.run(_arequest_embeddings(texts, model))
 
 
 if __name__ == '__main__':
@@ -0,0 +1,118 @@
+"""
+Concurrency and rate limits for the asyncio request path in gpt_structure.
+
+All API requests run as coroutines on one event loop that lives in a
+background thread (AsyncRequestRunner), so that the blocking wrappers in
+gpt_structure (ChatGPT_request, get_embedding, ...) can be called from any
+thread, including the TickDispatcher workers, and still share one set of
+pooled connections. A semaphore bounds the number of requests in flight and
+a token bucket (TokenBucket) bounds the request rate.
+
+This module does not import openai.
+"""
+import asyncio
+import threading
+import time
+
+
+class TokenBucket:
+  def __init__(self, rate, capacity=None, clock=time.monotonic):
+    """
+    INPUT
+      rate: Tokens added per second, i.e., the sustained requests per
+            second. 0 (or less) means no limit.
+      capacity: The most tokens that can build up, i.e., the largest burst.
+                Defaults to one second's worth (at least 1).
+      clock: Returns the current time in seconds.
+    """
+    self.rate = rate
+    self.capacity = capacity if capacity is not None else max(1, rate)
+    self.clock = clock
+    self.tokens = self.capacity
+    self.updated = clock()
+    self.lock = threading.Lock()
+
+  def reserve(self):
+    """
+    Takes a token and returns how many seconds the caller has to wait before
+    using it (0 if one was available). Tokens may be taken ahead of time, so
+    callers that have to wait are served in the order they asked.
+    """
+    if self.rate <= 0:
+      return 0.0
+    with self.lock:
+      now = self.clock()
+      self.tokens = min(self.capacity,
+                        self.tokens + (now - self.updated) * self.rate)
+      self.updated = now
+      self.tokens -= 1
+      if self.tokens >= 0:
+        return 0.0
+      return -self.tokens / self.rate
+
+  def acquire(self):
+    wait = self.reserve()
+    if wait > 0:
+      time.sleep(wait)
+
+  async def acquire_async(self):
+    wait = self.reserve()
+    if wait > 0:
+      await asyncio.sleep(wait)
+
+
+class AsyncRequestRunner:
+  def __init__(self, max_in_flight=8):
+    """
+    INPUT
+      max_in_flight: The most coroutines (requests) run at the same time.
+    """
+    self.max_in_flight = max(1, int(max_in_flight))
+    self._loop = None
+    self._thread = None
+    self._semaphore = None
+    self._lock = threading.Lock()
+
+  @property
+  def loop(self):
+    """
+    The event loop the requests run on, started on first use.
+    """
+    with self._lock:
+      if self._loop is None:
+        loop = asyncio.new_event_loop()
+        thread = threading.Thread(target=loop.run_forever,
+                                  name="llm-requests", daemon=True)
+        thread.start()
+        self._loop, self._thread = loop, thread
+      return self._loop
+
+  async def _limited(self, coro):
+    # The semaphore is made on the loop's own thread so that it belongs to
+    # that loop.
+    if self._semaphore is None:
+      self._semaphore = asyncio.Semaphore(self.max_in_flight)
+    async with self._semaphore:
+      return await coro
+
+  def submit(self, coro):
+    """
+    Schedules <coro> and returns a concurrent.futures.Future for its result.
+    """
+    return asyncio.run_coroutine_threadsafe(self._limited(coro), self.loop)
+
+  def run(self, coro, timeout=None):
+    """
+    Runs <coro> on the request loop and blocks until it returns (or raises).
+    Must not be called from the loop's own thread.
+    """
+    return self.submit(coro).result(timeout)
+
+  def close(self):
+    with self._lock:
+      if self._loop is None:
+        return
+      self._loop.call_soon_threadsafe(self._loop.stop)
+      self._thread.join()
+      self._loop.close()
+      self._loop, self._thread, self._semaphore = None, None, None
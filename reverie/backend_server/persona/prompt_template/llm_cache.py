@@ -0,0 +1,188 @@
+"""
+Content-addressed, on-disk cache of LLM responses.
+
+Responses are keyed on a hash of (model, rendered messages, sampling
+parameters, cache slot) and stored in a small SQLite file, so they survive
+across runs. The number of entries is bounded; once it is exceeded the
+least recently used entries are evicted.
+
+The cache has three modes:
+  "off":       every request goes to the API (the default).
+  "readwrite": hits are served from disk, misses go to the API and are
+               stored.
+  "replay":    hits are served from disk, a miss raises CacheMiss. Used to
+               rerun a simulation deterministically without calling the API.
+
+This module does not import openai, so it can be used (and tested) with any
+callable that produces the response text.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+
+
+CACHE_MODES = ("off", "readwrite", "replay")
+
+
+class CacheMiss(Exception):
+  """
+  Raised in replay mode when a request is not in the cache.
+  """
+
+
+def cache_key(model, messages, params=None, cache_slot=0):
+  """
+  Returns the hex digest identifying a request.
+
+  INPUT
+    model: The model (or deployment) name.
+    messages: The rendered chat messages.
+    params: dict of sampling parameters (temperature, max_tokens, ...).
+    cache_slot: Distinguishes repeated identical requests whose answers
+                should not be shared, e.g., the n-th retry of a prompt
+                whose earlier answer failed validation.
+  OUTPUT
+    a str key.
+  """
+  payload = json.dumps({"model": model,
+                        "messages": messages,
+                        "params": params or dict(),
+                        "slot": cache_slot},
+                       sort_keys=True, ensure_ascii=False)
+  return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class LLMCache:
+  def __init__(self, path=None, max_entries=100000, mode="off"):
+    """
+    INPUT
+      path: The SQLite file holding the cache. Not needed when <mode> is
+            "off".
+      max_entries: The most responses kept on disk.
+      mode: One of CACHE_MODES.
+    """
+    if mode not in CACHE_MODES:
+      raise ValueError(f"Invalid LLM cache mode: {mode}")
+    self.path = path
+    self.max_entries = max_entries
+    self.mode = mode
+    self.hits = 0
+    self.misses = 0
+    self.evictions = 0
+    # Requests may come from several threads; one connection is shared and
+    # every access to it goes through this lock.
+    self.lock = threading.Lock()
+    self._db = None
+    # Monotonic counter used as the recency stamp of an entry.
+    self._clock = 0
+    self._size = 0
+    if self.enabled:
+      self._open()
+
+  @property
+  def enabled(self):
+    return self.mode != "off"
+
+  def _open(self):
+    folder = os.path.dirname(self.path)
+    if folder:
+      os.makedirs(folder, exist_ok=True)
+    self._db = sqlite3.connect(self.path, check_same_thread=False)
+    self._db.execute("CREATE TABLE IF NOT EXISTS responses ("
+                     "key TEXT PRIMARY KEY, "
+                     "response TEXT NOT NULL, "
+                     "last_used INTEGER NOT NULL)")
+    self._db.commit()
+    row = self._db.execute(
+      "SELECT COUNT(*), COALESCE(MAX(last_used), 0) FROM responses").fetchone()
+    self._size, self._clock = row
+
+  def get(self, key):
+    """
+    Returns the cached response for <key> (marking it as recently used), or
+    None if it is not cached.
+    """
+    if not self.enabled:
+      return None
+    with self.lock:
+      row = self._db.execute("SELECT response FROM responses WHERE key = ?",
+                             (key,)).fetchone()
+      if row is None:
+        return None
+      self._clock += 1
+      self._db.execute("UPDATE responses SET last_used = ? WHERE key = ?",
+                       (self._clock, key))
+      self._db.commit()
+      return row[0]
+
+  def put(self, key, response):
+    if not self.enabled:
+      return
+    with self.lock:
+      self._clock += 1
+      exists = self._db.execute("SELECT 1 FROM responses WHERE key = ?",
+                                (key,)).fetchone()
+      self._db.execute(
+        "INSERT OR REPLACE INTO responses (key, response, last_used) "
+        "VALUES (?, ?, ?)", (key, response, self._clock))
+      if exists is None:
+        self._size += 1
+      excess = self._size - self.max_entries
+      if excess > 0:
+        self._db.execute(
+          "DELETE FROM responses WHERE key IN (SELECT key FROM responses "
+          "ORDER BY last_used LIMIT ?)", (excess,))
+        self._size -= excess
+        self.evictions += excess
+      self._db.commit()
+
+  def fetch(self, model, messages, params, call, cache_slot=0):
+    """
+    Returns the response to a request, from the cache if possible.
+
+    INPUT
+      model, messages, params, cache_slot: Identify the request (see
+                                           cache_key).
+      call: Zero-argument callable that performs the request and returns
+            the response text. Only called on a miss. If it raises, nothing
+            is cached.
+    OUTPUT
+      (response text, whether it was a cache hit)
+    """
+    if not self.enabled:
+      return call(), False
+    key = cache_key(model, messages, params, cache_slot)
+    response = self.get(key)
+    if response is not None:
+      self.hits += 1
+      return response, True
+    self.misses += 1
+    if self.mode == "replay":
+      raise CacheMiss(f"No cached response for {model} request {key[:12]}")
+    response = call()
+    self.put(key, response)
+    return response, False
+
+  def stats(self):
+    lookups = self.hits + self.misses
+    return {"hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "size": self._size,
+            "hit_rate": self.hits / lookups if lookups else 0.0}
+
+  def clear(self):
+    if not self.enabled:
+      return
+    with self.lock:
+      self._db.execute("DELETE FROM responses")
+      self._db.commit()
+      self._size = 0
+
+  def close(self):
+    if self._db is not None:
+      with self.lock:
+        self._db.close()
+        self._db = None
@@ -36,6 +36,9 @@ class OpenAICostLogger_Singleton(metaclass=Singleton):
             log_folder=log_folder
         ) 
         self.lock = threading.Lock() # Lock to ensure thread safety when updating the cost logger.
+        # LLM response cache lookups; hits are requests that cost nothing.
+        self.cache_hits = 0
+        self.cache_misses = 0
         
     
     def update_cost(self, response: dict, input_cost: float, output_cost: float = 0):
@@ -51,4 +54,22 @@ class OpenAICostLogger_Singleton(metaclass=Singleton):
                 response=response,
                 input_cost=input_cost,
                 output_cost=output_cost
-            )
\ No newline at end of file
+            )
+
+    def record_cache_lookup(self, hit: bool):
+        """Records one LLM response cache lookup.
+
+        Args:
+            hit (bool): whether the response was served from the cache.
+        """
+        with self.lock:
+            if hit:
+                self.cache_hits += 1
+            else:
+                self.cache_misses += 1
+
+
+    def get_cache_hit_rate(self) -> float:
+        """Returns the fraction of cache lookups that were hits (0 if none)."""
+        lookups = self.cache_hits + self.cache_misses
+        return self.cache_hits / lookups if lookups else 0.0
@@ -0,0 +1,216 @@
+"""
+Retry policy shared by every API request in gpt_structure.
+
+Transient errors (429, 5xx, "overloaded", ...) are retried with
+decorrelated-jitter exponential backoff that starts well under a second. If
+the server sends a Retry-After header, that wait is used instead. After
+<breaker_threshold> consecutive transient failures the circuit breaker opens:
+for <breaker_cooldown> seconds requests fail at once with CircuitOpenError
+rather than piling more load on a struggling endpoint, after which a single
+trial request is let through to close it again.
+
+This module does not import openai.
+"""
+import asyncio
+import email.utils
+import random
+import threading
+import time
+
+
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+
+
+class CircuitOpenError(Exception):
+  """
+  Raised instead of sending a request while the circuit breaker is open.
+  """
+
+
+def is_retryable(exc):
+  """Return True if the exception looks like a transient OpenAI error."""
+  status = getattr(exc, "status_code", None) or getattr(exc, "http_status", None)
+  if status and int(status) in RETRYABLE_STATUS_CODES:
+    return True
+  if type(exc).__name__ in ("APIConnectionError", "APITimeoutError"):
+    return True
+  msg = str(exc).lower()
+  return any(k in msg for k in ("server_error", "rate limit", "overloaded", "502", "503"))
+
+
+def retry_after(exc, now=None):
+  """
+  Returns the wait in seconds the server asked for in the error's response
+  headers (retry-after-ms or retry-after, in seconds or as an HTTP date),
+  or None if it did not ask.
+  """
+  response = getattr(exc, "response", None)
+  headers = getattr(response, "headers", None)
+  if not headers:
+    return None
+  value = headers.get("retry-after-ms")
+  if value is not None:
+    try:
+      return max(0.0, float(value) / 1000)
+    except ValueError:
+      pass
+  value = headers.get("retry-after")
+  if value is None:
+    return None
+  try:
+    return max(0.0, float(value))
+  except ValueError:
+    pass
+  try:
+    when = email.utils.parsedate_to_datetime(value)
+  except (TypeError, ValueError):
+    return None
+  now = time.time() if now is None else now
+  return max(0.0, when.timestamp() - now)
+
+
+class RetryPolicy:
+  def __init__(self, base_delay=0.5, max_delay=60.0, max_attempts=8,
+               breaker_threshold=10, breaker_cooldown=30.0,
+               rng=None, clock=time.monotonic):
+    """
+    INPUT
+      base_delay: The smallest backoff, in seconds.
+      max_delay: The largest backoff (and the largest Retry-After honoured),
+                 in seconds.
+      max_attempts: The most times one request is sent.
+      breaker_threshold: Consecutive transient failures, across all
+                         requests, that open the circuit breaker.
+      breaker_cooldown: Seconds the breaker stays open.
+      rng: random.Random used for the jitter.
+      clock: Returns the current time in seconds.
+    """
+    self.base_delay = base_delay
+    self.max_delay = max_delay
+    self.max_attempts = max_attempts
+    self.breaker_threshold = breaker_threshold
+    self.breaker_cooldown = breaker_cooldown
+    self.rng = rng or random.Random()
+    self.clock = clock
+    self.lock = threading.Lock()
+    self._consecutive_failures = 0
+    self._open_until = None
+    self._trial_in_flight = False
+    # Metrics.
+    self.requests = 0
+    self.retries = 0
+    self.failures = 0
+    self.time_waited = 0.0
+    self.breaker_trips = 0
+    self.rejected = 0
+
+  def next_delay(self, prev_delay, exc=None):
+    """
+    Returns the wait before the next attempt: the server's Retry-After if
+    it gave one, otherwise a decorrelated-jitter backoff drawn from
+    [base_delay, 3 * prev_delay], capped at max_delay.
+    """
+    asked = retry_after(exc) if exc is not None else None
+    if asked is not None:
+      return min(asked, self.max_delay)
+    upper = max(self.base_delay, prev_delay * 3)
+    return min(self.max_delay, self.rng.uniform(self.base_delay, upper))
+
+  def _before_attempt(self):
+    with self.lock:
+      if self._open_until is None:
+        return
+      if self.clock() < self._open_until or self._trial_in_flight:
+        self.rejected += 1
+        raise CircuitOpenError("Too many consecutive API failures; "
+                               "not sending requests for now")
+      # Cooldown is over: let one trial request through.
+      self._trial_in_flight = True
+
+  def _on_success(self):
+    with self.lock:
+      self._consecutive_failures = 0
+      self._open_until = None
+      self._trial_in_flight = False
+
+  def _on_failure(self, retryable):
+    with self.lock:
+      self._trial_in_flight = False
+      if not retryable:
+        return
+      self._consecutive_failures += 1
+      if (self._consecutive_failures >= self.breaker_threshold
+          or self._open_until is not None):
+        if self._open_until is None or self.clock() >= self._open_until:
+          self.breaker_trips += 1
+        self._open_until = self.clock() + self.breaker_cooldown
+
+  def _schedule_retry(self, label, attempt, prev_delay, exc):
+    """
+    Returns the wait before retrying after <exc>, or None if the error
+    should be raised.
+    """
+    retryable = is_retryable(exc)
+    self._on_failure(retryable)
+    if not retryable or attempt + 1 >= self.max_attempts:
+      with self.lock:
+        self.failures += 1
+      return None
+    delay = self.next_delay(prev_delay, exc)
+    with self.lock:
+      self.retries += 1
+      self.time_waited += delay
+    print(f"{label} retry {attempt+1}/{self.max_attempts-1}, "
+          f"waiting {delay:.2f}s: {exc}")
+    return delay
+
+  def call(self, fn, label="request"):
+    """
+    Calls <fn>() until it succeeds, retrying transient errors. Raises the
+    last error, or CircuitOpenError while the breaker is open.
+    """
+    with self.lock:
+      self.requests += 1
+    delay = self.base_delay
+    for attempt in range(self.max_attempts):
+      self._before_attempt()
+      try:
+        result = fn()
+      except Exception as e:
+        delay = self._schedule_retry(label, attempt, delay, e)
+        if delay is None:
+          raise
+        time.sleep(delay)
+        continue
+      self._on_success()
+      return result
+
+  async def call_async(self, fn, label="request"):
+    """
+    Like call(), for a <fn> that returns a coroutine.
+    """
+    with self.lock:
+      self.requests += 1
+    delay = self.base_delay
+    for attempt in range(self.max_attempts):
+      self._before_attempt()
+      try:
+        result = await fn()
+      except Exception as e:
+        delay = self._schedule_retry(label, attempt, delay, e)
+        if delay is None:
+          raise
+        await asyncio.sleep(delay)
+        continue
+      self._on_success()
+      return result
+
+  def stats(self):
+    with self.lock:
+      return {"requests": self.requests,
+              "retries": self.retries,
+              "failures": self.failures,
+              "time_waited": self.time_waited,
+              "breaker_trips": self.breaker_trips,
+              "rejected": self.rejected,
+              "breaker_open": self._open_until is not None}
@@ -0,0 +1,195 @@
+"""
+Registry of the personas in a simulation, indexed by role and patient state.
+
+ReverieServer's housekeeping passes (triage timeouts, orphan rescue, queue
+boosting, the status dashboard) used to scan every persona each step and
+filter on role and scratch.state. A PersonaRegistry is the <personas> dict
+itself (name -> Persona), and additionally keeps:
+
+  roles:  role -> {name: persona}
+  states: patient state -> {name: persona}
+
+The state index is kept up to date by the hook on patient_scratch.state: a
+registered patient's scratch calls back into the registry whenever its state
+changes. Lookups return personas in the order they were added to the
+simulation (the iteration order of the dict), so the passes process patients
+in the same order as a full scan would.
+
+Given a SimScheduler, the registry also keeps timers for the deadlines on
+its personas' scratches (see sim_clock.Deadline), keyed by (name, deadline
+name). Only the deadlines something waits on are scheduled: on_deadline()
+sets the handler that is called with the persona and the deadline when its
+timer fires, and the other deadlines cost no more than setting the attribute.
+
+Patients can also fall dormant (see Patient._settled()). sleep() sets one
+apart from the awake personas, which awake() iterates over, so the server's
+step leaves it out until wake() brings it back. Whatever changes a dormant
+patient from outside its own move() (its deadline, a doctor or nurse taking it
+on, a chat) calls wake() first.
+"""
+import functools
+import heapq
+import itertools
+
+
+class PersonaRegistry(dict):
+  def __init__(self, scheduler=None):
+    super().__init__()
+    self.roles = dict()
+    self.states = dict()
+    # name -> the order the persona was added in.
+    self._order = dict()
+    self._added = itertools.count()
+    # name -> persona, of the personas that are not dormant.
+    self._awake = dict()
+    # name -> persona, of the dormant patients.
+    self.dormant = dict()
+    # [order reached, heap of (order, name) to come] of the awake() pass
+    # under way, if any.
+    self._pass = None
+    self.scheduler = scheduler
+    # deadline name -> handler(persona, deadline). See on_deadline().
+    self.deadline_handlers = dict()
+
+  def __setitem__(self, name, persona):
+    if name in self:
+      self._unregister(name)
+    else:
+      self._order[name] = next(self._added)
+    super().__setitem__(name, persona)
+    self.roles.setdefault(persona.role, dict())[name] = persona
+    self._awake[name] = persona
+    if persona.role == "Patient":
+      self.states.setdefault(persona.scratch.state, dict())[name] = persona
+      persona.scratch.state_listener = functools.partial(
+        self._state_changed, name)
+    if self.scheduler is not None:
+      persona.scratch.deadline_listener = functools.partial(
+        self._deadline_set, name)
+      for deadline in self.deadline_handlers:
+        self._deadline_set(name, deadline, getattr(persona.scratch, deadline,
+                                                   None))
+
+  def __delitem__(self, name):
+    self._unregister(name)
+    del self._order[name]
+    super().__delitem__(name)
+
+  def pop(self, name, *default):
+    if name not in self:
+      return super().pop(name, *default)
+    persona = self[name]
+    del self[name]
+    return persona
+
+  def _unregister(self, name):
+    persona = self[name]
+    self.roles[persona.role].pop(name, None)
+    self._awake.pop(name, None)
+    self.dormant.pop(name, None)
+    if persona.role == "Patient":
+      self.states.get(persona.scratch.state, dict()).pop(name, None)
+      persona.scratch.state_listener = None
+    else:
+      # Its patients would notice it is gone on their next move().
+      for patient in list(self.dormant.values()):
+        if str(patient.scratch.assigned_doctor) == name:
+          self.wake(patient.name)
+    if self.scheduler is not None:
+      persona.scratch.deadline_listener = None
+      for deadline in self.deadline_handlers:
+        self.scheduler.cancel((name, deadline))
+
+  def _state_changed(self, name, old_state, new_state):
+    persona = self.states[old_state].pop(name)
+    self.states.setdefault(new_state, dict())[name] = persona
+
+  def sleep(self, name):
+    """
+    Leaves patient <name> out of the steps until it is woken.
+    """
+    persona = self._awake.pop(name, None)
+    if persona is not None:
+      self.dormant[name] = persona
+
+  def wake(self, name):
+    """
+    Brings patient <name> back into the steps if it is dormant. Its clock,
+    which stood still meanwhile, is set to the scheduler's time.
+    """
+    persona = self.dormant.pop(name, None)
+    if persona is None:
+      return
+    if self.scheduler is not None and self.scheduler.now is not None:
+      persona.scratch.curr_time = self.scheduler.now
+    self._awake[name] = persona
+    order = self._order[name]
+    if self._pass is not None and order > self._pass[0]:
+      heapq.heappush(self._pass[1], (order, name))
+
+  def awake(self):
+    """
+    Yields (name, persona) for the personas that are not dormant, in the
+    order they were added. A persona woken during the pass is yielded too if
+    the pass has not got past it yet, as a full scan would have.
+    """
+    heap = [(self._order[name], name) for name in self._awake]
+    heapq.heapify(heap)
+    self._pass = [-1, heap]
+    try:
+      while heap:
+        order, name = heapq.heappop(heap)
+        persona = self._awake.get(name)
+        if order <= self._pass[0] or persona is None:
+          continue
+        self._pass[0] = order
+        yield name, persona
+    finally:
+      self._pass = None
+
+  def on_deadline(self, deadline, handler):
+    """
+    Calls handler(persona, deadline) whenever a persona's <deadline> (the
+    name of a Deadline attribute of its scratch) is reached, from now on;
+    the deadlines already set on the registered personas are scheduled too.
+    """
+    self.deadline_handlers[deadline] = handler
+    for name, persona in self.items():
+      self._deadline_set(name, deadline, getattr(persona.scratch, deadline,
+                                                 None))
+
+  def _deadline_set(self, name, deadline, when):
+    if deadline not in self.deadline_handlers:
+      return
+    if when is None:
+      self.scheduler.cancel((name, deadline))
+    else:
+      self.scheduler.schedule((name, deadline), when, self._deadline_reached)
+
+  def _deadline_reached(self, key, when):
+    name, deadline = key
+    self.deadline_handlers[deadline](self[name], when)
+
+  def _in_order(self, personas):
+    return sorted(personas, key=lambda persona: self._order[persona.name])
+
+  def with_role(self, role):
+    """
+    Returns the personas with <role>, in the order they were added.
+    """
+    return self._in_order(self.roles.get(role, dict()).values())
+
+  def in_states(self, *states):
+    """
+    Returns the patients currently in any of <states>, in the order they
+    were added.
+    """
+    return self._in_order(persona for state in states
+                          for persona in self.states.get(state, dict()).values())
+
+  def state_counts(self):
+    """
+    Returns {state: number of patients in it} for the non-empty states.
+    """
+    return {state: len(patients) for state, patients in self.states.items()
+            if patients}
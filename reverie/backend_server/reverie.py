@@ -11,7 +11,6 @@ import traceback
 import argparse
 import random
 import pandas as pd
-import bisect
 from selenium import webdriver
 from global_methods import *
 import utils
@@ -21,6 +20,13 @@ from persona.persona_types.patient import *
 from persona.persona_types.bedside_nurse import *
 from persona.persona_types.triage_nurse import *
 from persona.persona_types.doctor import *
+from persona.prompt_template.gpt_structure import (llm_cache,
+                                                   retry_policy,
+                                                   prefetch_embeddings)
+from tick_dispatch import TickDispatcher
+from persona_registry import PersonaRegistry
+from sim_clock import SimScheduler
+from time_accounts import TimeAccounts
 import pathlib
 import uuid
 from pathlib import Path
@@ -161,6 +167,15 @@ class ReverieServer:
     # (e.g., "double_studio") to instantiate Maze. 
     # e.g., Maze("double_studio")
     self.maze = Maze(reverie_meta['maze_name'], fork_folder, sim_folder, self.seed)
+    # Every persona shares one catalog of the map's places; their spatial 
+    # memories only record which of those places they know about. 
+    MemoryTree.catalog = WorldCatalog(self.maze.address_tiles)
+    # Likewise, they share one embedding matrix, saved with the simulation.
+    AssociativeMemory.embedding_matrix = EmbeddingMatrix(
+      f"{sim_folder}/reverie/embeddings")
+    # Optional approximate retrieval for personas with large memories, e.g.
+    # {"recall": 0.95, "min_nodes": 2000} (see ann_index.py).
+    AssociativeMemory.ann_config = reverie_meta.get("ann_retrieval")
 
     # Compute tiles_per_step from walking speed for adaptive multi-tile movement
     if self.travel_minutes_per_tile > 0:
@@ -172,6 +187,10 @@ class ReverieServer:
           f"(sec_per_step={self.sec_per_step}, "
           f"travel_min_per_tile={self.travel_minutes_per_tile:.4f})")
 
+    # Requests that the personas will make during a tick are sent together
+    # on this many worker threads (see tick_dispatch.py).
+    self.llm_dispatcher = TickDispatcher(reverie_meta.get("llm_workers", 8))
+
     # Override diagnostic room capacity if configured in meta.json
     self.diagnostic_room_capacity = reverie_meta.get("diagnostic_room_capacity")
     if self.diagnostic_room_capacity is not None and int(self.diagnostic_room_capacity) > 0:
@@ -213,7 +232,19 @@ class ReverieServer:
     # This dictionary is meant to keep track of all personas who are part of
     # the Reverie instance. 
     # e.g., ["Isabella Rodriguez"] = Persona("Isabella Rodriguezs")
-    self.personas = dict()
+    # It also indexes the personas by role and the patients by state, and
+    # keeps the deadlines on their scratches scheduled on <scheduler>.
+    self.scheduler = SimScheduler()
+    self.personas = PersonaRegistry(self.scheduler)
+    self.personas.on_deadline("preload_departure_at",
+                              self._depart_preloaded_patient)
+    # Dormant patients are left out of the steps (see Patient._settled())
+    # until the deadline they wait for is reached, or another persona or the
+    # housekeeping passes wake them to change them. <dormant_movements> keeps
+    # the movement entry each of them repeats meanwhile.
+    for deadline in Patient.dormant_states.values():
+      self.personas.on_deadline(deadline, self._wake_patient)
+    self.dormant_movements = dict()
     # <personas_tile> is a dictionary that contains the tile location of
     # the personas (!-> NOT px tile, but the actual tile coordinate).
     # The tile take the form of a set, (row, col). 
@@ -246,6 +277,13 @@ class ReverieServer:
     Patient.admission_boarding_minutes_min = self.admission_boarding_minutes_min
     Patient.admission_boarding_minutes_max = self.admission_boarding_minutes_max
 
+    # The time patients spend in each state and area (and travelling) is
+    # kept in columns during the run and written into <data_collection> when
+    # it is saved or a patient leaves (see time_accounts.py).
+    self.time_accounts = TimeAccounts(Patient.time_increment,
+                                      self.travel_minutes_per_tile)
+    self.time_accounts.load(self.data_collection.get("Patient", {}))
+
     # Headless mode: skip file-based frontend sync for faster batch runs
     self.headless = False
     # Write movement/{step}.json each step (disable for pure logic/data runs)
@@ -275,6 +313,10 @@ class ReverieServer:
     # Preloaded (filler) patient departure window
     self._preload_departure_window_hours = reverie_meta.get("preload_departure_window_hours", 6)
 
+    # How often personas forget expired and repeated idle memories (0 = never)
+    self._memory_compaction_interval = reverie_meta.get("memory_compaction_interval_minutes", 60)
+    self._last_memory_compaction_time = None
+
     # # <persona_convo_match> is a dictionary that describes which of the two
     # # personas are talking to each other. It takes a key of a persona's full
     # # name, and value of another persona's full name who is talking to the 
@@ -350,6 +392,8 @@ class ReverieServer:
       # Create an instance of the determined class
       curr_persona = PersonaClass(persona_name[0], persona_folder, role=persona_name[1], seed=self.seed)
       _assign_wait_targets(curr_persona, self.ctas_wait_config, self.curr_time, self.surge_multiplier)
+      if curr_persona.role == "Patient":
+        curr_persona.time_accounts = self.time_accounts
 
 
       # Ensure persona has an entry in init_env (may be missing after recovery)
@@ -384,8 +428,8 @@ class ReverieServer:
 
       self.personas[persona_name[0]] = curr_persona
       self.personas_tile[persona_name[0]] = (p_x, p_y)
-      self.maze.tiles[p_y][p_x]["events"].add(curr_persona.scratch
-                                              .get_curr_event_and_desc())
+      self.maze.tiles.add_event((p_x, p_y), curr_persona.scratch
+                                            .get_curr_event_and_desc())
       
     with open(init_env_file, "w") as outfile: 
           outfile.write(json.dumps(init_env, indent=2))
@@ -421,7 +465,7 @@ class ReverieServer:
       outfile.write(json.dumps(curr_step, indent=2))
 
   def _is_in_assessment_queue(self, patient_name):
-    return any(entry[1] == patient_name for entry in self.maze.injuries_zones["assessment_queue"])
+    return patient_name in self.maze.injuries_zones["assessment_queue"]
 
   @staticmethod
   def _try_load_json_file(file_path):
@@ -439,24 +483,20 @@ class ReverieServer:
     """
     Move WAITING_FOR_FIRST_ASSESSMENT patients to the assessment queue once their staged wait is satisfied.
     """
-    for persona in self.personas.values():
-      if persona.role != "Patient":
-        continue
+    for persona in self.personas.in_states("WAITING_FOR_FIRST_ASSESSMENT"):
       if persona.scratch.initial_assessment_done:
         continue
-      if persona.scratch.state != "WAITING_FOR_FIRST_ASSESSMENT":
-        continue
       ready_at = persona.scratch.initial_assessment_ready_at
       if ready_at and self.curr_time < ready_at:
         continue
       if self._is_in_assessment_queue(persona.name):
         continue
-      bisect.insort_right(self.maze.injuries_zones["assessment_queue"],
-                          [persona.scratch.CTAS * Patient.priority_factor, persona.name])
+      self.maze.injuries_zones["assessment_queue"].push(
+        persona.scratch.CTAS * Patient.priority_factor, persona.name)
 
   def _rescue_orphaned_patients(self):
     """
-    Scan all patients each step. If a patient is stuck with no assigned
+    Scan the patients in a rescuable state each step. If a patient is stuck with no assigned
     doctor and not already queued, re-insert them into the appropriate
     queue so they can be picked up.
 
@@ -469,19 +509,14 @@ class ReverieServer:
     rescuable_states = {"WAITING_FOR_NURSE", "WAITING_FOR_FIRST_ASSESSMENT", "WAITING_FOR_TEST", "WAITING_FOR_RESULT", "WAITING_FOR_DOCTOR"}
     # Only patients past nurse escort belong in the doctor queue
     doctor_queue_states = {"WAITING_FOR_FIRST_ASSESSMENT", "WAITING_FOR_TEST", "WAITING_FOR_RESULT", "WAITING_FOR_DOCTOR"}
-    queued_names = set(entry[1] for entry in self.maze.patients_waiting_for_doctor)
 
     # Pre-compute patients already claimed by a bedside nurse
     nurse_occupied_patients = set()
-    for p in self.personas.values():
-      if getattr(p, "role", None) == "Bedside Nurse" and p.scratch.occupied:
+    for p in self.personas.with_role("Bedside Nurse"):
+      if p.scratch.occupied:
         nurse_occupied_patients.add(str(p.scratch.occupied).split("|")[-1])
 
-    for persona in self.personas.values():
-      if persona.role != "Patient":
-        continue
-      if persona.scratch.state not in rescuable_states:
-        continue
+    for persona in self.personas.in_states(*rescuable_states):
       if persona.scratch.left_without_being_seen:
         continue
       assigned_doctor = persona.scratch.assigned_doctor
@@ -490,32 +525,30 @@ class ReverieServer:
         if doctor_obj is not None and getattr(doctor_obj, "role", None) == "Doctor":
           continue
         # Recover from stale/corrupt doctor references so intake can proceed.
+        self.personas.wake(persona.name)
         persona.scratch.assigned_doctor = None
 
       # Doctor queue: only for patients past nurse escort
-      if persona.scratch.state in doctor_queue_states and persona.name not in queued_names:
+      if (persona.scratch.state in doctor_queue_states
+          and persona.name not in self.maze.patients_waiting_for_doctor):
         priority = persona.scratch.CTAS * Patient.priority_factor if persona.scratch.CTAS else 3 * Patient.priority_factor
-        bisect.insort_right(self.maze.patients_waiting_for_doctor, [priority, persona.name])
-        queued_names.add(persona.name)
+        self.maze.patients_waiting_for_doctor.push(priority, persona.name)
         print(f"(reverie): Rescued orphaned patient {persona.name} (state={persona.scratch.state}, CTAS {persona.scratch.CTAS}) into patients_waiting_for_doctor")
 
       # Nurse queue: only for WAITING_FOR_NURSE patients not already claimed
       if persona.scratch.state == "WAITING_FOR_NURSE":
         if persona.name in nurse_occupied_patients:
           continue
-        nurse_queued = set(entry[1] for entry in self.maze.injuries_zones.get("bedside_nurse_waiting", []))
-        if persona.name not in nurse_queued:
+        if persona.name not in self.maze.injuries_zones["bedside_nurse_waiting"]:
           ctas = persona.scratch.CTAS if persona.scratch.CTAS else 3
-          bisect.insort_right(
-            self.maze.injuries_zones["bedside_nurse_waiting"],
-            [ctas * Patient.priority_factor, persona.name]
-          )
+          self.maze.injuries_zones["bedside_nurse_waiting"].push(
+            ctas * Patient.priority_factor, persona.name)
           print(f"(reverie): Re-inserted {persona.name} into bedside_nurse_waiting")
 
   def _age_global_doctor_queue(self):
     """
     Every _global_queue_aging_interval sim minutes, decrement all priority
-    values in maze.patients_waiting_for_doctor by 2 (min 1), then re-sort.
+    values in maze.patients_waiting_for_doctor by 2 (min 1).
     Mirrors the per-doctor queue aging in doctor.py:66-74 but for the global
     queue, which otherwise has NO aging mechanism.
     """
@@ -524,13 +557,31 @@ class ReverieServer:
     if self._last_global_queue_aging_time and (self.curr_time - self._last_global_queue_aging_time) < datetime.timedelta(minutes=self._global_queue_aging_interval):
       return
     self._last_global_queue_aging_time = self.curr_time
-    for entry in self.maze.patients_waiting_for_doctor:
-      entry[0] = max(1, entry[0] - 2)
-    self.maze.patients_waiting_for_doctor.sort(key=lambda e: e[0])
+    self.maze.patients_waiting_for_doctor.reprioritize(
+      lambda priority: max(1, priority - 2))
+
+  def _compact_persona_memories(self):
+    """
+    Every _memory_compaction_interval sim minutes, have each persona forget
+    expired memories and merge its repeated idle observations (see
+    AssociativeMemory.forget), so that memory and retrieval cost stay
+    bounded on multi-day runs.
+    """
+    if not self._memory_compaction_interval:
+      return
+    if self._last_memory_compaction_time and (self.curr_time - self._last_memory_compaction_time) < datetime.timedelta(minutes=self._memory_compaction_interval):
+      return
+    self._last_memory_compaction_time = self.curr_time
+    forgotten = 0
+    for persona in self.personas.values():
+      forgotten += persona.a_mem.forget(self.curr_time, persona.scratch.concept_forget)
+    if forgotten:
+      print(f"(reverie): Personas forgot {forgotten} memory nodes")
 
   def _boost_overdue_patients(self):
     """
-    Every _boost_interval_minutes sim minutes, scan all patients and compute
+    Every _boost_interval_minutes sim minutes, scan all patients in a stage 1
+    or stage 2 state and compute
     actual stage time vs target. If overdue, proportionally reduce the
     patient's priority in whichever queue they sit in.
 
@@ -544,18 +595,14 @@ class ReverieServer:
     stage1_states = {"WAITING_FOR_TRIAGE", "TRIAGE", "WAITING_FOR_NURSE", "WAITING_FOR_FIRST_ASSESSMENT"}
     stage2_states = {"WAITING_FOR_TEST", "GOING_FOR_TEST", "WAITING_FOR_RESULT", "WAITING_FOR_DOCTOR"}
 
-    modified_queues = set()
-
-    for persona in self.personas.values():
-      if persona.role != "Patient":
-        continue
+    for persona in self.personas.in_states(*stage1_states, *stage2_states):
       if persona.scratch.left_without_being_seen:
         continue
 
       p_data = self.data_collection.get("Patient", {}).get(persona.name)
       if not p_data:
         continue
-      time_spent = p_data.get("time_spent_state", {})
+      time_spent = self.time_accounts.state_minutes(persona.name)
 
       # Determine which stage the patient is currently in and compute actual time
       current_state = persona.scratch.state
@@ -576,154 +623,108 @@ class ReverieServer:
       if overdue_factor <= 1.0:
         continue
 
-      # Find patient in a queue and boost their priority
-      boosted = False
-
-      # Search patients_waiting_for_doctor
-      for entry in self.maze.patients_waiting_for_doctor:
-        if entry[1] == persona.name:
-          entry[0] = max(1, int(entry[0] / overdue_factor))
-          modified_queues.add("patients_waiting_for_doctor")
-          boosted = True
-          break
-
-      # Search doctor's assigned_patients_waitlist
-      if not boosted and persona.scratch.assigned_doctor:
+      # Find patient in a queue (the global doctor queue, then their
+      # doctor's waitlist, then the bedside nurse queue) and boost their
+      # priority
+      queues = [self.maze.patients_waiting_for_doctor]
+      if persona.scratch.assigned_doctor:
         doctor = self.personas.get(persona.scratch.assigned_doctor)
         if doctor:
-          for entry in doctor.scratch.assigned_patients_waitlist:
-            if entry[1] == persona.name:
-              entry[0] = max(1, int(entry[0] / overdue_factor))
-              modified_queues.add(f"doctor_{doctor.name}")
-              boosted = True
-              break
-
-      # Search bedside_nurse_waiting
-      if not boosted:
-        for entry in self.maze.injuries_zones.get("bedside_nurse_waiting", []):
-          if entry[1] == persona.name:
-            entry[0] = max(1, int(entry[0] / overdue_factor))
-            modified_queues.add("bedside_nurse_waiting")
-            boosted = True
-            break
+          queues += [doctor.scratch.assigned_patients_waitlist]
+      queues += [self.maze.injuries_zones["bedside_nurse_waiting"]]
+      for queue in queues:
+        if persona.name in queue:
+          queue.update(persona.name,
+                       max(1, int(queue.priority(persona.name) / overdue_factor)))
+          break
 
-    # Re-sort all modified queues
-    if "patients_waiting_for_doctor" in modified_queues:
-      self.maze.patients_waiting_for_doctor.sort(key=lambda e: e[0])
-    if "bedside_nurse_waiting" in modified_queues:
-      self.maze.injuries_zones["bedside_nurse_waiting"].sort(key=lambda e: e[0])
-    for key in modified_queues:
-      if key.startswith("doctor_"):
-        doctor_name = key[len("doctor_"):]
-        doctor = self.personas.get(doctor_name)
-        if doctor:
-          doctor.scratch.assigned_patients_waitlist.sort(key=lambda e: e[0])
+  def _wake_patient(self, persona, deadline):
+    """
+    Fired by the scheduler when a deadline a dormant patient may be waiting
+    for is reached: brings the patient back into the steps.
+    """
+    self.personas.wake(persona.name)
 
-  def _process_preloaded_departures(self):
+  def _depart_preloaded_patient(self, persona, departure_at):
     """
-    Check each preloaded (filler) patient for its scheduled departure time.
-    When the deadline arrives, cleanly remove the patient from all queues,
+    Fired by the scheduler when a preloaded (filler) patient's scheduled
+    departure time arrives: cleanly remove the patient from all queues,
     free its bed, and transition it to LEAVING so it walks to the exit.
     """
-    for persona in list(self.personas.values()):
-      if persona.role != "Patient":
-        continue
-      if not persona.scratch.exempt_from_data_collection:
-        continue
-      if persona.scratch.preload_departure_at is None:
-        continue
-      if self.curr_time < persona.scratch.preload_departure_at:
-        continue
-      if persona.scratch.state == "LEAVING":
-        continue
-
-      # --- Queue cleanup ---
-      # 1. Triage queue (list of names)
-      if persona.name in self.maze.triage_queue:
-        self.maze.triage_queue.remove(persona.name)
-
-      # 2. Bedside nurse waiting queue ([priority, name] pairs)
-      for entry in self.maze.injuries_zones["bedside_nurse_waiting"][:]:
-        if entry[1] == persona.name:
-          self.maze.injuries_zones["bedside_nurse_waiting"].remove(entry)
-          break
-
-      # 3. Pager queue ([priority, name] pairs)
-      for entry in self.maze.injuries_zones.get("pager", [])[:]:
-        if entry[1] == persona.name:
-          self.maze.injuries_zones["pager"].remove(entry)
-          break
-
-      # 4. Global doctor queue ([priority, name] pairs)
-      for entry in self.maze.patients_waiting_for_doctor[:]:
-        if entry[1] == persona.name:
-          self.maze.patients_waiting_for_doctor.remove(entry)
-          break
-
-      # 5. Assessment queue ([priority, name] pairs)
-      for entry in self.maze.injuries_zones["assessment_queue"][:]:
-        if entry[1] == persona.name:
-          self.maze.injuries_zones["assessment_queue"].remove(entry)
-          break
-
-      # 6. Release bed and clean all zone current_patients lists
-      if hasattr(persona, "_release_bed"):
-        persona._release_bed(self.maze)
-      for zone_name, zone_info in self.maze.injuries_zones.items():
-        if isinstance(zone_info, dict):
-          cp = zone_info.get("current_patients", [])
-          if persona.name in cp:
-            cp.remove(persona.name)
-
-      # 7. Clean up doctor assignment
-      assigned_doctor_name = persona.scratch.assigned_doctor
-      if assigned_doctor_name:
-        doctor_obj = self.personas.get(str(assigned_doctor_name))
-        if doctor_obj and getattr(doctor_obj, "role", None) == "Doctor":
-          doctor_obj.remove_patient(persona, self.maze)
-          queue = getattr(doctor_obj.scratch, "assigned_patients_waitlist", None)
-          if isinstance(queue, list):
-            queue[:] = [
-              entry for entry in queue
-              if not (isinstance(entry, (list, tuple))
-                      and len(entry) >= 2
-                      and str(entry[1]).strip() == persona.name)
-            ]
-
-      # 8. Clear doctor reference
-      persona.scratch.assigned_doctor = None
-
-      # 9. Clear chatting state so the other persona isn't stuck
-      chat_partner_name = persona.scratch.chatting_with
-      if chat_partner_name:
-        partner = self.personas.get(chat_partner_name)
-        if partner:
-          if partner.scratch.chatting_with == persona.name:
-            partner.scratch.chatting_with = None
-            partner.scratch.chat = None
-            partner.scratch.chatting_end_time = None
-          # If a bedside nurse had this patient as occupied, release them
-          if getattr(partner.scratch, "occupied", None) and persona.name in str(partner.scratch.occupied):
-            partner.scratch.occupied = None
-            partner.scratch.next_step = None
-        persona.scratch.chatting_with = None
-        persona.scratch.chat = None
-        persona.scratch.chatting_end_time = None
-
-      # 10. Release any bedside nurse whose occupied references this patient
-      for other in self.personas.values():
-        if getattr(other, "role", None) != "Patient" and getattr(other.scratch, "occupied", None):
-          if persona.name in str(other.scratch.occupied):
-            other.scratch.occupied = None
-            other.scratch.next_step = None
-
-      # --- Set departure state ---
-      persona.scratch.state = "LEAVING"
-      persona.scratch.next_step = "ed map:emergency department:exit"
-      persona.scratch.act_path_set = False
-      persona.scratch.preload_departure_at = None  # prevent re-processing
-
-      print(f"(reverie): Preloaded patient {persona.name} departing (scheduled departure reached)")
+    if not persona.scratch.exempt_from_data_collection:
+      return
+    if persona.scratch.state == "LEAVING":
+      return
+    self.personas.wake(persona.name)
+
+    # --- Queue cleanup ---
+    # 1. Triage queue (list of names)
+    if persona.name in self.maze.triage_queue:
+      self.maze.triage_queue.remove(persona.name)
+
+    # 2. Bedside nurse waiting queue
+    self.maze.injuries_zones["bedside_nurse_waiting"].remove(persona.name)
+
+    # 3. Pager queue
+    self.maze.injuries_zones["pager"].remove(persona.name)
+
+    # 4. Global doctor queue
+    self.maze.patients_waiting_for_doctor.remove(persona.name)
+
+    # 5. Assessment queue
+    self.maze.injuries_zones["assessment_queue"].remove(persona.name)
+
+    # 6. Release bed and clean all zone current_patients lists
+    if hasattr(persona, "_release_bed"):
+      persona._release_bed(self.maze)
+    for zone_name, zone_info in self.maze.injuries_zones.items():
+      if isinstance(zone_info, dict):
+        cp = zone_info.get("current_patients", [])
+        if persona.name in cp:
+          cp.remove(persona.name)
+
+    # 7. Clean up doctor assignment
+    assigned_doctor_name = persona.scratch.assigned_doctor
+    if assigned_doctor_name:
+      doctor_obj = self.personas.get(str(assigned_doctor_name))
+      if doctor_obj and getattr(doctor_obj, "role", None) == "Doctor":
+        doctor_obj.remove_patient(persona, self.maze)
+        doctor_obj.scratch.assigned_patients_waitlist.remove(persona.name)
+
+    # 8. Clear doctor reference
+    persona.scratch.assigned_doctor = None
+
+    # 9. Clear chatting state so the other persona isn't stuck
+    chat_partner_name = persona.scratch.chatting_with
+    if chat_partner_name:
+      partner = self.personas.get(chat_partner_name)
+      if partner:
+        if partner.scratch.chatting_with == persona.name:
+          partner.scratch.chatting_with = None
+          partner.scratch.chat = None
+          partner.scratch.chatting_end_time = None
+        # If a bedside nurse had this patient as occupied, release them
+        if getattr(partner.scratch, "occupied", None) and persona.name in str(partner.scratch.occupied):
+          partner.scratch.occupied = None
+          partner.scratch.next_step = None
+      persona.scratch.chatting_with = None
+      persona.scratch.chat = None
+      persona.scratch.chatting_end_time = None
+
+    # 10. Release any bedside nurse whose occupied references this patient
+    for other in self.personas.values():
+      if getattr(other, "role", None) != "Patient" and getattr(other.scratch, "occupied", None):
+        if persona.name in str(other.scratch.occupied):
+          other.scratch.occupied = None
+          other.scratch.next_step = None
+
+    # --- Set departure state ---
+    persona.scratch.state = "LEAVING"
+    persona.scratch.next_step = "ed map:emergency department:exit"
+    persona.scratch.act_path_set = False
+    persona.scratch.preload_departure_at = None  # prevent re-processing
+
+    print(f"(reverie): Preloaded patient {persona.name} departing (scheduled departure reached)")
 
   # ------------------------------------------------------------------
   # Triage timeout safety net
@@ -737,17 +738,13 @@ class ReverieServer:
     conversation from orphaning a patient and blocking the slot
     indefinitely.
     """
-    for persona in list(self.personas.values()):
-      if persona.role != "Patient":
-        continue
-      if persona.scratch.state != "TRIAGE":
-        continue
+    for persona in self.personas.in_states("TRIAGE"):
 
       # Use tracked time_spent_state to detect timeout
       p_data = self.data_collection.get("Patient", {}).get(persona.name)
       if not p_data:
         continue
-      triage_minutes = float(p_data.get("time_spent_state", {}).get("TRIAGE", 0) or 0)
+      triage_minutes = float(self.time_accounts.minutes(persona.name, "TRIAGE"))
       if triage_minutes < self._TRIAGE_TIMEOUT_MINUTES:
         continue
 
@@ -770,33 +767,23 @@ class ReverieServer:
       ctas = persona.scratch.CTAS if persona.scratch.CTAS is not None else 3
       prio = ctas * Patient.priority_factor
       if ctas != 1:
-        bisect.insort_right(
-            self.maze.injuries_zones["bedside_nurse_waiting"],
-            [prio, persona.name],
-        )
+        self.maze.injuries_zones["bedside_nurse_waiting"].push(prio, persona.name)
       else:
-        bisect.insort_right(
-            self.maze.injuries_zones["pager"],
-            [prio, persona.name],
-        )
+        self.maze.injuries_zones["pager"].push(prio, persona.name)
 
       # 4. Add to doctor waiting queue
-      if not any(e[1] == persona.name for e in self.maze.patients_waiting_for_doctor):
-        bisect.insort_right(
-            self.maze.patients_waiting_for_doctor,
-            [prio, persona.name],
-        )
+      if persona.name not in self.maze.patients_waiting_for_doctor:
+        self.maze.patients_waiting_for_doctor.push(prio, persona.name)
 
       # 5. Clear stale chatting state on any triage nurse referencing
       #    this patient
-      for other in self.personas.values():
-        if getattr(other, "role", None) == "TriageNurse":
-          if getattr(other.scratch, "chatting_with", None) == persona.name:
-            other.scratch.chatting_with = None
-            other.scratch.chat = None
-            other.scratch.chatting_end_time = None
-          if getattr(other.scratch, "chatting_patient", None) == persona.name:
-            other.scratch.chatting_patient = None
+      for other in self.personas.with_role("TriageNurse"):
+        if getattr(other.scratch, "chatting_with", None) == persona.name:
+          other.scratch.chatting_with = None
+          other.scratch.chat = None
+          other.scratch.chatting_end_time = None
+        if getattr(other.scratch, "chatting_patient", None) == persona.name:
+          other.scratch.chatting_patient = None
 
   # ------------------------------------------------------------------
   # Live simulation status dashboard
@@ -811,17 +798,13 @@ class ReverieServer:
 
     # --- Gather patient states ---
     state_counts = {}
-    total_patients = 0
+    for st, cnt in self.personas.state_counts().items():
+      st = st or "UNKNOWN"
+      state_counts[st] = state_counts.get(st, 0) + cnt
+    patients = self.personas.with_role("Patient")
+    total_patients = len(patients)
     completed = 0
-    left_ed = 0
-    for p in self.personas.values():
-      if p.role != "Patient":
-        continue
-      total_patients += 1
-      st = p.scratch.state or "UNKNOWN"
-      state_counts[st] = state_counts.get(st, 0) + 1
-      if getattr(p.scratch, "left_ED", False):
-        left_ed += 1
+    left_ed = sum(1 for p in patients if getattr(p.scratch, "left_ED", False))
 
     # --- Zone occupancy ---
     zone_lines = []
@@ -843,17 +826,14 @@ class ReverieServer:
     # --- Doctor utilisation ---
     doctors_free = len(self.maze.doctors_taking_more_patients)
     doctor_assigned = {}
-    for p in self.personas.values():
-      if getattr(p, "role", None) == "Doctor":
-        n = len(getattr(p.scratch, "assigned_patients", []))
-        doctor_assigned[p.name] = n
+    for p in self.personas.with_role("Doctor"):
+      n = len(getattr(p.scratch, "assigned_patients", []))
+      doctor_assigned[p.name] = n
 
     # --- Nurse utilisation ---
     nurse_status = {"Monitoring": 0, "Transferring": 0,
                     "Resting": 0, "Available": 0, "Other": 0}
-    for p in self.personas.values():
-      if getattr(p, "role", None) != "BedsideNurse":
-        continue
+    for p in self.personas.with_role("BedsideNurse"):
       occ = getattr(p.scratch, "occupied", None)
       desc = getattr(p.scratch, "act_description", "") or ""
       if occ and "Transfer" in str(occ):
@@ -914,6 +894,31 @@ class ReverieServer:
     lines.append(f"    Pager (CTAS 1)            {pager_q:>4}")
     lines.append(f"    Doctor global queue        {doctor_global_q:>4}")
     lines.append("")
+    path_stats = self.maze.path_cache.stats()
+    lines.append("  PATH CACHE")
+    lines.append("  " + "-" * 40)
+    lines.append(f"    Hits / misses             {path_stats['hits']} / "
+                 f"{path_stats['misses']}  ({path_stats['hit_rate']:.0%})")
+    lines.append(f"    Cached paths              {path_stats['size']:>4}")
+    lines.append("")
+    if llm_cache.enabled:
+      llm_stats = llm_cache.stats()
+      lines.append(f"  LLM CACHE  ({llm_cache.mode})")
+      lines.append("  " + "-" * 40)
+      lines.append(f"    Hits / misses             {llm_stats['hits']} / "
+                   f"{llm_stats['misses']}  ({llm_stats['hit_rate']:.0%})")
+      lines.append(f"    Cached responses          {llm_stats['size']:>4}")
+      lines.append("")
+    retry_stats = retry_policy.stats()
+    lines.append("  API RETRIES")
+    lines.append("  " + "-" * 40)
+    lines.append(f"    Requests / retries        {retry_stats['requests']} / "
+                 f"{retry_stats['retries']}")
+    lines.append(f"    Failed requests           {retry_stats['failures']:>4}")
+    lines.append(f"    Time lost waiting         {retry_stats['time_waited']:.1f}s")
+    lines.append(f"    Circuit breaker trips     {retry_stats['breaker_trips']:>4}"
+                 f"{'  (open)' if retry_stats['breaker_open'] else ''}")
+    lines.append("")
     lines.append(f"  NURSES  (20 total)")
     lines.append("  " + "-" * 40)
     for label, cnt in nurse_status.items():
@@ -1128,6 +1133,7 @@ class ReverieServer:
     reverie_meta["priority_boost_interval_minutes"] = self._boost_interval_minutes
     reverie_meta["global_queue_aging_interval_minutes"] = self._global_queue_aging_interval
     reverie_meta["preload_departure_window_hours"] = self._preload_departure_window_hours
+    reverie_meta["memory_compaction_interval_minutes"] = self._memory_compaction_interval
     reverie_meta["diagnostic_room_capacity"] = self.diagnostic_room_capacity
     reverie_meta["testing_probability_by_ctas"] = Patient.testing_probability_by_ctas
     reverie_meta["preload_waiting_room_patients"] = self.preload_waiting_room_patients
@@ -1157,11 +1163,14 @@ class ReverieServer:
       _atomic_write_json(f"{env_dir}/{self.step}.json", env_data)
 
     # Save the personas.
+    self.time_accounts.materialize(self.data_collection.get("Patient", {}))
     for persona_name, persona in self.personas.items(): 
       save_folder = f"{sim_folder}/personas/{persona_name}/bootstrap_memory"
       persona.save(save_folder)
       self.data_collection[persona.role][persona_name] = persona.save_data(self.data_collection[persona.role][persona_name])
 
+    AssociativeMemory.embedding_matrix.save()
+
     # Save maze variables
     self.maze.save(reverie_maze_f)
 
@@ -1527,13 +1536,13 @@ class ReverieServer:
     
     if(assessment_queue is None):
       curr_patient.scratch.state = choosen_state = "WAITING_FOR_FIRST_ASSESSMENT"
-      bisect.insort_right(self.maze.patients_waiting_for_doctor, [curr_patient.scratch.CTAS * Patient.priority_factor, curr_patient.name])
+      self.maze.patients_waiting_for_doctor.push(curr_patient.scratch.CTAS * Patient.priority_factor, curr_patient.name)
 
     # Find state it has selected and make sure all Patient variables are properly set so there is no errors
     if(choosen_state == "WAITING_FOR_FIRST_ASSESSMENT"):
       if ((not curr_patient.scratch.initial_assessment_ready_at or self.curr_time >= curr_patient.scratch.initial_assessment_ready_at) 
           and assessment_queue is not None):
-        assessment_queue.append([curr_patient.scratch.CTAS * Patient.priority_factor, curr_patient.name])
+        assessment_queue.push(curr_patient.scratch.CTAS * Patient.priority_factor, curr_patient.name)
 
     elif(choosen_state == "WAITING_FOR_TEST"):
       # Preloaded patients skip diagnostic room - go straight to WAITING_FOR_RESULT
@@ -1549,7 +1558,7 @@ class ReverieServer:
       if curr_patient.scratch.disposition_ready_at is None:
         curr_patient.scratch.disposition_ready_at = self.curr_time
       #if self.curr_time >= (curr_patient.scratch.disposition_ready_at or self.curr_time) and assessment_queue:
-      assessment_queue.append([curr_patient.scratch.CTAS * (Patient.priority_factor // 2), curr_patient.name])
+      assessment_queue.push(curr_patient.scratch.CTAS * (Patient.priority_factor // 2), curr_patient.name)
 
     elif(choosen_state == "WAITING_FOR_RESULT"):
       curr_patient.scratch.time_to_next = self.curr_time + datetime.timedelta(minutes=random.randint(1, Patient.testing_result_time))
@@ -1738,12 +1747,17 @@ class ReverieServer:
           # Then we initialize game_obj_cleanup for this cycle. 
           game_obj_cleanup = dict()
 
+          # Fire the deadlines that have been reached (e.g., scheduled
+          # preloaded patient departures), waking the dormant patients whose
+          # wait is over in time for this step.
+          self.scheduler.run_due(self.curr_time)
+
           # Track the patients that are in the exit area and leaving
           leaving_patient = []
 
           # We first move our personas in the backend environment to match 
-          # the frontend environment. 
-          for persona_name, persona in list(self.personas.items()): 
+          # the frontend environment. (Dormant patients stay where they are.)
+          for persona_name, persona in list(self.personas.awake()): 
             # <curr_tile> is the tile that the persona was at previously. 
             curr_tile = self.personas_tile.get(persona_name)
             if curr_tile is None:
@@ -1795,10 +1809,13 @@ class ReverieServer:
 
           # Check for any patients who are leaving as assigned in the previous for loop
           for curr_persona in leaving_patient:
+            self.time_accounts.materialize(self.data_collection.get("Patient", {}),
+                                           [curr_persona.name])
             curr_persona.leave_ed(self.maze, self.personas, sim_folder, self.data_collection)
             # Remove persona from runtime trackers
             self.personas.pop(curr_persona.name, None)
             self.personas_tile.pop(curr_persona.name, None)
+            self.dormant_movements.pop(curr_persona.name, None)
 
 
 
@@ -1807,9 +1824,25 @@ class ReverieServer:
           # move. The movement for each of the personas comes in the form of
           # x y coordinates where the persona will move towards. e.g., (50, 34)
           # This is where the core brains of the personas are invoked. 
+          # The LLM work of the tick is sent concurrently (see 
+          # tick_dispatch.py). First we fetch the embeddings that the 
+          # personas who think this tick will need; then the personas move 
+          # one at a time, in order, and find them already fetched. The 
+          # prompts their moves need (e.g., the conversations of the chats 
+          # they start) are queued, sent together once all have moved, and 
+          # applied in persona order. 
+          embedding_texts = []
+          for persona_name, persona in self.personas.awake(): 
+            tile_entry = self.personas_tile.get(persona_name)
+            if tile_entry is not None: 
+              embedding_texts += persona.embedding_requests(self.maze, 
+                                                            tile_entry)
+          prefetch_embeddings(embedding_texts, self.llm_dispatcher)
+
           movements = {"persona": dict(), 
                        "meta": dict()}
-          for persona_name, persona in list(self.personas.items()): 
+          llm_requests = []
+          for persona_name, persona in self.personas.awake(): 
             # <next_tile> is a x,y coordinate. e.g., (58, 9)
             # <pronunciatio> is an emoji. e.g., "\ud83d\udca4"
             # <description> is a string description of the movement. e.g., 
@@ -1824,46 +1857,49 @@ class ReverieServer:
             if persona_bucket is None:
               persona_bucket = persona.data_collection_dict()
               role_bucket[persona_name] = persona_bucket
-            pre_state = None
-            pre_area = None
             if persona.role == "Patient":
-              pre_state = persona.scratch.state
-              pre_area = self.maze.tiles[tile_entry[1]][tile_entry[0]]['arena']
+              # The step is spent in the state the patient starts it in, on
+              # the tile it starts it on.
+              arena = self.maze.tiles[tile_entry[1]][tile_entry[0]]['arena']
+              self.time_accounts.record(
+                persona_name, persona.scratch.state, arena, tile_entry)
+              self.dormant_movements.pop(persona_name, None)
             next_tile, pronunciatio, description = persona.move(
               self.maze, self.personas, tile_entry, 
               self.curr_time, persona_bucket)
-            if persona.role == "Patient" and self.travel_minutes_per_tile > 0:
-              tiles_moved = 0
-              if next_tile and (next_tile[0] != tile_entry[0] or next_tile[1] != tile_entry[1]):
-                tiles_moved = abs(next_tile[0] - tile_entry[0]) + abs(next_tile[1] - tile_entry[1])
-                if tiles_moved == 0:
-                  tiles_moved = 1
-              if tiles_moved > 0:
-                travel_minutes = tiles_moved * self.travel_minutes_per_tile
-                persona_bucket.setdefault("tiles_traveled", 0)
-                persona_bucket["tiles_traveled"] += tiles_moved
-                persona_bucket.setdefault("travel_time_minutes", 0.0)
-                persona_bucket["travel_time_minutes"] += travel_minutes
-                travel_state = persona_bucket.setdefault("travel_time_state", {})
-                if pre_state:
-                  travel_state[pre_state] = travel_state.get(pre_state, 0) + travel_minutes
-                travel_area = persona_bucket.setdefault("travel_time_area", {})
-                if pre_area:
-                  travel_area[pre_area] = travel_area.get(pre_area, 0) + travel_minutes
+            llm_requests += persona.llm_requests
+            persona.llm_requests = []
+            if persona.role == "Patient" and next_tile: 
+              self.time_accounts.record_move(persona_name, next_tile)
             movements["persona"][persona_name] = {}
             movements["persona"][persona_name]["movement"] = next_tile
             movements["persona"][persona_name]["pronunciatio"] = pronunciatio
             movements["persona"][persona_name]["description"] = description
-            movements["persona"][persona_name]["chat"] = (persona
-                                                          .scratch.chat)
+            if persona.role == "Patient" and persona.settled: 
+              # Waiting in bed with nothing due before it wakes: it spends
+              # the steps until then as this one.
+              self.personas.sleep(persona_name)
+              self.time_accounts.hold(persona_name, persona.scratch.state, 
+                                      arena)
+              self.dormant_movements[persona_name] = (
+                movements["persona"][persona_name])
+
+          self.llm_dispatcher.run_requests(llm_requests)
+          # The movements show the chats as they stand after the step,
+          # including the ones started in it.
+          for persona_name, movement in movements["persona"].items(): 
+            movement["chat"] = self.personas[persona_name].scratch.chat
+
+          # Add the step's time to the patients' accounts in one go.
+          self.time_accounts.flush()
 
           # Fix orphaned patients, age global queue, boost overdue patients,
-          # triage timeouts, and process scheduled preloaded patient departures
+          # and triage timeouts
           self._rescue_orphaned_patients()
           self._age_global_doctor_queue()
           self._boost_overdue_patients()
           self._check_triage_timeouts()
-          self._process_preloaded_departures()
+          self._compact_persona_memories()
           self._write_sim_status(sim_folder)
 
           # Add new Patient based on threshold when it's over or equal to one
@@ -1911,7 +1947,10 @@ class ReverieServer:
               self.personas_tile[p_name] = (mv[0], mv[1])
 
           # Write movement file for replay support (skipped in pure logic runs).
+          # The dormant patients repeat their last movement.
           if self.write_movement:
+            movements["persona"] = {**self.dormant_movements, 
+                                    **movements["persona"]}
             curr_move_file = f"{sim_folder}/movement/{self.step}.json"
             _atomic_write_json(curr_move_file, movements)
 
@@ -2402,12 +2441,14 @@ class ReverieServer:
     )
 
     _assign_wait_targets(curr_persona, self.ctas_wait_config, self.curr_time, self.surge_multiplier)
+    if curr_persona.role == "Patient":
+      curr_persona.time_accounts = self.time_accounts
 
 
     self.personas[curr_persona.name] = curr_persona
     self.personas_tile[curr_persona.name] = (pos[0], pos[1])
-    self.maze.tiles[pos[1]][pos[0]]["events"].add(curr_persona.scratch
-                                .get_curr_event_and_desc())
+    self.maze.tiles.add_event(pos, curr_persona.scratch
+                              .get_curr_event_and_desc())
     
     if(curr_persona.name not in self.data_collection[curr_persona.role].keys()):
       temp_dict = curr_persona.data_collection_dict()
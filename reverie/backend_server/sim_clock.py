@@ -0,0 +1,121 @@
+"""
+Simulation-clock scheduling of time-gated state transitions.
+
+Many persona transitions wait on a sim-time deadline kept on the scratch
+(time_to_next, testing_end_time, disposition_ready_at, chatting_end_time,
+...), and used to be found by comparing every persona's timestamps with
+curr_time on every step. A SimScheduler is a heap of timers keyed by sim time:
+deadlines are registered as they are set, and run_due() fires the callbacks of
+exactly the timers whose time has come.
+
+Scratch attributes declared as Deadline()s report every new value to the
+scratch's <deadline_listener>, which the PersonaRegistry points at the
+server's scheduler; so setting e.g. scratch.testing_end_time is all it takes
+to (re)schedule that patient's timer, and setting it to None cancels it.
+"""
+import heapq
+import itertools
+
+
+class SimScheduler:
+  def __init__(self):
+    # Heap of [when, order, key, callback]. Cancelled and replaced timers
+    # have key None.
+    self._heap = []
+    # key -> its live heap entry.
+    self._timers = dict()
+    self._scheduled = itertools.count()
+    # The sim time of the last run_due().
+    self.now = None
+
+  def schedule(self, key, when, callback):
+    """
+    Sets the timer <key> to call callback(key, when) once the sim time
+    reaches <when>. A timer already set under <key> is replaced.
+    """
+    self.cancel(key)
+    entry = [when, next(self._scheduled), key, callback]
+    self._timers[key] = entry
+    heapq.heappush(self._heap, entry)
+
+  def cancel(self, key):
+    """
+    Cancels the timer <key>. Returns whether it was set.
+    """
+    entry = self._timers.pop(key, None)
+    if entry is None:
+      return False
+    entry[2] = None
+    # Rebuild once cancelled timers make up most of the heap.
+    if len(self._heap) > 2 * len(self._timers) + 16:
+      self._heap = [e for e in self._heap if e[2] is not None]
+      heapq.heapify(self._heap)
+    return True
+
+  def when(self, key):
+    """
+    Returns the time the timer <key> is set for, or None if it is not set.
+    """
+    entry = self._timers.get(key)
+    return entry[0] if entry else None
+
+  def next_time(self):
+    """
+    Returns the time of the earliest timer, or None if none is set.
+    """
+    while self._heap and self._heap[0][2] is None:
+      heapq.heappop(self._heap)
+    return self._heap[0][0] if self._heap else None
+
+  def run_due(self, curr_time):
+    """
+    Fires, earliest first, every timer set for <curr_time> or before
+    (including timers that callbacks set for such times). Returns the number
+    of timers fired.
+    """
+    self.now = curr_time
+    fired = 0
+    while self._heap and self._heap[0][0] <= curr_time:
+      when, _, key, callback = heapq.heappop(self._heap)
+      if key is None:
+        continue
+      del self._timers[key]
+      callback(key, when)
+      fired += 1
+    return fired
+
+  def __contains__(self, key):
+    return key in self._timers
+
+  def __len__(self):
+    return len(self._timers)
+
+
+class Deadline:
+  """
+  A scratch attribute holding a sim-time deadline (a datetime or None).
+  Setting it calls scratch.deadline_listener(name, when), if there is one.
+  """
+  def __set_name__(self, owner, name):
+    self.name = name
+    self.attr = f"_{name}"
+
+  def __get__(self, scratch, owner=None):
+    if scratch is None:
+      return self
+    return scratch.__dict__.get(self.attr)
+
+  def __set__(self, scratch, when):
+    scratch.__dict__[self.attr] = when
+    listener = scratch.__dict__.get("deadline_listener")
+    if listener is not None:
+      listener(self.name, when)
+
+  @staticmethod
+  def names(scratch):
+    """
+    Returns the names of the Deadline attributes of <scratch>.
+    """
+    return [name for klass in type(scratch).__mro__
+            for name, attr in vars(klass).items()
+            if isinstance(attr, Deadline)]
@@ -0,0 +1,64 @@
+"""
+Runs the independent LLM requests of a simulation tick concurrently.
+
+The server sends the requests of a tick through a TickDispatcher all at
+once, so the tick waits for the slowest request instead of the sum of them:
+
+  - Before the personas move, the embeddings of the events the thinking
+    personas are about to perceive are fetched together, and their moves
+    find them already there.
+  - While they move, one by one in their usual order, the personas do not
+    wait on their prompts either (e.g., the conversation of a chat they
+    start). Each such step is split in two: a run() that only makes the
+    LLM requests and reads the simulation, and an apply(result) that
+    commits what they returned. The moves queue these (run, apply) pairs;
+    once all personas have moved, run_requests() runs them together and
+    applies the results in the order they were queued, i.e., in persona
+    order.
+"""
+from concurrent.futures import ThreadPoolExecutor
+
+
+class TickDispatcher:
+  def __init__(self, max_workers=8):
+    """
+    INPUT
+      max_workers: The most requests in flight at once. With 1 (or less)
+                   requests are run inline, one after another.
+    """
+    self.max_workers = max(1, int(max_workers))
+    self._pool = None
+
+  def map(self, fn, items):
+    """
+    Calls <fn> on every item and returns the results in the order of
+    <items>. If a call raises, the first such exception (in item order) is
+    raised once all calls have finished.
+    """
+    items = list(items)
+    if self.max_workers == 1 or len(items) <= 1:
+      return [fn(item) for item in items]
+    if self._pool is None:
+      self._pool = ThreadPoolExecutor(max_workers=self.max_workers,
+                                      thread_name_prefix="tick-dispatch")
+    futures = [self._pool.submit(fn, item) for item in items]
+    errors = [future.exception() for future in futures]
+    for error in errors:
+      if error is not None:
+        raise error
+    return [future.result() for future in futures]
+
+  def run_requests(self, requests):
+    """
+    Calls run() of every (run, apply) pair in <requests> concurrently, then
+    apply(result) of each, one after another, in the order of <requests>.
+    """
+    requests = list(requests)
+    results = self.map(lambda request: request[0](), requests)
+    for (_, apply), result in zip(requests, results):
+      apply(result)
+
+  def shutdown(self):
+    if self._pool is not None:
+      self._pool.shutdown(wait=True)
+      self._pool = None
@@ -0,0 +1,263 @@
+"""
+Compact, array-backed storage for the maze tiles.
+
+The maze used to hold one dict (plus one set of events) per tile, which
+on the foothills layout is ~15k dicts and ~15k sets. Here the per-tile
+names are interned to integer IDs kept in NumPy arrays, collision is a
+bool array, and events are kept in a sparse dict that only has entries
+for tiles that actually hold events.
+
+Maze.access_tile (and maze.tiles[y][x]) still hand out dict-like views,
+so existing callers keep working unchanged.
+"""
+
+from collections.abc import Mapping
+
+import numpy as np
+
+
+# Per-tile name layers, in the order they appear in a tile's details.
+TILE_LEVELS = ("sector", "arena", "game_object", "spawning_location")
+TILE_KEYS = ("world",) + TILE_LEVELS + ("collision", "events")
+
+_NO_EVENTS = frozenset()
+
+
+class TileStore:
+  def __init__(self, world, height, width):
+    """
+    INPUT
+      world: The world name shared by every tile.
+      height, width: The maze dimensions in tiles.
+    """
+    self.world = world
+    self.height = height
+    self.width = width
+    # <names[level]> maps an ID to its name; ID 0 is always the empty name.
+    self.names = {level: [""] for level in TILE_LEVELS}
+    self._name_ids = {level: {"": 0} for level in TILE_LEVELS}
+    self.ids = {level: np.zeros((height, width), dtype=np.int32)
+                for level in TILE_LEVELS}
+    self.collision = np.zeros((height, width), dtype=bool)
+    # Bumped whenever a tile's names change after loading, so that caches of
+    # what was seen on the map (e.g., explored-tile bitmaps) can be reset.
+    self.version = 0
+    # (x, y) -> set of events. Only tiles that hold events have an entry.
+    self.events = dict()
+    # Event index. <subject_events> maps an event subject to the tiles it
+    # has events on ({tile: set of events}), and <region_tiles> maps a 
+    # (sector ID, arena ID) pair to the tiles of that arena holding events.
+    self.subject_events = dict()
+    self.region_tiles = dict()
+
+  def intern(self, level, name):
+    """
+    Returns the integer ID of <name> in <level>, adding it if needed.
+    """
+    name_id = self._name_ids[level].get(name)
+    if name_id is None:
+      name_id = len(self.names[level])
+      self._name_ids[level][name] = name_id
+      self.names[level] += [name]
+    return name_id
+
+  def load_layer(self, level, layer, block_names):
+    """
+    Fills a name layer from a Tiled layer.
+
+    INPUT
+      level: One of TILE_LEVELS.
+      layer: 2-d list ([y][x]) of Tiled block numbers.
+      block_names: dict from block number (as a string) to name; block
+                   numbers that are not in it get the empty name.
+    """
+    raw = np.asarray(layer)
+    blocks, inverse = np.unique(raw, return_inverse=True)
+    lookup = np.array([self.intern(level, block_names.get(str(b), ""))
+                       for b in blocks], dtype=np.int32)
+    self.ids[level] = lookup[inverse].reshape(raw.shape)
+
+  def get(self, tile, level):
+    """
+    Returns the <level> name ("world", "sector", ...) of an (x, y) tile.
+    """
+    if level == "world":
+      return self.world
+    return self.names[level][self.ids[level][tile[1], tile[0]]]
+
+  def set(self, tile, level, name):
+    key = (tile[0], tile[1])
+    moves_region = level in ("sector", "arena") and key in self.events
+    if moves_region:
+      self._unindex_tile(key)
+    self.ids[level][tile[1], tile[0]] = self.intern(level, name)
+    self.version += 1
+    if moves_region:
+      self._index_tile(key)
+
+  def region(self, tile):
+    """
+    Returns the (sector ID, arena ID) pair identifying the arena of a tile.
+    """
+    return (int(self.ids["sector"][tile[1], tile[0]]),
+            int(self.ids["arena"][tile[1], tile[0]]))
+
+  def address(self, tile, level):
+    """
+    Returns the string address of an (x, y) tile down to <level>, e.g.
+    "ed map:emergency department:triage room" for level "arena".
+    """
+    x, y = tile[0], tile[1]
+    path = f"{self.world}"
+    if level == "world":
+      return path
+    path += f":{self.names['sector'][self.ids['sector'][y, x]]}"
+    if level == "sector":
+      return path
+    path += f":{self.names['arena'][self.ids['arena'][y, x]]}"
+    if level == "arena":
+      return path
+    path += f":{self.names['game_object'][self.ids['game_object'][y, x]]}"
+    return path
+
+  def events_at(self, tile):
+    """
+    Returns the live event set of an (x, y) tile, or an empty frozenset if
+    the tile holds no events. Use add_event/discard_event to change it.
+    """
+    return self.events.get((tile[0], tile[1]), _NO_EVENTS)
+
+  def add_event(self, tile, event):
+    key = (tile[0], tile[1])
+    if key not in self.events:
+      self.events[key] = set()
+      self._index_tile(key)
+    self.events[key].add(event)
+    subject_tiles = self.subject_events.setdefault(event[0], dict())
+    subject_tiles.setdefault(key, set()).add(event)
+
+  def discard_event(self, tile, event):
+    key = (tile[0], tile[1])
+    curr_events = self.events.get(key)
+    if curr_events is None or event not in curr_events:
+      return
+    curr_events.discard(event)
+    self._discard_subject_entry(event[0], key, [event])
+    if not curr_events:
+      self._drop_tile(key)
+
+  def discard_subject(self, tile, subject):
+    """
+    Removes every event of <subject> from a tile, without scanning the
+    tile's other events.
+    """
+    key = (tile[0], tile[1])
+    subject_tiles = self.subject_events.get(subject)
+    if not subject_tiles or key not in subject_tiles:
+      return
+    subject_evs = list(subject_tiles[key])
+    self._discard_subject_entry(subject, key, subject_evs)
+    curr_events = self.events[key]
+    curr_events.difference_update(subject_evs)
+    if not curr_events:
+      self._drop_tile(key)
+
+  def subject_tiles(self, subject):
+    """
+    Returns the tiles on which <subject> currently has events.
+    """
+    return list(self.subject_events.get(subject, dict()).keys())
+
+  def region_event_tiles(self, tile, left, right, top, bottom):
+    """
+    Returns the tiles holding events that are in the same arena as <tile>
+    and inside the window left <= x < right, top <= y < bottom.
+    """
+    region_tiles = self.region_tiles.get(self.region(tile), ())
+    return [t for t in region_tiles
+            if left <= t[0] < right and top <= t[1] < bottom]
+
+  def _discard_subject_entry(self, subject, key, events):
+    subject_tiles = self.subject_events.get(subject)
+    if subject_tiles is None or key not in subject_tiles:
+      return
+    subject_tiles[key].difference_update(events)
+    if not subject_tiles[key]:
+      del subject_tiles[key]
+      if not subject_tiles:
+        del self.subject_events[subject]
+
+  def _drop_tile(self, key):
+    self._unindex_tile(key)
+    del self.events[key]
+
+  def _index_tile(self, key):
+    self.region_tiles.setdefault(self.region(key), set()).add(key)
+
+  def _unindex_tile(self, key):
+    region = self.region(key)
+    region_tiles = self.region_tiles.get(region)
+    if region_tiles is not None:
+      region_tiles.discard(key)
+      if not region_tiles:
+        del self.region_tiles[region]
+
+  def __getitem__(self, y):
+    # Keeps the old maze.tiles[y][x] access pattern working.
+    return _TileRow(self, y)
+
+  def __len__(self):
+    return self.height
+
+
+class _TileRow:
+  def __init__(self, store, y):
+    self.store = store
+    self.y = y
+
+  def __getitem__(self, x):
+    return TileView(self.store, (x, self.y))
+
+  def __len__(self):
+    return self.store.width
+
+
+class TileView(Mapping):
+  """
+  Dict-like view of a single tile, with the same keys the old per-tile
+  dicts had: world, sector, arena, game_object, spawning_location,
+  collision and events.
+  """
+  def __init__(self, store, tile):
+    self.store = store
+    self.tile = tile
+
+  def __getitem__(self, key):
+    if key == "events":
+      return self.store.events_at(self.tile)
+    if key == "collision":
+      return bool(self.store.collision[self.tile[1], self.tile[0]])
+    if key in TILE_LEVELS or key == "world":
+      return self.store.get(self.tile, key)
+    raise KeyError(key)
+
+  def __setitem__(self, key, value):
+    if key == "events":
+      for event in list(self.store.events_at(self.tile)):
+        self.store.discard_event(self.tile, event)
+      for event in value:
+        self.store.add_event(self.tile, event)
+    elif key == "collision":
+      # Collisions are static: the maze builds its walkable grid, flow
+      # fields and path cache on them once.
+      raise TypeError("tile collision is read-only")
+    elif key in TILE_LEVELS:
+      self.store.set(self.tile, key, value)
+    else:
+      raise KeyError(key)
+
+  def __iter__(self):
+    return iter(TILE_KEYS)
+
+  def __len__(self):
+    return len(TILE_KEYS)
@@ -0,0 +1,282 @@
+"""
+Columnar accounting of the time patients spend in each state and area.
+
+Every step, each patient's data_collection entry gets the step's minutes
+added to time_spent_state[state] and time_spent_area[arena] and, when it
+moved, to tiles_traveled, travel_time_minutes and travel_time_state/area.
+Doing that in per-patient dictionaries costs several lookups per patient per
+step. TimeAccounts keeps the same figures in NumPy matrices (patient row x
+state or arena column) instead. The step loop only records each patient's
+state, area and move, and flush() adds them all in a few vectorized
+operations. A patient that stays put in the same state and area for a while
+(a dormant one) can be held there instead, and is then added to by every
+flush() without being recorded.
+
+The data_collection entries are only written when they are needed
+(materialize(): when the simulation is saved or a patient leaves). Their
+dictionaries keep the keys in the order the patient first entered each state
+or area, as before. The additions are the same float additions the
+dictionaries did, so the totals are the same to the last bit.
+"""
+import itertools
+
+import numpy as np
+
+
+class _Table:
+  """
+  Minutes per patient (row) and label (column: a state or an arena), with
+  the order each patient first got minutes for each label.
+  """
+  def __init__(self):
+    self.labels = []
+    self.columns = dict()
+    self.minutes = np.zeros((0, 0))
+    # Stamp of the first addition to each cell, -1 while it has none.
+    self.first = np.full((0, 0), -1, dtype=np.int64)
+
+  def column(self, label):
+    col = self.columns.get(label)
+    if col is None:
+      col = len(self.labels)
+      self.labels += [label]
+      self.columns[label] = col
+      self.grow(self.minutes.shape[0], col + 1)
+    return col
+
+  def grow(self, rows, cols):
+    old_rows, old_cols = self.minutes.shape
+    if rows <= old_rows and cols <= old_cols:
+      return
+    rows = max(rows, old_rows)
+    cols = max(cols, 2 * old_cols, 8) if cols > old_cols else old_cols
+    minutes = np.zeros((rows, cols))
+    minutes[:old_rows, :old_cols] = self.minutes
+    first = np.full((rows, cols), -1, dtype=np.int64)
+    first[:old_rows, :old_cols] = self.first
+    self.minutes, self.first = minutes, first
+
+  def add(self, rows, cols, minutes, stamp):
+    self.minutes[rows, cols] += minutes
+    new = self.first[rows, cols] < 0
+    self.first[rows[new], cols[new]] = stamp
+
+  def get(self, row, label):
+    col = self.columns.get(label)
+    if col is None or self.first[row, col] < 0:
+      return 0.0
+    return float(self.minutes[row, col])
+
+  def as_dict(self, row):
+    cols = np.flatnonzero(self.first[row] >= 0)
+    cols = cols[np.argsort(self.first[row, cols], kind="stable")]
+    return {self.labels[col]: float(self.minutes[row, col]) for col in cols}
+
+
+class TimeAccounts:
+  def __init__(self, minutes_per_step, minutes_per_tile=0.0):
+    """
+    INPUT
+      minutes_per_step: Sim minutes added per recorded step.
+      minutes_per_tile: Travel minutes per tile moved (0 to not track travel).
+    """
+    self.minutes_per_step = minutes_per_step
+    self.minutes_per_tile = minutes_per_tile
+    # name -> row.
+    self.rows = dict()
+    self.names = []
+    self.states = _Table()
+    self.areas = _Table()
+    self.travel_states = _Table()
+    self.travel_areas = _Table()
+    self.tiles_traveled = np.zeros(0, dtype=np.int64)
+    self.travel_minutes = np.zeros(0)
+    # Whether the patient moved since its entry was loaded.
+    self.traveled = np.zeros(0, dtype=bool)
+    # row -> [state column, area column, from tile, to tile, state, area]
+    # recorded for this step.
+    self._pending = dict()
+    # row -> (state column, area column) of the held patients, and those as
+    # arrays (rows, state columns, area columns); None when out of date.
+    self._held = dict()
+    self._held_arrays = None
+    # Rows changed since they were last materialized.
+    self._dirty = set()
+    self._stamps = itertools.count()
+
+  def _row(self, name):
+    row = self.rows.get(name)
+    if row is not None:
+      return row
+    row = len(self.names)
+    self.rows[name] = row
+    self.names += [name]
+    if row >= len(self.tiles_traveled):
+      size = max(2 * row, 16)
+      for table in [self.states, self.areas, self.travel_states,
+                    self.travel_areas]:
+        table.grow(size, 0)
+      self.tiles_traveled = np.resize(self.tiles_traveled, size)
+      self.travel_minutes = np.resize(self.travel_minutes, size)
+      self.traveled = np.resize(self.traveled, size)
+    self.tiles_traveled[row] = 0
+    self.travel_minutes[row] = 0.0
+    self.traveled[row] = False
+    return row
+
+  def load(self, buckets):
+    """
+    Starts the accounts from the figures in data_collection entries (e.g.,
+    when resuming a saved simulation).
+
+    INPUT
+      buckets: {name: data_collection entry} of the patients.
+    """
+    for name, bucket in buckets.items():
+      if not isinstance(bucket, dict):
+        continue
+      row = self._row(name)
+      for table, key in [(self.states, "time_spent_state"),
+                         (self.areas, "time_spent_area"),
+                         (self.travel_states, "travel_time_state"),
+                         (self.travel_areas, "travel_time_area")]:
+        for label, minutes in (bucket.get(key) or {}).items():
+          col = table.column(label)
+          table.minutes[row, col] = minutes or 0
+          table.first[row, col] = next(self._stamps)
+      self.tiles_traveled[row] = bucket.get("tiles_traveled") or 0
+      self.travel_minutes[row] = bucket.get("travel_time_minutes") or 0
+
+  def record(self, name, state, area, from_tile):
+    """
+    Records that patient <name> spends this step in <state>, on <from_tile>
+    in <area>. Added by the next flush().
+    """
+    row = self._row(name)
+    if self._held.pop(row, None) is not None:
+      self._held_arrays = None
+    self._pending[row] = [self.states.column(state), self.areas.column(area),
+                          from_tile, None, state, area]
+
+  def record_move(self, name, to_tile):
+    """
+    Records the tile patient <name> moves to this step (after record()).
+    """
+    self._pending[self.rows[name]][3] = to_tile
+
+  def hold(self, name, state, area):
+    """
+    Holds patient <name> in <state> and <area>, without moving: every
+    flush() from the next one on adds a step for it, until record() is
+    called for it again.
+    """
+    row = self._row(name)
+    self._held[row] = (self.states.column(state), self.areas.column(area))
+    self._held_arrays = None
+
+  def flush(self):
+    """
+    Adds the recorded step, and a step for every held patient not recorded
+    in it, to the accounts.
+    """
+    if not self._pending and not self._held:
+      return
+    stamp = next(self._stamps)
+    rows = np.fromiter(self._pending.keys(), dtype=np.int64,
+                       count=len(self._pending))
+    steps = list(self._pending.values())
+    self._pending = dict()
+    state_cols = np.array([step[0] for step in steps], dtype=np.int64)
+    area_cols = np.array([step[1] for step in steps], dtype=np.int64)
+    if self._held:
+      if self._held_arrays is None:
+        self._held_arrays = (
+          np.fromiter(self._held.keys(), dtype=np.int64, count=len(self._held)),
+          np.array([cols[0] for cols in self._held.values()], dtype=np.int64),
+          np.array([cols[1] for cols in self._held.values()], dtype=np.int64))
+      held_rows, held_states, held_areas = self._held_arrays
+      fresh = ~np.isin(held_rows, rows)
+      all_rows = np.concatenate([rows, held_rows[fresh]])
+      state_cols = np.concatenate([state_cols, held_states[fresh]])
+      area_cols = np.concatenate([area_cols, held_areas[fresh]])
+      self._dirty.update(self._held)
+    else:
+      all_rows = rows
+    self._dirty.update(rows.tolist())
+    self.states.add(all_rows, state_cols, self.minutes_per_step, stamp)
+    self.areas.add(all_rows, area_cols, self.minutes_per_step, stamp)
+    if self.minutes_per_tile <= 0:
+      return
+
+    moves = [(row, step) for row, step in zip(rows.tolist(), steps)
+             if step[3] is not None]
+    if not moves:
+      return
+    ends = np.array([[step[2][0], step[2][1], step[3][0], step[3][1]]
+                     for _, step in moves], dtype=np.int64)
+    tiles = np.abs(ends[:, 2] - ends[:, 0]) + np.abs(ends[:, 3] - ends[:, 1])
+    moved = tiles > 0
+    if not moved.any():
+      return
+    rows = np.array([row for row, _ in moves], dtype=np.int64)[moved]
+    tiles = tiles[moved]
+    steps = [step for (_, step), m in zip(moves, moved) if m]
+    minutes = tiles * self.minutes_per_tile
+    self.tiles_traveled[rows] += tiles
+    self.travel_minutes[rows] += minutes
+    self.traveled[rows] = True
+    for table, label_at in [(self.travel_states, 4), (self.travel_areas, 5)]:
+      labeled = np.array([bool(step[label_at]) for step in steps])
+      if labeled.any():
+        cols = np.array([table.column(step[label_at]) for step in steps
+                         if step[label_at]])
+        table.add(rows[labeled], cols, minutes[labeled], stamp)
+
+  def minutes(self, name, state):
+    """
+    Returns the minutes patient <name> has spent in <state>, including a
+    step recorded but not flushed yet (but not a held one).
+    """
+    row = self.rows.get(name)
+    if row is None:
+      return 0.0
+    minutes = self.states.get(row, state)
+    step = self._pending.get(row)
+    if step is not None and step[4] == state:
+      minutes += self.minutes_per_step
+    return minutes
+
+  def state_minutes(self, name):
+    """
+    Returns {state: minutes} for patient <name>, like its time_spent_state,
+    as of the last flush().
+    """
+    row = self.rows.get(name)
+    return self.states.as_dict(row) if row is not None else dict()
+
+  def materialize(self, buckets, names=None):
+    """
+    Writes the accounts, as of the last flush(), into the patients'
+    data_collection entries.
+
+    INPUT
+      buckets: {name: data_collection entry} of the patients.
+      names: The patients to write; by default all that changed since they
+             were last written.
+    """
+    if names is None:
+      rows = sorted(self._dirty)
+    else:
+      rows = [self.rows[name] for name in names if name in self.rows]
+    for row in rows:
+      bucket = buckets.get(self.names[row])
+      if not isinstance(bucket, dict):
+        continue
+      self._dirty.discard(row)
+      bucket["time_spent_state"] = self.states.as_dict(row)
+      bucket["time_spent_area"] = self.areas.as_dict(row)
+      if self.traveled[row]:
+        bucket["tiles_traveled"] = int(self.tiles_traveled[row])
+        bucket["travel_time_minutes"] = float(self.travel_minutes[row])
+        bucket["travel_time_state"] = self.travel_states.as_dict(row)
+        bucket["travel_time_area"] = self.travel_areas.as_dict(row)
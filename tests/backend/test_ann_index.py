@@ -0,0 +1,140 @@
+import datetime
+import types
+
+import numpy as np
+import pytest
+
+from persona.memory_structures.ann_index import IVFIndex
+from persona.memory_structures.associative_memory import AssociativeMemory
+from persona.memory_structures.retrieval_index import RetrievalIndex
+
+
+START = datetime.datetime(2024, 1, 1, 8, 0, 0)
+
+
+def clustered(rng, n, dim=32, n_topics=12, noise=0.6):
+    topics = rng.normal(size=(n_topics, dim))
+    vectors = topics[rng.integers(n_topics, size=n)]
+    vectors = vectors + noise * rng.normal(size=(n, dim))
+    return vectors, topics
+
+
+def unit(vectors):
+    return vectors / np.linalg.norm(vectors, axis=-1, keepdims=True)
+
+
+def memories(rng, n, ann):
+    vectors, topics = clustered(rng, n)
+    embeddings = {f"memory {i}": vectors[i] for i in range(n)}
+    index = RetrievalIndex(ann)
+    for i in range(n):
+        node = types.SimpleNamespace(
+            node_id=f"node_{i + 1}", type="event", type_count=i + 1,
+            embedding_key=f"memory {i}", poignancy=int(rng.integers(1, 10)),
+            last_accessed=START + datetime.timedelta(minutes=i))
+        index.add(node, vectors[i])
+    return index, embeddings, topics
+
+
+class TestIVFIndex:
+    def test_trains_at_min_nodes_and_when_doubled(self):
+        ivf = IVFIndex(min_nodes=100)
+        assert not ivf.needs_training(99)
+        assert ivf.needs_training(100)
+        rng = np.random.default_rng(0)
+        vectors, _ = clustered(rng, 100)
+        ivf.train(np.arange(100), unit(vectors))
+        assert len(ivf.lists) == 10
+        assert sorted(sum(ivf.lists, [])) == list(range(100))
+        assert not ivf.needs_training(199)
+        assert ivf.needs_training(200)
+
+    def test_calibrated_recall(self):
+        rng = np.random.default_rng(1)
+        vectors, topics = clustered(rng, 900)
+        vectors = unit(vectors)
+        ivf = IVFIndex(recall=0.9, min_nodes=100, k=10)
+        ivf.train(np.arange(900), vectors)
+        assert 1 <= ivf.n_probe <= len(ivf.lists)
+        found = []
+        for query in unit(topics[rng.integers(12, size=40)]
+                          + 0.6 * rng.normal(size=(40, 32))):
+            true = np.argsort(-(vectors @ query))[:10]
+            found += [len(set(true) & set(ivf.search(query))) / 10]
+        assert np.mean(found) >= 0.85
+
+    def test_add_goes_to_nearest_list(self):
+        ivf = IVFIndex(min_nodes=1)
+        vectors = np.array([[1.0, 0.0], [0.9, 0.1], [0.0, 1.0], [0.1, 0.9]])
+        ivf.train(np.arange(4), unit(vectors))
+        ivf.add(4, unit(np.array([0.2, 1.0])))
+        home = [c for c, entries in enumerate(ivf.lists) if 2 in entries][0]
+        assert 4 in ivf.lists[home]
+
+    def test_search_includes_farthest_list(self):
+        ivf = IVFIndex(recall=0.0, min_nodes=1)
+        vectors = np.array([[1.0, 0.0], [0.9, 0.1], [-1.0, 0.0],
+                            [-0.9, -0.1]])
+        ivf.train(np.arange(4), unit(vectors))
+        assert sorted(ivf.search(np.array([1.0, 0.0]))) == [0, 1, 2, 3]
+
+
+class TestApproximateRetrieval:
+    def test_small_memories_are_scored_exactly(self):
+        rng = np.random.default_rng(3)
+        exact, embeddings, _ = memories(rng, 150, None)
+        approximate = RetrievalIndex(IVFIndex(min_nodes=1000))
+        for node in exact.nodes:
+            approximate.add(node, embeddings[node.embedding_key])
+        focal = rng.normal(size=32)
+        assert (approximate.rank(embeddings, focal, 0.99, 1, 1, 1, 30)
+                == exact.rank(embeddings, focal, 0.99, 1, 1, 1, 30))
+        assert not approximate.ann.trained
+
+    def test_close_to_exact_ranking(self):
+        rng = np.random.default_rng(4)
+        exact, embeddings, topics = memories(rng, 1600, None)
+        approximate = RetrievalIndex(IVFIndex(min_nodes=1000))
+        for node in exact.nodes:
+            approximate.add(node, embeddings[node.embedding_key])
+        overlap = []
+        for topic in topics:
+            focal = topic + 0.6 * rng.normal(size=32)
+            a = approximate.rank(embeddings, focal, 0.99, 1, 1, 1, 30)
+            b = exact.rank(embeddings, focal, 0.99, 1, 1, 1, 30)
+            overlap += [len(set(map(id, a)) & set(map(id, b))) / 30]
+        assert approximate.ann.trained
+        assert np.mean(overlap) >= 0.9
+
+    def test_nodes_added_after_training_are_found(self):
+        rng = np.random.default_rng(5)
+        index, embeddings, topics = memories(rng, 1200, IVFIndex(
+            min_nodes=1000))
+        index.rank(embeddings, topics[0], 0.99, 1, 1, 1, 30)
+        assert index.ann.trained
+        embeddings["new memory"] = topics[0] * 10
+        node = types.SimpleNamespace(
+            node_id="node_new", type="thought", type_count=1,
+            embedding_key="new memory", poignancy=9,
+            last_accessed=START)
+        index.add(node, embeddings["new memory"])
+        assert index.rank(embeddings, topics[0], 0.99, 1, 1, 1, 1) == [node]
+
+
+@pytest.fixture
+def ann_config(monkeypatch):
+    config = {"recall": 0.9, "min_nodes": 10}
+    monkeypatch.setattr(AssociativeMemory, "ann_config", config)
+    return config
+
+
+class TestAssociativeMemoryConfig:
+    def test_ann_from_config(self, ann_config, tmp_path):
+        folder = tmp_path / "a_mem"
+        folder.mkdir()
+        (folder / "nodes.json").write_text("{}")
+        (folder / "kw_strength.json").write_text(
+            '{"kw_strength_event": {}, "kw_strength_thought": {}}')
+        (folder / "embeddings.json").write_text("{}")
+        ann = AssociativeMemory(str(folder)).retrieval_index.ann
+        assert (ann.recall, ann.min_nodes) == (0.9, 10)
@@ -0,0 +1,278 @@
+import datetime
+import json
+
+import pytest
+
+from persona.memory_structures.associative_memory import (AssociativeMemory,
+                                                          NodeSequence)
+
+
+START = datetime.datetime(2024, 1, 1, 8, 0, 0)
+
+
+@pytest.fixture
+def a_mem(tmp_path):
+    folder = tmp_path / "a_mem"
+    folder.mkdir()
+    (folder / "nodes.json").write_text("{}")
+    (folder / "kw_strength.json").write_text(json.dumps(
+        {"kw_strength_event": {}, "kw_strength_thought": {}}))
+    (folder / "embeddings.json").write_text("{}")
+    return AssociativeMemory(str(folder))
+
+
+def add_events(a_mem, n, keywords=("patient",)):
+    return [a_mem.add_event(START + datetime.timedelta(minutes=i), None,
+                            f"Patient {i}", "is", "waiting",
+                            f"Patient {i} is waiting", list(keywords), 1,
+                            (f"Patient {i} is waiting", [1.0, 0.0]), None)
+            for i in range(n)]
+
+
+class TestNodeSequence:
+    def test_newest_first(self):
+        seq = NodeSequence()
+        for node in "abcd":
+            seq.push(node)
+        assert list(seq) == ["d", "c", "b", "a"]
+        assert (seq[0], seq[-1], seq[1]) == ("d", "a", "c")
+        assert len(seq) == 4 and seq
+
+    def test_slices(self):
+        seq = NodeSequence("abcde")
+        assert seq[:2] == ["e", "d"]
+        assert seq[1:3] == ["d", "c"]
+        assert seq[::-1] == ["a", "b", "c", "d", "e"]
+        assert seq[:10] == ["e", "d", "c", "b", "a"]
+        assert NodeSequence()[:3] == []
+
+    def test_index_out_of_range(self):
+        seq = NodeSequence("ab")
+        with pytest.raises(IndexError):
+            seq[2]
+        with pytest.raises(IndexError):
+            seq[-3]
+
+    def test_behaves_like_a_list(self):
+        seq = NodeSequence("ab")
+        assert seq + NodeSequence("c") == ["b", "a", "c"]
+        assert ["x"] + seq == ["x", "b", "a"]
+        ret = []
+        ret += seq
+        assert ret == ["b", "a"]
+        assert seq == ["b", "a"] and "a" in seq
+        assert not NodeSequence() and NodeSequence() == []
+
+
+class TestAssociativeMemorySequences:
+    def test_events_newest_first(self, a_mem):
+        nodes = add_events(a_mem, 5)
+        assert list(a_mem.seq_event) == nodes[::-1]
+        assert list(a_mem.kw_to_event["patient"]) == nodes[::-1]
+
+    def test_summarized_latest_events(self, a_mem):
+        add_events(a_mem, 10)
+        assert a_mem.get_summarized_latest_events(3) == {
+            ("Patient 9", "is", "waiting"), ("Patient 8", "is", "waiting"),
+            ("Patient 7", "is", "waiting")}
+
+    def test_last_chat(self, a_mem):
+        for i in range(3):
+            a_mem.add_chat(START, None, "Nurse", "chat with", "Doctor",
+                           f"chat {i}", ["doctor"], 1,
+                           (f"chat {i}", [0.0, 1.0]), [])
+        assert a_mem.get_last_chat("Doctor").description == "chat 2"
+        assert a_mem.seq_chat[-1].description == "chat 0"
+
+    def test_save_and_reload_keeps_order(self, a_mem, tmp_path):
+        add_events(a_mem, 4)
+        a_mem.add_thought(START, None, "Nurse", "is", "busy",
+                          "Nurse is busy", ["nurse"], 3,
+                          ("Nurse is busy", [0.5, 0.5]), None)
+        saved = tmp_path / "saved"
+        saved.mkdir()
+        a_mem.save(str(saved))
+        reloaded = AssociativeMemory(str(saved))
+        assert ([node.node_id for node in reloaded.seq_event]
+                == [node.node_id for node in a_mem.seq_event])
+        assert ([node.node_id for node in reloaded.seq_thought]
+                == ["node_5"])
+
+
+class TestNodeLog:
+    def test_save_appends_only_new_nodes(self, a_mem, tmp_path):
+        saved = tmp_path / "saved"
+        saved.mkdir()
+        add_events(a_mem, 3)
+        a_mem.save(str(saved))
+        first = (saved / "nodes.jsonl").read_text()
+        assert len(first.splitlines()) == 3
+
+        reloaded = AssociativeMemory(str(saved))
+        reloaded.add_thought(START, None, "Nurse", "is", "busy",
+                             "Nurse is busy", ["nurse"], 3,
+                             ("Nurse is busy", [0.5, 0.5]), None)
+        reloaded.save(str(saved))
+        text = (saved / "nodes.jsonl").read_text()
+        assert text.startswith(first)
+        assert json.loads(text.splitlines()[-1])["node_id"] == "node_4"
+
+    def test_legacy_nodes_json_is_converted(self, a_mem, tmp_path):
+        node = add_events(a_mem, 1)[0]
+        legacy = tmp_path / "a_mem"
+        (legacy / "nodes.json").write_text(json.dumps({"node_1": {
+            "node_count": 1, "type_count": 1, "type": "event", "depth": 0,
+            "created": "2024-01-01 08:00:00",
+            "expiration": "2024-01-02 08:00:00",
+            "subject": "Patient 0", "predicate": "is", "object": "waiting",
+            "description": "Patient 0 is waiting",
+            "embedding_key": node.embedding_key, "poignancy": 1,
+            "keywords": ["patient"], "filling": None}}))
+        (legacy / "embeddings.json").write_text(json.dumps(
+            {node.embedding_key: [1.0, 0.0]}))
+        loaded = AssociativeMemory(str(legacy))
+        assert loaded.id_to_node["node_1"].expiration == datetime.datetime(
+            2024, 1, 2, 8, 0, 0)
+        loaded.save(str(legacy))
+        assert not (legacy / "nodes.json").exists()
+        assert len(AssociativeMemory(str(legacy)).id_to_node) == 1
+
+    def test_cut_short_line_is_dropped_and_compacted(self, a_mem, tmp_path):
+        saved = tmp_path / "saved"
+        saved.mkdir()
+        add_events(a_mem, 2)
+        a_mem.save(str(saved))
+        with open(saved / "nodes.jsonl", "a") as f:
+            f.write('{"node_id": "node_3", "node_co')
+        reloaded = AssociativeMemory(str(saved))
+        assert len(reloaded.id_to_node) == 2
+        add_events(reloaded, 1)
+        reloaded.save(str(saved))
+        lines = (saved / "nodes.jsonl").read_text().splitlines()
+        assert [json.loads(line)["node_id"] for line in lines] == [
+            "node_1", "node_2", "node_3"]
+
+    def test_save_elsewhere_writes_every_node(self, a_mem, tmp_path):
+        first, second = tmp_path / "first", tmp_path / "second"
+        first.mkdir()
+        second.mkdir()
+        add_events(a_mem, 2)
+        a_mem.save(str(first))
+        add_events(a_mem, 1)
+        a_mem.save(str(second))
+        assert len((second / "nodes.jsonl").read_text().splitlines()) == 3
+        assert len((first / "nodes.jsonl").read_text().splitlines()) == 2
+
+
+def add_idle(a_mem, subject, minute):
+    description = f"{subject} is idle"
+    return a_mem.add_event(START + datetime.timedelta(minutes=minute), None,
+                           subject, "is", "idle", description,
+                           [subject.lower()], 1, (description, [0.0, 1.0]),
+                           None)
+
+
+class TestForget:
+    def test_merges_older_idle_repeats(self, a_mem):
+        for minute in range(6):
+            add_idle(a_mem, "Patient 1", minute)
+            add_idle(a_mem, "Patient 2", minute)
+        latest = [node.node_id for node in a_mem.seq_event[:3]]
+
+        assert a_mem.forget(START, keep_recent=3) == 7
+        ids = [node.node_id for node in a_mem.seq_event]
+        assert ids[:3] == latest
+        assert len(ids) == 5
+        assert sum(node.count for node in a_mem.seq_event) == 12
+        # Patient 1's two latest observations: one recent, one merged.
+        assert len(a_mem.kw_to_event["patient 1"]) == 2
+        assert len(a_mem.id_to_node) == 5
+
+    def test_interrupted_idle_run_is_kept_separate(self, a_mem):
+        morning = [add_idle(a_mem, "Patient 1", minute) for minute in range(2)]
+        a_mem.add_event(START + datetime.timedelta(minutes=2), None,
+                        "Patient 1", "is", "waiting", "Patient 1 is waiting",
+                        ["patient 1"], 1, ("Patient 1 is waiting", [1.0, 0.0]),
+                        None)
+        add_idle(a_mem, "Patient 2", 3)
+        afternoon = [add_idle(a_mem, "Patient 1", minute)
+                     for minute in range(4, 6)]
+
+        assert a_mem.forget(START, keep_recent=0) == 2
+        kept = [node for node in a_mem.seq_event if node.subject == "Patient 1"]
+        assert kept[0] is afternoon[-1] and kept[0].count == 2
+        assert kept[1].predicate == "is" and kept[1].object == "waiting"
+        assert kept[2] is morning[-1] and kept[2].count == 2
+
+    def test_drops_expired_nodes(self, a_mem):
+        kept = add_events(a_mem, 2, keywords=("patient", "bed"))
+        expired = a_mem.add_thought(START, START, "Nurse", "is", "busy",
+                                    "Nurse is busy", ["nurse", "bed"], 3,
+                                    ("Nurse is busy", [0.5, 0.5]), None)
+        assert a_mem.kw_strength_thought == {"nurse": 1, "bed": 1}
+
+        assert a_mem.forget(START, keep_recent=100) == 1
+        assert expired.node_id not in a_mem.id_to_node
+        assert list(a_mem.seq_thought) == []
+        assert "nurse" not in a_mem.kw_to_thought
+        assert a_mem.kw_strength_thought == {}
+        assert list(a_mem.kw_to_event["bed"]) == kept[::-1]
+        assert "Nurse is busy" not in a_mem.embeddings
+        assert a_mem.retrieval_index.nodes == kept
+
+    def test_ids_are_not_reused(self, a_mem):
+        add_idle(a_mem, "Patient 1", 0)
+        add_idle(a_mem, "Patient 1", 1)
+        a_mem.forget(START, keep_recent=0)
+        node = add_events(a_mem, 1)[0]
+        assert node.node_id == "node_3"
+        assert node.type_count == 3
+
+    def test_save_after_forget_compacts_log(self, a_mem, tmp_path):
+        saved = tmp_path / "saved"
+        saved.mkdir()
+        for minute in range(4):
+            add_idle(a_mem, "Patient 1", minute)
+        a_mem.save(str(saved))
+        a_mem.forget(START, keep_recent=1)
+        a_mem.save(str(saved))
+        add_events(a_mem, 1)
+        a_mem.save(str(saved))
+
+        reloaded = AssociativeMemory(str(saved))
+        assert list(reloaded.id_to_node) == ["node_3", "node_4", "node_5"]
+        assert [node.count for node in reloaded.id_to_node.values()] == [
+            3, 1, 1]
+        assert add_events(reloaded, 1)[0].node_id == "node_6"
+
+    def test_keeps_nodes_thoughts_are_drawn_from(self, a_mem, tmp_path):
+        expired_event = a_mem.add_event(
+            START, START, "Patient 1", "is", "waiting", "Patient 1 is waiting",
+            ["patient 1"], 1, ("Patient 1 is waiting", [1.0, 0.0]), None)
+        idle = [add_idle(a_mem, "Patient 2", minute) for minute in range(3)]
+        # Expired too, but still the filling of <thought>.
+        base = a_mem.add_thought(
+            START, START, "Nurse", "saw", "Patient 1", "Nurse saw Patient 1",
+            ["nurse"], 2, ("Nurse saw Patient 1", [0.5, 0.5]),
+            [expired_event.node_id, idle[0].node_id])
+        thought = a_mem.add_thought(
+            START, None, "Nurse", "plans", "round", "Nurse plans a round",
+            ["round"], 2, ("Nurse plans a round", [0.5, 0.5]),
+            [base.node_id])
+        assert thought.depth == 2
+
+        assert a_mem.forget(START, keep_recent=0) == 1
+        assert base.node_id in a_mem.id_to_node
+        assert expired_event.node_id in a_mem.id_to_node
+        assert idle[0].node_id in a_mem.id_to_node
+        assert idle[1].node_id not in a_mem.id_to_node
+        assert idle[2].count == 2
+
+        saved = tmp_path / "saved"
+        saved.mkdir()
+        a_mem.save(str(saved))
+        reloaded = AssociativeMemory(str(saved))
+        assert reloaded.id_to_node[thought.node_id].depth == 2
+        assert all(node_id in reloaded.id_to_node
+                   for node in reloaded.seq_thought
+                   for node_id in node.filling)
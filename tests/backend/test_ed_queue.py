@@ -0,0 +1,119 @@
+import json
+import random
+
+import pytest
+
+from ed_queue import EDQueue
+from maze import Maze
+
+
+class TestEDQueue:
+    def test_lowest_priority_first(self):
+        queue = EDQueue()
+        for priority, name in [(3, "Patient 1"), (1, "Patient 2"),
+                               (2, "Patient 3")]:
+            queue.push(priority, name)
+        assert queue.peek() == (1, "Patient 2")
+        assert [queue.pop()[1] for _ in range(3)] == [
+            "Patient 2", "Patient 3", "Patient 1"]
+        assert not queue
+
+    def test_ties_are_fifo(self):
+        queue = EDQueue()
+        for name in ["Patient 9", "Patient 1", "Patient 5"]:
+            queue.push(2, name)
+        assert [name for _, name in queue] == [
+            "Patient 9", "Patient 1", "Patient 5"]
+
+    def test_contains_and_remove(self):
+        queue = EDQueue([[1, "Patient 1"], [2, "Patient 2"]])
+        assert "Patient 1" in queue and len(queue) == 2
+        assert queue.remove("Patient 1")
+        assert not queue.remove("Patient 1")
+        assert "Patient 1" not in queue
+        assert queue.pop() == (2, "Patient 2")
+        with pytest.raises(IndexError):
+            queue.pop()
+
+    def test_update_keeps_arrival_order(self):
+        queue = EDQueue([[1, "Patient 1"], [3, "Patient 2"],
+                         [3, "Patient 3"]])
+        queue.update("Patient 3", 1)
+        assert queue.to_list() == [[1, "Patient 1"], [1, "Patient 3"],
+                                   [3, "Patient 2"]]
+        queue.update("Patient 1", 5)
+        assert queue.priority("Patient 1") == 5
+        assert queue.peek() == (1, "Patient 3")
+
+    def test_push_requeues_a_queued_name(self):
+        queue = EDQueue([[2, "Patient 1"], [2, "Patient 2"]])
+        queue.push(2, "Patient 1")
+        assert queue.to_list() == [[2, "Patient 2"], [2, "Patient 1"]]
+
+    def test_reprioritize(self):
+        queue = EDQueue([[2, "Patient 1"], [6, "Patient 2"],
+                         [1, "Patient 3"]])
+        queue.reprioritize(lambda priority: max(1, priority - 2))
+        assert queue.to_list() == [[1, "Patient 1"], [1, "Patient 3"],
+                                   [4, "Patient 2"]]
+
+    def test_iteration_is_a_snapshot(self):
+        queue = EDQueue([[1, "Patient 1"], [2, "Patient 2"]])
+        for _, name in queue:
+            queue.remove(name)
+        assert len(queue) == 0
+
+    def test_matches_sorted_list(self):
+        # Reference: [priority, arrival, name] lists, sorted after each change.
+        rng = random.Random(0)
+        queue, reference = EDQueue(), []
+        for arrival in range(2000):
+            name = f"Patient {rng.randrange(40)}"
+            action = rng.random()
+            queued = [entry for entry in reference if entry[2] == name]
+            if action < 0.4 and not queued:
+                priority = rng.randrange(1, 6)
+                queue.push(priority, name)
+                reference.append([priority, arrival, name])
+            elif action < 0.6 and queued:
+                assert queue.remove(name)
+                reference.remove(queued[0])
+            elif action < 0.8 and queued:
+                queued[0][0] = rng.randrange(1, 6)
+                queue.update(name, queued[0][0])
+            elif reference:
+                reference.sort()
+                priority, _, name = reference.pop(0)
+                assert queue.pop() == (priority, name)
+            reference.sort()
+            assert queue.to_list() == [[priority, name]
+                                       for priority, _, name in reference]
+
+    def test_json_round_trip(self):
+        queue = EDQueue([[3, "Patient 1"], [3, "Patient 2"], [1, "Patient 3"]])
+        loaded = EDQueue(json.loads(json.dumps(queue.to_list())))
+        assert loaded.to_list() == queue.to_list()
+
+
+class TestMazeQueues:
+    def test_queues_saved_as_lists(self, ed_maze, tmp_path):
+        assert isinstance(ed_maze.patients_waiting_for_doctor, EDQueue)
+        assert isinstance(ed_maze.injuries_zones["assessment_queue"], EDQueue)
+        ed_maze.patients_waiting_for_doctor.push(4, "Patient 1")
+        ed_maze.injuries_zones["pager"].push(1, "Patient 2")
+        out = tmp_path / "maze_status.json"
+        ed_maze.save(str(out))
+        saved = json.loads(out.read_text())
+        assert saved["patients_waiting_for_doctor"] == [[4, "Patient 1"]]
+        assert saved["injuries_zones"]["pager"] == [[1, "Patient 2"]]
+        assert saved["injuries_zones"]["bedside_nurse_waiting"] == []
+
+    def test_saved_queues_are_loaded(self, ed_maze, tmp_path):
+        fork = tmp_path / "fork2"
+        (fork / "reverie").mkdir(parents=True)
+        ed_maze.injuries_zones["bedside_nurse_waiting"].push(2, "Patient 3")
+        ed_maze.injuries_zones["bedside_nurse_waiting"].push(2, "Patient 1")
+        ed_maze.save(str(fork / "reverie" / "maze_status.json"))
+        loaded = Maze("small_ed_layout", str(fork), str(tmp_path / "sim"), 0)
+        assert loaded.injuries_zones["bedside_nurse_waiting"].to_list() == [
+            [2, "Patient 3"], [2, "Patient 1"]]
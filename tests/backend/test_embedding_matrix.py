@@ -0,0 +1,151 @@
+import json
+import os
+
+import numpy as np
+import pytest
+
+from persona.memory_structures.embedding_matrix import EmbeddingMatrix
+from persona.memory_structures.associative_memory import AssociativeMemory
+
+
+def write_a_mem(folder, embeddings):
+    """Writes an associative memory with one event per embedding."""
+    os.makedirs(folder, exist_ok=True)
+    nodes = {}
+    for count, key in enumerate(embeddings, start=1):
+        nodes[f"node_{count}"] = {
+            "node_count": count, "type_count": count, "type": "event",
+            "depth": 0, "created": "2024-01-01 08:00:00", "expiration": None,
+            "subject": "Patient 1", "predicate": "is", "object": "idle",
+            "description": key, "embedding_key": key, "poignancy": 1,
+            "keywords": ["patient 1"], "filling": None}
+    with open(f"{folder}/nodes.json", "w") as f:
+        json.dump(nodes, f)
+    with open(f"{folder}/kw_strength.json", "w") as f:
+        json.dump({"kw_strength_event": {}, "kw_strength_thought": {}}, f)
+    with open(f"{folder}/embeddings.json", "w") as f:
+        json.dump(embeddings, f)
+
+
+@pytest.fixture
+def matrix_folder(tmp_path):
+    return str(tmp_path / "embeddings")
+
+
+@pytest.fixture
+def shared_matrix(matrix_folder, monkeypatch):
+    matrix = EmbeddingMatrix(matrix_folder)
+    monkeypatch.setattr(AssociativeMemory, "embedding_matrix", matrix)
+    return matrix
+
+
+class TestEmbeddingMatrix:
+    def test_add_and_get(self, matrix_folder):
+        matrix = EmbeddingMatrix(matrix_folder)
+        assert matrix.add("a", [1.0, 0.0]) == 0
+        assert matrix.add("b", [0.0, 1.0]) == 1
+        assert "a" in matrix and "c" not in matrix
+        np.testing.assert_array_equal(matrix["b"], [0.0, 1.0])
+        assert matrix["a"].dtype == np.float32
+        assert list(matrix) == ["a", "b"]
+
+    def test_text_is_stored_once(self, matrix_folder):
+        matrix = EmbeddingMatrix(matrix_folder)
+        matrix["Patient 12 is idle"] = [1.0, 2.0]
+        matrix["Patient 12 is idle"] = [3.0, 4.0]
+        assert len(matrix) == 1
+        np.testing.assert_array_equal(matrix["Patient 12 is idle"], [1.0, 2.0])
+
+    def test_wrong_dimension(self, matrix_folder):
+        matrix = EmbeddingMatrix(matrix_folder)
+        matrix.add("a", [1.0, 0.0])
+        with pytest.raises(ValueError):
+            matrix.add("b", [1.0, 0.0, 0.0])
+
+    def test_grows_past_initial_capacity(self, matrix_folder):
+        matrix = EmbeddingMatrix(matrix_folder)
+        first = matrix.add("t0", [0.0, 0.5])
+        for i in range(1, 200):
+            matrix.add(f"t{i}", [float(i), 0.5])
+        assert matrix.matrix.shape == (200, 2)
+        np.testing.assert_array_equal(matrix.matrix[:, 0], np.arange(200))
+        np.testing.assert_array_equal(matrix["t0"], [0.0, 0.5])
+        assert first == 0
+
+    def test_reopen_after_save(self, matrix_folder):
+        matrix = EmbeddingMatrix(matrix_folder)
+        for i in range(70):
+            matrix.add(f"t{i}", [float(i), -float(i), 1.0])
+        matrix.save()
+        reopened = EmbeddingMatrix(matrix_folder)
+        assert len(reopened) == 70 and reopened.dim == 3
+        np.testing.assert_array_equal(reopened["t69"], [69.0, -69.0, 1.0])
+        reopened.add("new", [0.0, 0.0, 0.0])
+        assert reopened.rows["new"] == 70
+
+    def test_unsaved_rows_are_not_reloaded(self, matrix_folder):
+        matrix = EmbeddingMatrix(matrix_folder)
+        matrix.add("kept", [1.0])
+        matrix.save()
+        matrix.add("lost", [2.0])
+        reopened = EmbeddingMatrix(matrix_folder)
+        assert list(reopened) == ["kept"]
+
+    def test_save_appends_only_new_texts(self, matrix_folder):
+        matrix = EmbeddingMatrix(matrix_folder)
+        matrix.add("a", [1.0])
+        matrix.save()
+        matrix.save()
+        matrix.add("b", [2.0])
+        matrix.save()
+        with open(f"{matrix_folder}/index.jsonl") as f:
+            assert f.read().splitlines() == ['"a"', '"b"']
+
+    def test_import_json_reads_file_once(self, matrix_folder, tmp_path):
+        f_embeddings = tmp_path / "embeddings.json"
+        f_embeddings.write_text(json.dumps({"a": [1.0], "b": [2.0]}))
+        matrix = EmbeddingMatrix(matrix_folder)
+        matrix.import_json(str(f_embeddings))
+        f_embeddings.write_text("not json any more")
+        matrix.import_json(str(f_embeddings))
+        assert list(matrix) == ["a", "b"]
+
+
+class TestAssociativeMemoryWithMatrix:
+    def test_template_embeddings_are_shared(self, shared_matrix, tmp_path):
+        template = str(tmp_path / "template")
+        write_a_mem(template, {"Patient 1 is idle": [0.25, 0.5]})
+        first = AssociativeMemory(template)
+        second = AssociativeMemory(template)
+        assert first.embeddings is second.embeddings is shared_matrix
+        assert len(shared_matrix) == 1
+        node = first.id_to_node["node_1"]
+        np.testing.assert_array_equal(first.embeddings[node.embedding_key],
+                                      [0.25, 0.5])
+
+    def test_save_and_reload_without_json(self, shared_matrix, matrix_folder,
+                                          tmp_path, monkeypatch):
+        saved = str(tmp_path / "saved")
+        write_a_mem(saved, {"Patient 1 is idle": [0.25, 0.5]})
+        a_mem = AssociativeMemory(saved)
+        a_mem.add_event(a_mem.id_to_node["node_1"].created, None,
+                        "Patient 1", "is", "waiting", "Patient 1 is waiting",
+                        set(), 2, ("Patient 1 is waiting", [0.5, 0.75]), None)
+        a_mem.save(saved)
+        assert not os.path.exists(f"{saved}/embeddings.json")
+
+        monkeypatch.setattr(AssociativeMemory, "embedding_matrix",
+                            EmbeddingMatrix(matrix_folder))
+        reloaded = AssociativeMemory(saved)
+        assert len(reloaded.id_to_node) == 2
+        np.testing.assert_array_equal(
+            reloaded.embeddings["Patient 1 is waiting"], [0.5, 0.75])
+
+    def test_without_matrix_uses_json(self, tmp_path):
+        saved = str(tmp_path / "saved")
+        write_a_mem(saved, {"Patient 1 is idle": [0.25, 0.5]})
+        a_mem = AssociativeMemory(saved)
+        assert a_mem.embeddings == {"Patient 1 is idle": [0.25, 0.5]}
+        a_mem.save(saved)
+        with open(f"{saved}/embeddings.json") as f:
+            assert json.load(f) == {"Patient 1 is idle": [0.25, 0.5]}
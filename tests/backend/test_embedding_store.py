@@ -0,0 +1,64 @@
+import pytest
+
+from persona.prompt_template.embedding_store import (EmbeddingStore,
+                                                     normalize_embedding_text)
+
+
+@pytest.fixture
+def store_path(tmp_path):
+    return str(tmp_path / "store" / "embeddings.sqlite3")
+
+
+class TestNormalize:
+    def test_newlines_become_spaces(self):
+        assert normalize_embedding_text("a\nb") == "a b"
+
+    def test_blank_text_gets_placeholder(self):
+        assert normalize_embedding_text("") == "this is blank"
+
+
+class TestEmbeddingStore:
+    def test_round_trip_is_exact(self):
+        store = EmbeddingStore()
+        vector = [0.1, -0.2, 1e-9, 0.30000000000000004]
+        store.put_many("ada", {"Patient 12 is idle": vector})
+        assert store.get("ada", "Patient 12 is idle") == vector
+
+    def test_missing_text(self):
+        store = EmbeddingStore()
+        assert store.get("ada", "nothing") is None
+        assert store.stats()["misses"] == 1
+
+    def test_keyed_by_model(self):
+        store = EmbeddingStore()
+        store.put_many("ada", {"x": [1.0]})
+        store.put_many("large", {"x": [2.0]})
+        assert store.get("ada", "x") == [1.0]
+        assert store.get("large", "x") == [2.0]
+        assert len(store) == 2
+
+    def test_keyed_by_normalized_text(self):
+        store = EmbeddingStore()
+        store.put_many("ada", {"line one\nline two": [1.0]})
+        assert store.get("ada", "line one line two") == [1.0]
+
+    def test_get_many_returns_only_found(self):
+        store = EmbeddingStore()
+        store.put_many("ada", {"a": [1.0], "b": [2.0]})
+        found = store.get_many("ada", ["a", "b", "c", "a"])
+        assert found == {"a": [1.0], "b": [2.0]}
+        stats = store.stats()
+        assert (stats["hits"], stats["misses"]) == (2, 1)
+
+    def test_get_many_handles_large_requests(self):
+        store = EmbeddingStore()
+        store.put_many("ada", {f"t{i}": [float(i)] for i in range(1200)})
+        found = store.get_many("ada", [f"t{i}" for i in range(1200)])
+        assert len(found) == 1200 and found["t999"] == [999.0]
+
+    def test_shared_across_instances(self, store_path):
+        first = EmbeddingStore(store_path)
+        first.put_many("ada", {"Patient 3 is idle": [0.5, 0.25]})
+        first.close()
+        second = EmbeddingStore(store_path)
+        assert second.get("ada", "Patient 3 is idle") == [0.5, 0.25]
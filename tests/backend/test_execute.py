@@ -0,0 +1,28 @@
+import types
+
+from persona.cognitive_modules.execute import plan_target_reached
+
+
+def persona_at(tile, act_address):
+    return types.SimpleNamespace(scratch=types.SimpleNamespace(
+        curr_tile=tile, act_address=act_address))
+
+
+MAZE = types.SimpleNamespace(tiles=[
+    [{"arena": "waiting room"}, {"arena": "waiting room"}],
+    [{"arena": "major injuries zone"}, {"arena": "major injuries zone"}],
+])
+
+
+class TestPlanTargetReached:
+    def test_tile_plan(self):
+        persona = persona_at([1, 0], "<tile> (1, 0)")
+        assert plan_target_reached(persona, MAZE, "<tile> (1, 0)")
+        assert not plan_target_reached(persona, MAZE, "<tile> (0, 1)")
+
+    def test_address_plan(self):
+        address = "ed map:emergency department:major injuries zone:bed"
+        assert plan_target_reached(persona_at([0, 1], address), MAZE,
+                                   address)
+        assert not plan_target_reached(persona_at([0, 0], address), MAZE,
+                                       address)
@@ -0,0 +1,211 @@
+import asyncio
+import importlib
+import json
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from persona.prompt_template.llm_async import TokenBucket, AsyncRequestRunner
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestTokenBucket:
+    def test_burst_up_to_capacity_is_free(self):
+        bucket = TokenBucket(rate=2, capacity=3, clock=FakeClock())
+        assert [bucket.reserve() for _ in range(3)] == [0.0, 0.0, 0.0]
+
+    def test_waits_queue_up_at_the_rate(self):
+        bucket = TokenBucket(rate=2, capacity=1, clock=FakeClock())
+        assert bucket.reserve() == 0.0
+        assert bucket.reserve() == pytest.approx(0.5)
+        assert bucket.reserve() == pytest.approx(1.0)
+
+    def test_tokens_refill_over_time(self):
+        clock = FakeClock()
+        bucket = TokenBucket(rate=4, capacity=1, clock=clock)
+        bucket.reserve()
+        clock.now += 0.25
+        assert bucket.reserve() == 0.0
+
+    def test_zero_rate_is_unlimited(self):
+        bucket = TokenBucket(rate=0)
+        assert all(bucket.reserve() == 0.0 for _ in range(100))
+
+    def test_async_acquire_waits(self):
+        bucket = TokenBucket(rate=50, capacity=1)
+
+        async def take_three():
+            start = time.monotonic()
+            for _ in range(3):
+                await bucket.acquire_async()
+            return time.monotonic() - start
+        assert asyncio.run(take_three()) >= 0.035
+
+
+class TestAsyncRequestRunner:
+    def test_run_returns_result(self):
+        runner = AsyncRequestRunner()
+
+        async def add(a, b):
+            await asyncio.sleep(0)
+            return a + b
+        assert runner.run(add(2, 3)) == 5
+        runner.close()
+
+    def test_run_raises_coroutine_error(self):
+        runner = AsyncRequestRunner()
+
+        async def fail():
+            raise ValueError("bad request")
+        with pytest.raises(ValueError):
+            runner.run(fail())
+        runner.close()
+
+    def test_in_flight_is_bounded(self):
+        runner = AsyncRequestRunner(max_in_flight=3)
+        counts = {"now": 0, "max": 0}
+
+        async def request():
+            counts["now"] += 1
+            counts["max"] = max(counts["max"], counts["now"])
+            await asyncio.sleep(0.01)
+            counts["now"] -= 1
+        futures = [runner.submit(request()) for _ in range(12)]
+        for future in futures:
+            future.result(timeout=5)
+        assert counts["max"] == 3
+        runner.close()
+
+    def test_callable_from_many_threads(self):
+        runner = AsyncRequestRunner(max_in_flight=4)
+
+        async def echo(x):
+            await asyncio.sleep(0.001)
+            return x
+        results = [None] * 8
+        def worker(i):
+            results[i] = runner.run(echo(i))
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert results == list(range(8))
+        runner.close()
+
+
+class FakeOpenAIHandler(BaseHTTPRequestHandler):
+    """Answers /chat/completions and /embeddings like the OpenAI API."""
+    # Keep-alive, so that clients can reuse their connections.
+    protocol_version = "HTTP/1.1"
+    lock = threading.Lock()
+    in_flight = 0
+    max_in_flight = 0
+    # Client (host, port) of every connection a request came in on.
+    connections = set()
+
+    def do_POST(self):
+        cls = type(self)
+        with cls.lock:
+            cls.in_flight += 1
+            cls.max_in_flight = max(cls.max_in_flight, cls.in_flight)
+            cls.connections.add(self.client_address)
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        time.sleep(0.02)
+        usage = {"prompt_tokens": 3, "completion_tokens": 2, "total_tokens": 5}
+        if self.path.endswith("/embeddings"):
+            payload = {"object": "list", "model": body["model"], "usage": usage,
+                       "data": [{"object": "embedding", "index": i,
+                                 "embedding": [float(len(text)), 0.5]}
+                                for i, text in enumerate(body["input"])]}
+        else:
+            content = "echo: " + body["messages"][-1]["content"]
+            payload = {"id": "chatcmpl-1", "object": "chat.completion",
+                       "created": 0, "model": body["model"], "usage": usage,
+                       "choices": [{"index": 0, "finish_reason": "stop",
+                                    "message": {"role": "assistant",
+                                                "content": content}}]}
+        data = json.dumps(payload).encode()
+        with cls.lock:
+            cls.in_flight -= 1
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def fake_openai():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeOpenAIHandler)
+    server.daemon_threads = True
+    FakeOpenAIHandler.in_flight = FakeOpenAIHandler.max_in_flight = 0
+    FakeOpenAIHandler.connections = set()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}/v1"
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def gpt_structure(fake_openai, tmp_path, monkeypatch):
+    """gpt_structure, imported afresh to talk to the fake server."""
+    pytest.importorskip("openai")
+    for name, value in [("OPENAI_CLIENT", "openai"), ("OPENAI_MODEL", "fake"),
+                        ("OPENAI_KEY", "test"),
+                        ("OPENAI_ENDPOINT", fake_openai),
+                        ("EMBEDDINGS_CLIENT", "openai"),
+                        ("EMBEDDINGS_MODEL", "fake-embedding"),
+                        ("EMBEDDINGS_KEY", "test"),
+                        ("EMBEDDINGS_ENDPOINT", fake_openai),
+                        ("OPENAI_MAX_IN_FLIGHT", "2"),
+                        ("OPENAI_REQUESTS_PER_SECOND", "0"),
+                        ("LLM_CACHE_MODE", "off"),
+                        ("EMBEDDING_STORE_PATH",
+                         str(tmp_path / "embeddings.sqlite3"))]:
+        monkeypatch.setenv(name, value)
+    # The cost logger writes its logs under the working directory.
+    monkeypatch.chdir(tmp_path)
+    name = "persona.prompt_template.gpt_structure"
+    sys.modules.pop(name, None)
+    module = importlib.import_module(name)
+    yield module
+    module.request_runner.close()
+    sys.modules.pop(name, None)
+
+
+class TestAgainstFakeServer:
+    def test_sync_shim_shares_a_bounded_pool(self, gpt_structure):
+        results = [None] * 8
+
+        def ask(i):
+            results[i] = gpt_structure.ChatGPT_request(f"p{i}")
+        threads = [threading.Thread(target=ask, args=(i,)) for i in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert results == [f"echo: p{i}" for i in range(8)]
+        # OPENAI_MAX_IN_FLIGHT requests at a time, no more...
+        assert FakeOpenAIHandler.max_in_flight == 2
+        # ...over the endpoint's pooled keep-alive connections.
+        assert len(FakeOpenAIHandler.connections) <= 2
+
+        assert gpt_structure.get_embeddings(["hello", "hi"]) == [
+            [5.0, 0.5], [2.0, 0.5]]
+        # The embeddings client shares the endpoint's connections.
+        assert len(FakeOpenAIHandler.connections) <= 2
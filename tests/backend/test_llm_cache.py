@@ -0,0 +1,119 @@
+from types import SimpleNamespace
+
+import pytest
+
+from persona.prompt_template.llm_cache import LLMCache, CacheMiss, cache_key
+
+
+class StubClient:
+    """Stands in for an OpenAI client; answers with a numbered reply."""
+    def __init__(self):
+        self.calls = 0
+        self.chat = SimpleNamespace(
+            completions=SimpleNamespace(create=self.create))
+
+    def create(self, model, messages, **params):
+        self.calls += 1
+        content = f"reply {self.calls} to {messages[-1]['content']}"
+        return SimpleNamespace(choices=[
+            SimpleNamespace(message=SimpleNamespace(content=content))])
+
+
+def ask(cache, client, prompt, params=None, cache_slot=0):
+    messages = [{"role": "user", "content": prompt}]
+    params = params or {}
+
+    def call():
+        response = client.chat.completions.create(
+            model="stub", messages=messages, **params)
+        return response.choices[0].message.content
+    return cache.fetch("stub", messages, params, call, cache_slot)
+
+
+@pytest.fixture
+def cache_path(tmp_path):
+    return str(tmp_path / "llm" / "cache.sqlite3")
+
+
+class TestCacheKey:
+    def test_key_is_stable(self):
+        messages = [{"role": "user", "content": "hi"}]
+        assert cache_key("m", messages, {"temperature": 0, "top_p": 1}) == \
+            cache_key("m", messages, {"top_p": 1, "temperature": 0})
+
+    def test_key_covers_model_params_and_slot(self):
+        messages = [{"role": "user", "content": "hi"}]
+        base = cache_key("m", messages, {"temperature": 0})
+        assert base != cache_key("other", messages, {"temperature": 0})
+        assert base != cache_key("m", messages, {"temperature": 1})
+        assert base != cache_key("m", messages, {"temperature": 0}, 1)
+
+
+class TestLLMCache:
+    def test_off_mode_always_calls(self):
+        cache = LLMCache()
+        client = StubClient()
+        assert ask(cache, client, "hi") == ("reply 1 to hi", False)
+        assert ask(cache, client, "hi") == ("reply 2 to hi", False)
+        assert cache.stats()["hits"] == 0
+
+    def test_repeated_prompt_is_served_from_cache(self, cache_path):
+        cache = LLMCache(cache_path, mode="readwrite")
+        client = StubClient()
+        assert ask(cache, client, "hi") == ("reply 1 to hi", False)
+        assert ask(cache, client, "hi") == ("reply 1 to hi", True)
+        assert client.calls == 1
+        stats = cache.stats()
+        assert (stats["hits"], stats["misses"], stats["size"]) == (1, 1, 1)
+        assert stats["hit_rate"] == 0.5
+
+    def test_sampling_params_are_part_of_key(self, cache_path):
+        cache = LLMCache(cache_path, mode="readwrite")
+        client = StubClient()
+        ask(cache, client, "hi", {"temperature": 0})
+        ask(cache, client, "hi", {"temperature": 1})
+        ask(cache, client, "hi", cache_slot=1)
+        assert client.calls == 3
+
+    def test_cache_persists_across_instances(self, cache_path):
+        client = StubClient()
+        first = LLMCache(cache_path, mode="readwrite")
+        ask(first, client, "hi")
+        first.close()
+        second = LLMCache(cache_path, mode="readwrite")
+        assert ask(second, client, "hi") == ("reply 1 to hi", True)
+        assert second.stats()["size"] == 1
+
+    def test_least_recently_used_is_evicted(self, cache_path):
+        cache = LLMCache(cache_path, max_entries=2, mode="readwrite")
+        client = StubClient()
+        ask(cache, client, "a")
+        ask(cache, client, "b")
+        ask(cache, client, "a")
+        ask(cache, client, "c")
+        assert cache.stats()["size"] == 2
+        assert cache.stats()["evictions"] == 1
+        assert ask(cache, client, "a")[1] is True
+        assert ask(cache, client, "b")[1] is False
+
+    def test_failed_call_is_not_cached(self, cache_path):
+        cache = LLMCache(cache_path, mode="readwrite")
+
+        def failing():
+            raise RuntimeError("server_error")
+        with pytest.raises(RuntimeError):
+            cache.fetch("stub", [], {}, failing)
+        assert cache.stats()["size"] == 0
+
+    def test_replay_mode_raises_on_miss(self, cache_path):
+        client = StubClient()
+        ask(LLMCache(cache_path, mode="readwrite"), client, "hi")
+        replay = LLMCache(cache_path, mode="replay")
+        assert ask(replay, client, "hi") == ("reply 1 to hi", True)
+        with pytest.raises(CacheMiss):
+            ask(replay, client, "something new")
+        assert client.calls == 1
+
+    def test_invalid_mode(self, cache_path):
+        with pytest.raises(ValueError):
+            LLMCache(cache_path, mode="sometimes")
@@ -0,0 +1,105 @@
+from path_finder import path_finder
+
+
+EXIT = "ed map:emergency department:exit"
+
+
+class TestTiles:
+    def test_default_object_events(self, ed_maze):
+        chair = sorted(ed_maze.address_tiles[
+            "ed map:emergency department:triage room:chair"])[0]
+        tile = ed_maze.access_tile(chair)
+        assert tile["game_object"] == "chair"
+        assert ("ed map:emergency department:triage room:chair",
+                None, None, None) in tile["events"]
+
+    def test_subject_events_removed(self, ed_maze):
+        event = ("Patient 1", "is", "waiting", "waiting")
+        ed_maze.add_event_from_tile(event, (5, 5))
+        assert event in ed_maze.tiles[5][5]["events"]
+        ed_maze.remove_subject_events_from_tile("Patient 1", (5, 5))
+        assert event not in ed_maze.access_tile((5, 5))["events"]
+
+    def test_event_turned_idle(self, ed_maze):
+        event = ("Doctor 1", "is", "charting", "charting")
+        ed_maze.add_event_from_tile(event, (5, 5))
+        ed_maze.turn_event_from_tile_idle(event, (5, 5))
+        assert ed_maze.access_tile((5, 5))["events"] == {("Doctor 1", None, None, None)}
+
+
+class TestNearbyEvents:
+    def test_matches_tile_scan(self, ed_maze):
+        ed_maze.add_event_from_tile(("Patient 1", "is", "waiting", "waiting"), (5, 5))
+        tile = (6, 5)
+        arena = ed_maze.get_tile_path(tile, "arena")
+        expected = set()
+        for t in ed_maze.get_nearby_tiles(tile, 4):
+            if ed_maze.get_tile_path(t, "arena") == arena:
+                expected |= set(ed_maze.access_tile(t)["events"])
+        found = ed_maze.get_nearby_events(tile, 4)
+        assert set(e for _, e in found) == expected
+        assert len(found) == len(expected)
+
+    def test_distance_is_reported(self, ed_maze):
+        ed_maze.add_event_from_tile(("Patient 1", "is", "waiting", "waiting"), (5, 5))
+        found = dict((e, d) for d, e in ed_maze.get_nearby_events((2, 5), 4))
+        assert found[("Patient 1", "is", "waiting", "waiting")] == 3.0
+
+    def test_other_arena_is_not_seen(self, ed_maze):
+        # (5, 5) is in the diagnostic room, (5, 8) in the waiting room.
+        ed_maze.add_event_from_tile(("Patient 1", "is", "waiting", "waiting"), (5, 5))
+        found = [e for _, e in ed_maze.get_nearby_events((5, 8), 4)]
+        assert ("Patient 1", "is", "waiting", "waiting") not in found
+
+
+class TestVectorizedPerception:
+    def test_places_match_tile_scan(self, ed_maze):
+        expected = []
+        for t in ed_maze.get_nearby_tiles((6, 5), 4):
+            tile = ed_maze.access_tile(t)
+            place = (tile["sector"], tile["arena"], tile["game_object"])
+            if place not in expected:
+                expected.append(place)
+        assert ed_maze.get_nearby_places((6, 5), 4) == expected
+
+    def test_nearest_events_match_full_sort(self, ed_maze):
+        for i, tile in enumerate([(2, 5), (3, 5), (4, 6), (5, 5), (3, 4)]):
+            ed_maze.add_event_from_tile((f"Patient {i}", "is", "waiting", "w"), tile)
+        nearby = ed_maze.get_nearby_events((4, 5), 4)
+        for k in (1, 2, 3, len(nearby) + 1):
+            expected = [e for _, e in sorted(nearby, key=lambda x: x[0])[:k]]
+            assert ed_maze.get_nearest_events((4, 5), 4, k) == expected
+
+    def test_zero_bandwidth(self, ed_maze):
+        assert ed_maze.get_nearest_events((4, 5), 4, 0) == []
+
+
+class TestFlowFieldCache:
+    def test_field_is_reused(self, ed_maze):
+        targets = ed_maze.address_tiles[EXIT]
+        assert ed_maze.get_flow_field(targets) is ed_maze.get_flow_field(list(targets))
+
+    def test_field_path_is_shortest(self, ed_maze):
+        exit_tile = sorted(ed_maze.address_tiles[EXIT])[0]
+        start = sorted(ed_maze.address_tiles[
+            "ed map:emergency department:triage room:chair"])[0]
+        field_path = ed_maze.get_flow_field([exit_tile]).path_from(start)
+        searched = path_finder(ed_maze.walkable_grid, start, exit_tile, 0)
+        assert field_path[0] == start
+        assert field_path[-1] == exit_tile
+        assert len(field_path) == len(searched)
+
+    def test_cache_is_bounded(self, ed_maze):
+        ed_maze.FLOW_FIELD_CACHE_SIZE = 2
+        for tile in [(2, 19), (3, 19), (2, 19), (1, 1)]:
+            ed_maze.get_flow_field([tile])
+        assert len(ed_maze._flow_fields) == 2
+
+
+class TestPathCache:
+    def test_repeated_query_hits_cache(self, ed_maze):
+        exit_tiles = ed_maze.address_tiles[EXIT]
+        first = ed_maze.find_path((5, 5), exit_tiles)
+        second = ed_maze.find_path((5, 5), exit_tiles)
+        assert first == second
+        assert ed_maze.path_cache.stats()["hits"] == 1
@@ -1,6 +1,10 @@
 import copy
 import pytest
-from path_finder import path_finder, closest_coordinate
+import numpy as np
+from path_finder import (path_finder, path_finder_v2, path_finder_bfs,
+                         build_walkable_grid, closest_coordinate, FlowField,
+                         path_finder_nearest, path_finder_meet_halfway,
+                         PathCache)
 
 
 class TestPathFinder:
@@ -44,6 +48,141 @@ class TestPathFinder:
             assert 0 <= c < cols
 
 
+class TestPathFinderBFS:
+    def test_walkable_grid_marks_open_tiles(self, simple_maze):
+        grid = build_walkable_grid(simple_maze)
+        assert grid.dtype == np.bool_
+        assert grid.shape == (5, 5)
+        assert grid[1][1]
+        assert not grid[2][2]
+
+    def test_accepts_prebuilt_grid(self, simple_maze):
+        grid = build_walkable_grid(simple_maze)
+        assert path_finder(grid, (1, 1), (3, 3), 1) == \
+            path_finder(simple_maze, (1, 1), (3, 3), 1)
+
+    def test_matches_flood_fill(self):
+        # The BFS backtrack uses the same neighbour order as path_finder_v2,
+        # so both engines must agree tile-for-tile on random mazes.
+        rng = np.random.default_rng(7)
+        for _ in range(30):
+            maze = (rng.random((12, 15)) < 0.25).astype(int).tolist()
+            maze[0][0] = 0
+            goal = (11, 14)
+            maze[goal[0]][goal[1]] = 0
+            grid = build_walkable_grid(maze)
+            expected = path_finder_v2(copy.deepcopy(maze), (0, 0), goal, 1)
+            if expected == [goal]:
+                # No path: the flood fill returned the goal, BFS stays put.
+                expected = [(0, 0)]
+            assert path_finder_bfs(grid, (0, 0), goal) == expected
+
+    def test_path_is_shortest(self, simple_maze):
+        path = path_finder(simple_maze, (1, 1), (3, 3), 1)
+        # Manhattan distance 4 around the centre pillar -> 5 tiles.
+        assert len(path) == 5
+
+    def test_unreachable_returns_start_only(self, capsys):
+        grid = build_walkable_grid([[0, 1, 0]])
+        assert path_finder_bfs(grid, (0, 0), (0, 2)) == [(0, 0)]
+        assert capsys.readouterr().out == ""
+        assert path_finder_bfs(grid, (0, 0), (0, 2), verbose=True) == [(0, 0)]
+        assert "No path possible!" in capsys.readouterr().out
+
+
+class TestFlowField:
+    def test_path_matches_bfs_length(self, simple_maze):
+        grid = build_walkable_grid(simple_maze)
+        field = FlowField(grid, [(3, 3)])
+        path = field.path_from((1, 1))
+        assert path[0] == (1, 1)
+        assert path[-1] == (3, 3)
+        assert len(path) == len(path_finder(simple_maze, (1, 1), (3, 3), 1))
+
+    def test_nearest_goal_is_chosen(self, simple_maze):
+        grid = build_walkable_grid(simple_maze)
+        field = FlowField(grid, [(3, 3), (2, 1)])
+        assert field.path_from((1, 1)) == [(1, 1), (2, 1)]
+        assert field.distance((1, 1)) == 1
+
+    def test_start_on_goal(self, simple_maze):
+        field = FlowField(build_walkable_grid(simple_maze), [(1, 1)])
+        assert field.path_from((1, 1)) == [(1, 1)]
+        assert field.distance((1, 1)) == 0
+
+    def test_unreachable_goal_stays_put(self):
+        grid = build_walkable_grid([[0, 1, 0]])
+        field = FlowField(grid, [(2, 0)])
+        assert field.path_from((0, 0)) == [(0, 0)]
+        assert field.distance((0, 0)) is None
+
+    def test_steps_are_adjacent(self):
+        rng = np.random.default_rng(3)
+        maze = (rng.random((15, 15)) < 0.2).astype(int).tolist()
+        maze[14][14] = 0
+        field = FlowField(build_walkable_grid(maze), [(14, 14)])
+        path = field.path_from((0, 0))
+        for (x1, y1), (x2, y2) in zip(path, path[1:]):
+            assert abs(x1 - x2) + abs(y1 - y2) == 1
+
+
+class TestMultiTarget:
+    def test_nearest_target_is_chosen(self, simple_maze):
+        path = path_finder_nearest(simple_maze, (1, 1), [(3, 3), (1, 3)], 1)
+        assert path == [(1, 1), (1, 2), (1, 3)]
+
+    def test_single_target_matches_path_finder(self, simple_maze):
+        assert path_finder_nearest(simple_maze, (1, 1), [(3, 3)], 1) == \
+            path_finder(simple_maze, (1, 1), (3, 3), 1)
+
+    def test_start_among_targets(self, simple_maze):
+        assert path_finder_nearest(simple_maze, (1, 1), [(1, 1), (3, 3)], 1) == [(1, 1)]
+
+    def test_unreachable_targets_stay_put(self):
+        maze = [[0, 1, 0]]
+        assert path_finder_nearest(maze, (0, 0), [(2, 0)], 1) == [(0, 0)]
+
+    def test_meet_halfway_stops_mid_path(self):
+        maze = [[0] * 7]
+        path = path_finder_meet_halfway(maze, (0, 0), (6, 0), 1)
+        assert path == [(0, 0), (1, 0), (2, 0), (3, 0)]
+
+    def test_meet_halfway_adjacent_goes_to_end(self):
+        maze = [[0] * 2]
+        assert path_finder_meet_halfway(maze, (0, 0), (1, 0), 1) == [(0, 0), (1, 0)]
+
+
+class TestPathCache:
+    def test_hit_and_miss_counters(self):
+        cache = PathCache()
+        assert cache.get("k") is None
+        cache.put("k", [(0, 0), (0, 1)])
+        assert cache.get("k") == [(0, 0), (0, 1)]
+        assert cache.stats()["hits"] == 1
+        assert cache.stats()["misses"] == 1
+
+    def test_returned_path_is_a_copy(self):
+        cache = PathCache()
+        cache.put("k", [(0, 0), (0, 1)])
+        cache.get("k").append((9, 9))
+        assert cache.get("k") == [(0, 0), (0, 1)]
+
+    def test_least_recently_used_is_evicted(self):
+        cache = PathCache(maxsize=2)
+        cache.put("a", [(0, 0)])
+        cache.put("b", [(1, 1)])
+        cache.get("a")
+        cache.put("c", [(2, 2)])
+        assert cache.get("b") is None
+        assert cache.get("a") == [(0, 0)]
+
+    def test_disabled_cache_stores_nothing(self):
+        cache = PathCache(enabled=False)
+        cache.put("k", [(0, 0)])
+        assert cache.get("k") is None
+        assert cache.stats()["size"] == 0
+
+
 class TestClosestCoordinate:
     def test_nearest_of_two(self):
         result = closest_coordinate((0, 0), [(1, 1), (5, 5)])
@@ -0,0 +1,197 @@
+import datetime
+import types
+
+from persona.memory_structures.scratch_types.patient_scratch import \
+    patient_scratch
+from persona_registry import PersonaRegistry
+from sim_clock import SimScheduler
+
+
+START = datetime.datetime(2024, 1, 1, 8, 0, 0)
+
+
+def patient(name, state="WAITING_FOR_TRIAGE", departure_at=None):
+    scratch = patient_scratch("/nonexistent/scratch.json")
+    scratch.state = state
+    if departure_at is not None:
+        scratch.exempt_from_data_collection = True
+        scratch.preload_departure_at = departure_at
+    return types.SimpleNamespace(name=name, role="Patient", scratch=scratch)
+
+
+def staff(name, role):
+    return types.SimpleNamespace(name=name, role=role,
+                                 scratch=types.SimpleNamespace())
+
+
+def names(personas):
+    return [persona.name for persona in personas]
+
+
+class TestPersonaRegistry:
+    def test_is_the_personas_dict(self):
+        personas = PersonaRegistry()
+        personas["Doctor 1"] = staff("Doctor 1", "Doctor")
+        personas["Patient 1"] = patient("Patient 1")
+        assert list(personas) == ["Doctor 1", "Patient 1"]
+        assert personas.pop("Patient 1").name == "Patient 1"
+        assert personas.pop("Patient 1", None) is None
+        assert list(personas) == ["Doctor 1"]
+
+    def test_roles(self):
+        personas = PersonaRegistry()
+        for name, role in [("Doctor 1", "Doctor"), ("Triage Nurse 1",
+                           "TriageNurse"), ("Doctor 2", "Doctor")]:
+            personas[name] = staff(name, role)
+        assert names(personas.with_role("Doctor")) == ["Doctor 1", "Doctor 2"]
+        del personas["Doctor 1"]
+        assert names(personas.with_role("Doctor")) == ["Doctor 2"]
+        assert personas.with_role("Patient") == []
+
+    def test_state_changes_move_patients(self):
+        personas = PersonaRegistry()
+        for i in range(3):
+            personas[f"Patient {i}"] = patient(f"Patient {i}")
+        personas["Patient 2"].scratch.state = "TRIAGE"
+        personas["Patient 0"].scratch.state = "TRIAGE"
+        assert names(personas.in_states("TRIAGE")) == ["Patient 0",
+                                                       "Patient 2"]
+        assert names(personas.in_states("WAITING_FOR_TRIAGE", "LEAVING")) == [
+            "Patient 1"]
+        assert personas.state_counts() == {"WAITING_FOR_TRIAGE": 1,
+                                           "TRIAGE": 2}
+
+    def test_removed_patient_is_unhooked(self):
+        personas = PersonaRegistry()
+        removed = patient("Patient 1")
+        personas["Patient 1"] = removed
+        personas.pop("Patient 1")
+        removed.scratch.state = "LEAVING"
+        assert personas.in_states("LEAVING") == []
+        assert personas.state_counts() == {}
+
+    def test_deadlines_are_scheduled(self):
+        scheduler = SimScheduler()
+        personas = PersonaRegistry(scheduler)
+        departed = []
+        personas.on_deadline("preload_departure_at",
+                             lambda persona, when: departed.append(
+                                 (persona.name, when)))
+        early = START + datetime.timedelta(minutes=10)
+        personas["Patient 1"] = patient(
+            "Patient 1", departure_at=START + datetime.timedelta(minutes=30))
+        personas["Patient 2"] = patient("Patient 2", departure_at=early)
+        personas["Patient 3"] = patient("Patient 3")
+        # No handler waits on it: not scheduled.
+        personas["Patient 3"].scratch.testing_end_time = early
+        assert len(scheduler) == 2
+
+        assert scheduler.run_due(START) == 0
+        assert scheduler.run_due(START + datetime.timedelta(minutes=45)) == 2
+        assert departed == [("Patient 2", early), (
+            "Patient 1", START + datetime.timedelta(minutes=30))]
+
+    def test_handler_schedules_deadlines_already_set(self):
+        scheduler = SimScheduler()
+        personas = PersonaRegistry(scheduler)
+        personas["Patient 1"] = patient("Patient 1")
+        personas["Patient 1"].scratch.testing_end_time = START
+        assert len(scheduler) == 0
+        reached = []
+        personas.on_deadline("testing_end_time",
+                             lambda persona, when: reached.append(persona.name))
+        assert scheduler.when(("Patient 1", "testing_end_time")) == START
+        assert scheduler.run_due(START) == 1
+        assert reached == ["Patient 1"]
+
+    def test_deadline_changes_reschedule(self):
+        scheduler = SimScheduler()
+        personas = PersonaRegistry(scheduler)
+        for deadline in ["time_to_next", "chatting_end_time"]:
+            personas.on_deadline(deadline, lambda persona, when: None)
+        personas["Patient 1"] = patient("Patient 1")
+        scratch = personas["Patient 1"].scratch
+        scratch.time_to_next = START
+        scratch.time_to_next = START + datetime.timedelta(hours=1)
+        assert scheduler.when(("Patient 1", "time_to_next")) == scratch.time_to_next
+        scratch.time_to_next = None
+        assert len(scheduler) == 0
+
+        scratch.exit_ready_at = START
+        assert len(scheduler) == 0
+        scratch.chatting_end_time = START
+        assert len(scheduler) == 1
+        personas.pop("Patient 1")
+        assert len(scheduler) == 0
+        scratch.chatting_end_time = START + datetime.timedelta(minutes=5)
+        assert len(scheduler) == 0
+
+    def test_dormant_patients_are_left_out(self):
+        personas = PersonaRegistry()
+        for i in range(4):
+            personas[f"Patient {i}"] = patient(f"Patient {i}")
+        personas["Doctor 1"] = staff("Doctor 1", "Doctor")
+        personas.sleep("Patient 3")
+        personas.sleep("Patient 1")
+        assert list(personas.dormant) == ["Patient 3", "Patient 1"]
+        assert [name for name, _ in personas.awake()] == [
+            "Patient 0", "Patient 2", "Doctor 1"]
+
+        # Only wake() brings a patient back, whatever changes it.
+        personas["Patient 1"].scratch.state = "WAITING_FOR_DOCTOR"
+        assert "Patient 1" in personas.dormant
+        personas.wake("Patient 1")
+        personas.wake("Patient 3")
+        personas.wake("Patient 2")
+        assert personas.dormant == {}
+        assert [name for name, _ in personas.awake()] == list(personas)
+
+    def test_woken_patient_reads_the_sim_time(self):
+        scheduler = SimScheduler()
+        personas = PersonaRegistry(scheduler)
+        personas["Patient 1"] = patient("Patient 1")
+        scratch = personas["Patient 1"].scratch
+        scratch.curr_time = START
+        personas.sleep("Patient 1")
+        scheduler.run_due(START + datetime.timedelta(minutes=20))
+        assert scratch.curr_time == START
+        personas.wake("Patient 1")
+        assert scratch.curr_time == START + datetime.timedelta(minutes=20)
+
+    def test_woken_during_a_pass_joins_it_in_order(self):
+        personas = PersonaRegistry()
+        for i in range(4):
+            personas[f"Patient {i}"] = patient(f"Patient {i}")
+            if i % 2 == 0:
+                personas.sleep(f"Patient {i}")
+        seen = []
+        for name, persona in personas.awake():
+            seen.append(name)
+            if name == "Patient 1":
+                # One it has got past waits for the next pass.
+                personas.wake("Patient 0")
+                personas.wake("Patient 2")
+                personas.sleep(name)
+        assert seen == ["Patient 1", "Patient 2", "Patient 3"]
+        assert [name for name, _ in personas.awake()] == [
+            "Patient 0", "Patient 2", "Patient 3"]
+
+    def test_removed_patient_is_not_dormant(self):
+        personas = PersonaRegistry(SimScheduler())
+        personas["Patient 1"] = patient("Patient 1")
+        personas.sleep("Patient 1")
+        personas.pop("Patient 1")
+        assert personas.dormant == {}
+        personas.wake("Patient 1")
+        assert list(personas.awake()) == []
+
+    def test_removing_a_doctor_wakes_its_patients(self):
+        personas = PersonaRegistry()
+        personas["Doctor 1"] = staff("Doctor 1", "Doctor")
+        for i in range(2):
+            personas[f"Patient {i}"] = patient(f"Patient {i}")
+        personas["Patient 0"].scratch.assigned_doctor = "Doctor 1"
+        for i in range(2):
+            personas.sleep(f"Patient {i}")
+        personas.pop("Doctor 1")
+        assert list(personas.dormant) == ["Patient 1"]
@@ -0,0 +1,188 @@
+import datetime
+import json
+import random
+import types
+
+import numpy as np
+import pytest
+
+from persona.memory_structures.associative_memory import AssociativeMemory
+from persona.memory_structures.embedding_matrix import EmbeddingMatrix
+from persona.memory_structures.retrieval_index import top_indices
+
+
+START = datetime.datetime(2024, 1, 1, 8, 0, 0)
+
+
+def reference_retrieve(a_mem, scratch, focal_embeddings, n_count):
+    """new_retrieve as it was before the retrieval index."""
+    def normalize(d):
+        min_val, max_val = min(d.values()), max(d.values())
+        range_val = max_val - min_val
+        if range_val == 0:
+            return {key: 0.5 for key in d}
+        return {key: (val - min_val) * 1 / range_val + 0
+                for key, val in d.items()}
+
+    retrieved = []
+    for focal_embedding in focal_embeddings:
+        nodes = [[i.last_accessed, i]
+                 for i in a_mem.seq_event + a_mem.seq_thought
+                 if "idle" not in i.embedding_key]
+        nodes = [i for _, i in sorted(nodes, key=lambda x: x[0])]
+        recency = normalize({node.node_id: scratch.recency_decay ** (c + 1)
+                             for c, node in enumerate(nodes)})
+        importance = normalize({node.node_id: node.poignancy
+                                for node in nodes})
+        relevance = dict()
+        for node in nodes:
+            a = a_mem.embeddings[node.embedding_key]
+            relevance[node.node_id] = (
+                np.dot(a, focal_embedding)
+                / (np.linalg.norm(a) * np.linalg.norm(focal_embedding)))
+        relevance = normalize(relevance)
+        master = {key: (scratch.recency_w * recency[key] * 0.5
+                        + scratch.relevance_w * relevance[key] * 3
+                        + scratch.importance_w * importance[key] * 2)
+                  for key in recency}
+        top = sorted(master.items(), key=lambda item: item[1],
+                     reverse=True)[:n_count]
+        master_nodes = [a_mem.id_to_node[key] for key, _ in top]
+        for node in master_nodes:
+            node.last_accessed = scratch.curr_time
+        retrieved += [[node.node_id for node in master_nodes]]
+    return retrieved
+
+
+def indexed_retrieve(a_mem, scratch, focal_embeddings, n_count):
+    """new_retrieve, minus the embedding requests and prints."""
+    retrieved = []
+    for focal_embedding in focal_embeddings:
+        index = a_mem.retrieval_index
+        master_nodes = index.rank(a_mem.embeddings, focal_embedding,
+                                  scratch.recency_decay, scratch.recency_w,
+                                  scratch.relevance_w, scratch.importance_w,
+                                  n_count)
+        index.touch(master_nodes, scratch.curr_time)
+        retrieved += [[node.node_id for node in master_nodes]]
+    return retrieved
+
+
+def empty_a_mem(folder):
+    folder.mkdir()
+    (folder / "nodes.json").write_text("{}")
+    (folder / "kw_strength.json").write_text(json.dumps(
+        {"kw_strength_event": {}, "kw_strength_thought": {}}))
+    (folder / "embeddings.json").write_text("{}")
+    return AssociativeMemory(str(folder))
+
+
+def fill(a_mem, rng, n_nodes, dim=6):
+    """Adds random events and thoughts, with repeated texts and scores."""
+    texts = [f"Patient {i} is waiting" for i in range(n_nodes // 3)]
+    texts += ["Patient 0 is idle"]
+    vectors = {text: [rng.uniform(-1, 1) for _ in range(dim)]
+               for text in texts}
+    for i in range(n_nodes):
+        text = rng.choice(texts)
+        created = START + datetime.timedelta(minutes=rng.randrange(5))
+        add = a_mem.add_event if rng.random() < 0.7 else a_mem.add_thought
+        add(created, None, "Patient", "is", "waiting", text, ["patient"],
+            rng.randint(1, 4), (text, vectors[text]), None)
+    return [rng.uniform(-1, 1) for _ in range(dim)]
+
+
+def twin_memories(tmp_path, rng_seed, n_nodes, with_matrix, monkeypatch):
+    memories = []
+    for name in ("reference", "indexed"):
+        if with_matrix:
+            monkeypatch.setattr(AssociativeMemory, "embedding_matrix",
+                                EmbeddingMatrix(str(tmp_path / f"{name}_m")))
+        a_mem = empty_a_mem(tmp_path / name)
+        focal = fill(a_mem, random.Random(rng_seed), n_nodes)
+        memories += [a_mem]
+    return memories, focal
+
+
+def scratch(curr_time, recency_decay=0.99, weights=(1, 1, 1)):
+    return types.SimpleNamespace(
+        curr_time=curr_time, recency_decay=recency_decay,
+        recency_w=weights[0], relevance_w=weights[1],
+        importance_w=weights[2])
+
+
+class TestTopIndices:
+    def test_highest_first(self):
+        scores = np.array([0.1, 0.9, 0.5, 0.7])
+        assert top_indices(scores, 2).tolist() == [1, 3]
+
+    def test_ties_keep_index_order(self):
+        scores = np.array([1.0, 2.0, 1.0, 2.0, 1.0, 1.0])
+        assert top_indices(scores, 4).tolist() == [1, 3, 0, 2]
+
+    def test_more_than_available(self):
+        assert top_indices(np.array([0.2, 0.4]), 30).tolist() == [1, 0]
+
+    def test_matches_stable_sort(self):
+        rng = np.random.default_rng(3)
+        for _ in range(50):
+            scores = rng.integers(0, 5, size=40).astype(float)
+            k = int(rng.integers(1, 45))
+            expected = sorted(range(40), key=lambda i: scores[i],
+                              reverse=True)[:k]
+            assert top_indices(scores, k).tolist() == expected
+
+
+class TestRetrievalIndex:
+    @pytest.mark.parametrize("with_matrix", [False, True])
+    @pytest.mark.parametrize("seed", range(5))
+    def test_same_ranking_as_dict_scoring(self, tmp_path, monkeypatch,
+                                          seed, with_matrix):
+        (reference, indexed), focal = twin_memories(
+            tmp_path, seed, 120, with_matrix, monkeypatch)
+        rng = random.Random(seed)
+        focals = [focal] + [[rng.uniform(-1, 1) for _ in focal]
+                            for _ in range(3)]
+        for step in range(4):
+            s = scratch(START + datetime.timedelta(minutes=10 + step),
+                        weights=(1, rng.choice([1, 2]), 1))
+            n_count = rng.choice([1, 7, 30, 500])
+            assert (indexed_retrieve(indexed, s, focals, n_count)
+                    == reference_retrieve(reference, s, focals, n_count))
+
+    def test_all_scores_tied(self, tmp_path):
+        a_mem = empty_a_mem(tmp_path / "a_mem")
+        for _ in range(5):
+            a_mem.add_event(START, None, "Patient", "is", "waiting",
+                            "Patient 1 is waiting", ["patient"], 3,
+                            ("Patient 1 is waiting", [1.0, 0.0]), None)
+        # Equal scores: newest event first (the order of seq_event).
+        ranked = a_mem.retrieval_index.rank(
+            a_mem.embeddings, [1.0, 0.0], 0.99, 0, 1, 1, 3)
+        assert [node.node_id for node in ranked] == [
+            "node_5", "node_4", "node_3"]
+
+    def test_idle_nodes_are_skipped(self, tmp_path):
+        a_mem = empty_a_mem(tmp_path / "a_mem")
+        a_mem.add_event(START, None, "Patient", "is", "idle",
+                        "Patient 1 is idle", ["patient"], 1,
+                        ("Patient 1 is idle", [1.0, 0.0]), None)
+        ranked = a_mem.retrieval_index.rank(
+            a_mem.embeddings, [1.0, 0.0], 0.99, 1, 1, 1, 30)
+        assert ranked == []
+
+    def test_chats_are_not_indexed(self, tmp_path):
+        a_mem = empty_a_mem(tmp_path / "a_mem")
+        a_mem.add_chat(START, None, "Nurse", "chat with", "Doctor",
+                       "conversing about a patient", ["nurse"], 1,
+                       ("conversing about a patient", [1.0, 0.0]), [])
+        assert a_mem.retrieval_index.nodes == []
+
+    def test_touch_updates_node(self, tmp_path):
+        a_mem = empty_a_mem(tmp_path / "a_mem")
+        node = a_mem.add_thought(START, None, "Nurse", "is", "tired",
+                                 "Nurse is tired", ["nurse"], 5,
+                                 ("Nurse is tired", [0.0, 1.0]), None)
+        later = START + datetime.timedelta(hours=1)
+        a_mem.retrieval_index.touch([node], later)
+        assert node.last_accessed == later
@@ -0,0 +1,174 @@
+import asyncio
+import random
+from types import SimpleNamespace
+
+import pytest
+
+from persona.prompt_template.retry_policy import (RetryPolicy, CircuitOpenError,
+                                                  is_retryable, retry_after)
+
+
+class APIError(Exception):
+    def __init__(self, status_code, headers=None):
+        super().__init__(f"status {status_code}")
+        self.status_code = status_code
+        self.response = SimpleNamespace(headers=headers or {})
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def flaky(errors, result="ok"):
+    """Returns a callable raising each of <errors> in turn, then succeeding."""
+    errors = list(errors)
+    calls = []
+
+    def fn():
+        calls.append(1)
+        if errors:
+            raise errors.pop(0)
+        return result
+    fn.calls = calls
+    return fn
+
+
+def fast_policy(**kwargs):
+    kwargs.setdefault("base_delay", 0.001)
+    kwargs.setdefault("max_delay", 0.002)
+    kwargs.setdefault("rng", random.Random(0))
+    return RetryPolicy(**kwargs)
+
+
+class TestClassification:
+    def test_retryable_errors(self):
+        assert is_retryable(APIError(429))
+        assert is_retryable(APIError(503))
+        assert is_retryable(Exception("The server is overloaded"))
+        assert not is_retryable(APIError(400))
+        assert not is_retryable(ValueError("bad json"))
+
+    def test_retry_after_seconds(self):
+        assert retry_after(APIError(429, {"retry-after": "2"})) == 2.0
+
+    def test_retry_after_ms_takes_precedence(self):
+        headers = {"retry-after-ms": "250", "retry-after": "2"}
+        assert retry_after(APIError(429, headers)) == 0.25
+
+    def test_retry_after_http_date(self):
+        headers = {"retry-after": "Wed, 21 Oct 2015 07:28:05 GMT"}
+        wait = retry_after(APIError(429, headers), now=1445412480.0)
+        assert wait == pytest.approx(5.0)
+
+    def test_no_retry_after(self):
+        assert retry_after(APIError(429)) is None
+        assert retry_after(ValueError()) is None
+
+
+class TestBackoff:
+    def test_first_delay_is_sub_second(self):
+        policy = RetryPolicy(rng=random.Random(1))
+        assert 0.5 <= policy.next_delay(policy.base_delay) <= 1.5
+
+    def test_delays_stay_within_decorrelated_bounds(self):
+        policy = RetryPolicy(base_delay=0.5, max_delay=20, rng=random.Random(2))
+        delay = policy.base_delay
+        for _ in range(50):
+            new_delay = policy.next_delay(delay)
+            assert policy.base_delay <= new_delay <= min(20, delay * 3)
+            delay = new_delay
+
+    def test_retry_after_overrides_backoff_up_to_cap(self):
+        policy = RetryPolicy(max_delay=10)
+        assert policy.next_delay(0.5, APIError(429, {"retry-after": "3"})) == 3
+        assert policy.next_delay(0.5, APIError(429, {"retry-after": "99"})) == 10
+
+
+class TestRetries:
+    def test_transient_errors_are_retried(self):
+        policy = fast_policy()
+        fn = flaky([APIError(429), APIError(500)])
+        assert policy.call(fn) == "ok"
+        stats = policy.stats()
+        assert (stats["requests"], stats["retries"], stats["failures"]) == (1, 2, 0)
+        assert stats["time_waited"] > 0
+
+    def test_other_errors_are_raised_at_once(self):
+        policy = fast_policy()
+        fn = flaky([APIError(400)])
+        with pytest.raises(APIError):
+            policy.call(fn)
+        assert len(fn.calls) == 1
+        assert policy.stats()["failures"] == 1
+
+    def test_gives_up_after_max_attempts(self):
+        policy = fast_policy(max_attempts=3)
+        fn = flaky([APIError(503)] * 5)
+        with pytest.raises(APIError):
+            policy.call(fn)
+        assert len(fn.calls) == 3
+        assert policy.stats()["retries"] == 2
+
+    def test_async_call(self):
+        policy = fast_policy()
+        errors = [APIError(429)]
+
+        async def attempt():
+            if errors:
+                raise errors.pop()
+            return "ok"
+        assert asyncio.run(policy.call_async(attempt)) == "ok"
+        assert policy.stats()["retries"] == 1
+
+
+class TestCircuitBreaker:
+    def test_opens_after_consecutive_failures(self):
+        clock = FakeClock()
+        policy = fast_policy(max_attempts=2, breaker_threshold=4,
+                             breaker_cooldown=30, clock=clock)
+        for _ in range(2):
+            with pytest.raises(APIError):
+                policy.call(flaky([APIError(503)] * 2))
+        fn = flaky([])
+        with pytest.raises(CircuitOpenError):
+            policy.call(fn)
+        assert fn.calls == []
+        stats = policy.stats()
+        assert stats["breaker_trips"] == 1 and stats["breaker_open"]
+        assert stats["rejected"] == 1
+
+    def test_closes_after_successful_trial(self):
+        clock = FakeClock()
+        policy = fast_policy(max_attempts=1, breaker_threshold=1,
+                             breaker_cooldown=30, clock=clock)
+        with pytest.raises(APIError):
+            policy.call(flaky([APIError(429)]))
+        clock.now += 31
+        assert policy.call(flaky([])) == "ok"
+        assert not policy.stats()["breaker_open"]
+
+    def test_failed_trial_reopens(self):
+        clock = FakeClock()
+        policy = fast_policy(max_attempts=1, breaker_threshold=1,
+                             breaker_cooldown=30, clock=clock)
+        with pytest.raises(APIError):
+            policy.call(flaky([APIError(429)]))
+        clock.now += 31
+        with pytest.raises(APIError):
+            policy.call(flaky([APIError(429)]))
+        with pytest.raises(CircuitOpenError):
+            policy.call(flaky([]))
+        assert policy.stats()["breaker_trips"] == 2
+
+    def test_success_resets_failure_count(self):
+        policy = fast_policy(max_attempts=1, breaker_threshold=2)
+        with pytest.raises(APIError):
+            policy.call(flaky([APIError(429)]))
+        policy.call(flaky([]))
+        with pytest.raises(APIError):
+            policy.call(flaky([APIError(429)]))
+        assert not policy.stats()["breaker_open"]
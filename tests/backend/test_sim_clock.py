@@ -0,0 +1,82 @@
+import datetime
+import types
+
+from sim_clock import Deadline, SimScheduler
+
+
+START = datetime.datetime(2024, 1, 1, 8, 0, 0)
+
+
+def minutes(n):
+    return START + datetime.timedelta(minutes=n)
+
+
+class TestSimScheduler:
+    def test_fires_due_timers_earliest_first(self):
+        scheduler, fired = SimScheduler(), []
+        record = lambda key, when: fired.append(key)
+        scheduler.schedule("b", minutes(5), record)
+        scheduler.schedule("a", minutes(1), record)
+        scheduler.schedule("c", minutes(9), record)
+        assert scheduler.next_time() == minutes(1)
+        assert scheduler.now is None
+        assert scheduler.run_due(minutes(5)) == 2
+        assert fired == ["a", "b"]
+        assert scheduler.now == minutes(5)
+        assert "c" in scheduler and len(scheduler) == 1
+
+    def test_equal_times_fire_in_scheduling_order(self):
+        scheduler, fired = SimScheduler(), []
+        for key in ["z", "y", "x"]:
+            scheduler.schedule(key, START, lambda key, when: fired.append(key))
+        scheduler.run_due(START)
+        assert fired == ["z", "y", "x"]
+
+    def test_reschedule_and_cancel(self):
+        scheduler, fired = SimScheduler(), []
+        record = lambda key, when: fired.append((key, when))
+        scheduler.schedule("a", minutes(1), record)
+        scheduler.schedule("a", minutes(3), record)
+        scheduler.schedule("b", minutes(2), record)
+        assert scheduler.cancel("b") and not scheduler.cancel("b")
+        assert scheduler.when("a") == minutes(3)
+        scheduler.run_due(minutes(10))
+        assert fired == [("a", minutes(3))]
+        assert scheduler.next_time() is None
+
+    def test_callback_can_schedule_due_timer(self):
+        scheduler, fired = SimScheduler(), []
+
+        def chain(key, when):
+            fired.append(key)
+            if key == "first":
+                scheduler.schedule("second", when, chain)
+
+        scheduler.schedule("first", START, chain)
+        assert scheduler.run_due(START) == 2
+        assert fired == ["first", "second"]
+
+
+class Timers:
+    ready_at = Deadline()
+
+    def __init__(self):
+        self.ready_at = None
+
+
+class TestDeadline:
+    def test_notifies_listener(self):
+        timers, calls = Timers(), []
+        timers.ready_at = START
+        timers.deadline_listener = lambda name, when: calls.append((name, when))
+        timers.ready_at = minutes(1)
+        timers.ready_at = None
+        assert calls == [("ready_at", minutes(1)), ("ready_at", None)]
+        assert timers.ready_at is None
+
+    def test_names(self):
+        class MoreTimers(Timers):
+            done_at = Deadline()
+
+        assert sorted(Deadline.names(MoreTimers())) == ["done_at", "ready_at"]
+        assert Deadline.names(types.SimpleNamespace()) == []
@@ -0,0 +1,113 @@
+import json
+
+import pytest
+
+from persona.memory_structures.spatial_memory import MemoryTree, WorldCatalog
+
+
+SAVED_TREE = {
+    "ed map": {
+        "emergency department": {
+            "triage room": ["computer", "chair"],
+            "waiting room": ["waiting room chair", "vending machine"],
+        }
+    }
+}
+
+
+@pytest.fixture
+def saved_tree(tmp_path):
+    path = tmp_path / "spatial_memory.json"
+    path.write_text(json.dumps(SAVED_TREE))
+    return str(path)
+
+
+@pytest.fixture
+def catalog(ed_maze, monkeypatch):
+    cat = WorldCatalog(ed_maze.address_tiles)
+    monkeypatch.setattr(MemoryTree, "catalog", cat)
+    monkeypatch.setattr(MemoryTree, "_overlay_cache", {})
+    return cat
+
+
+class TestExploredTiles:
+    def test_seen_tiles_are_skipped(self, ed_maze):
+        s_mem = MemoryTree("/nonexistent/spatial_memory.json")
+        explored = s_mem.get_explored(ed_maze)
+        assert ed_maze.get_nearby_places((6, 5), 3, explored)
+        assert explored.any()
+        assert ed_maze.get_nearby_places((6, 5), 3, s_mem.get_explored(ed_maze)) == []
+
+    def test_only_new_tiles_are_returned(self, ed_maze):
+        s_mem = MemoryTree("/nonexistent/spatial_memory.json")
+        ed_maze.get_nearby_places((6, 5), 3, s_mem.get_explored(ed_maze))
+        moved = ed_maze.get_nearby_places((7, 5), 3, s_mem.get_explored(ed_maze))
+        full = ed_maze.get_nearby_places((7, 5), 3)
+        assert set(moved) <= set(full)
+
+    def test_tile_change_resets_bitmap(self, ed_maze):
+        s_mem = MemoryTree("/nonexistent/spatial_memory.json")
+        s_mem.get_explored(ed_maze)[:] = True
+        ed_maze.tiles[5][5]["game_object"] = "wheelchair"
+        assert not s_mem.get_explored(ed_maze).any()
+
+    def test_saved_json_is_tree_only(self, ed_maze, tmp_path):
+        s_mem = MemoryTree("/nonexistent/spatial_memory.json")
+        s_mem.tree = {"ed map": {"emergency department": {"triage room": ["chair"]}}}
+        s_mem.get_explored(ed_maze)
+        out = tmp_path / "spatial_memory.json"
+        s_mem.save(str(out))
+        assert json.loads(out.read_text()) == s_mem.tree
+        assert MemoryTree(str(out)).tree == s_mem.tree
+
+
+class TestWorldCatalog:
+    def test_places_from_addresses(self, ed_maze):
+        cat = WorldCatalog(ed_maze.address_tiles)
+        chair = ("ed map", "emergency department", "triage room", "chair")
+        assert chair in cat.node_ids
+        assert cat.node_ids[chair[:3]] in cat.children[chair[:2]]
+
+    def test_spawn_and_bed_addresses_skipped(self, ed_maze):
+        cat = WorldCatalog(ed_maze.address_tiles)
+        assert all(not p[0].startswith("<") for p in cat.paths)
+        assert all(len(p) <= 4 for p in cat.paths)
+
+
+class TestCatalogOverlay:
+    def test_tree_round_trips_in_order(self, catalog, saved_tree):
+        s_mem = MemoryTree(saved_tree)
+        assert s_mem.seen_rank is not None
+        assert json.dumps(s_mem.tree) == json.dumps(SAVED_TREE)
+
+    def test_accessible_strings_match_plain_tree(self, catalog, saved_tree, monkeypatch):
+        overlay = MemoryTree(saved_tree)
+        monkeypatch.setattr(MemoryTree, "catalog", None)
+        plain = MemoryTree(saved_tree)
+        sector = "ed map:emergency department"
+        assert overlay.get_str_accessible_sectors("ed map") == \
+            plain.get_str_accessible_sectors("ed map")
+        assert overlay.get_str_accessible_sector_arenas(sector) == \
+            plain.get_str_accessible_sector_arenas(sector)
+        for arena in ("triage room", "waiting room"):
+            assert overlay.get_str_accessible_arena_game_objects(f"{sector}:{arena}") == \
+                plain.get_str_accessible_arena_game_objects(f"{sector}:{arena}")
+
+    def test_add_place_marks_catalog_node(self, catalog, saved_tree):
+        s_mem = MemoryTree(saved_tree)
+        s_mem.add_place("ed map", "emergency department", "exit", "")
+        assert "exit" in s_mem.get_str_accessible_sector_arenas(
+            "ed map:emergency department")
+        assert s_mem.tree["ed map"]["emergency department"]["exit"] == []
+
+    def test_unknown_arena_is_empty(self, catalog, saved_tree):
+        s_mem = MemoryTree(saved_tree)
+        assert s_mem.get_str_accessible_arena_game_objects(
+            "ed map:emergency department:exit") == ""
+
+    def test_same_template_is_loaded_once(self, catalog, saved_tree):
+        first = MemoryTree(saved_tree)
+        second = MemoryTree(saved_tree)
+        assert len(MemoryTree._overlay_cache) == 1
+        first.add_place("ed map", "emergency department", "exit", "")
+        assert "exit" not in second.tree["ed map"]["emergency department"]
@@ -0,0 +1,82 @@
+import threading
+import time
+
+import pytest
+
+from tick_dispatch import TickDispatcher
+
+
+class TestTickDispatcher:
+    def test_results_keep_item_order(self):
+        dispatcher = TickDispatcher(max_workers=4)
+
+        def slow_square(x):
+            time.sleep(0.01 * (5 - x))
+            return x * x
+        assert dispatcher.map(slow_square, range(5)) == [0, 1, 4, 9, 16]
+        dispatcher.shutdown()
+
+    def test_calls_overlap(self):
+        dispatcher = TickDispatcher(max_workers=4)
+        barrier = threading.Barrier(4, timeout=5)
+
+        # Only completes if all four calls are in flight at the same time.
+        def wait_for_others(x):
+            barrier.wait()
+            return x
+        assert dispatcher.map(wait_for_others, range(4)) == [0, 1, 2, 3]
+        dispatcher.shutdown()
+
+    def test_in_flight_calls_are_bounded(self):
+        dispatcher = TickDispatcher(max_workers=2)
+        lock = threading.Lock()
+        in_flight = [0, 0]
+
+        def track(x):
+            with lock:
+                in_flight[0] += 1
+                in_flight[1] = max(in_flight[1], in_flight[0])
+            time.sleep(0.01)
+            with lock:
+                in_flight[0] -= 1
+            return x
+        dispatcher.map(track, range(8))
+        assert in_flight[1] <= 2
+        dispatcher.shutdown()
+
+    def test_single_worker_runs_inline(self):
+        dispatcher = TickDispatcher(max_workers=1)
+        threads = dispatcher.map(lambda _: threading.current_thread(), range(3))
+        assert all(t is threading.current_thread() for t in threads)
+        assert dispatcher._pool is None
+
+    def test_first_error_is_raised_after_all_calls(self):
+        dispatcher = TickDispatcher(max_workers=3)
+        done = []
+
+        def fail_on_odd(x):
+            if x % 2:
+                raise ValueError(x)
+            done.append(x)
+            return x
+        with pytest.raises(ValueError) as error:
+            dispatcher.map(fail_on_odd, range(5))
+        assert error.value.args == (1,)
+        assert sorted(done) == [0, 2, 4]
+        dispatcher.shutdown()
+
+    def test_requests_run_together_and_apply_in_order(self):
+        dispatcher = TickDispatcher(max_workers=3)
+        barrier = threading.Barrier(3, timeout=5)
+        applied = []
+
+        def request(x):
+            # Only completes if all three runs are in flight at once.
+            def run():
+                time.sleep(0.01 * (3 - x))
+                barrier.wait()
+                return x * x
+            return run, lambda result: applied.append((x, result))
+        dispatcher.run_requests([request(x) for x in range(3)])
+        assert applied == [(0, 0), (1, 1), (2, 4)]
+        dispatcher.shutdown()
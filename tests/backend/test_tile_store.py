@@ -0,0 +1,86 @@
+import pytest
+from tile_store import TileStore, TileView
+
+
+@pytest.fixture
+def store():
+    s = TileStore("ed map", 2, 3)
+    s.load_layer("sector", [[5, 5, 5], [5, 5, 0]], {"5": "emergency department"})
+    s.load_layer("arena", [[7, 7, 8], [7, 0, 0]], {"7": "triage room", "8": "exit"})
+    s.load_layer("game_object", [[9, 0, 0], [0, 0, 0]], {"9": "chair"})
+    return s
+
+
+class TestTileStore:
+    def test_names_are_interned(self, store):
+        assert store.names["arena"] == ["", "triage room", "exit"]
+        assert store.get((2, 0), "arena") == "exit"
+        assert store.get((2, 1), "arena") == ""
+
+    def test_address_levels(self, store):
+        assert store.address((0, 0), "world") == "ed map"
+        assert store.address((0, 0), "arena") == "ed map:emergency department:triage room"
+        assert store.address((0, 0), "game_object") == \
+            "ed map:emergency department:triage room:chair"
+
+    def test_events_are_sparse(self, store):
+        assert store.events_at((1, 1)) == frozenset()
+        store.add_event((1, 1), ("A", "is", "idle", "A is idle"))
+        assert len(store.events) == 1
+        store.discard_event((1, 1), ("A", "is", "idle", "A is idle"))
+        assert store.events == {}
+
+
+class TestEventIndex:
+    def test_subject_tiles(self, store):
+        store.add_event((0, 0), ("A", "is", "sitting", "sitting"))
+        store.add_event((1, 0), ("A", "is", "sitting", "sitting"))
+        assert sorted(store.subject_tiles("A")) == [(0, 0), (1, 0)]
+
+    def test_discard_subject_keeps_other_events(self, store):
+        store.add_event((0, 0), ("A", "is", "sitting", "sitting"))
+        store.add_event((0, 0), ("B", "is", "idle", "idle"))
+        store.discard_subject((0, 0), "A")
+        assert store.events_at((0, 0)) == {("B", "is", "idle", "idle")}
+        assert store.subject_tiles("A") == []
+
+    def test_region_event_tiles_stay_in_arena(self, store):
+        store.add_event((0, 0), ("A", None, None, None))
+        store.add_event((2, 0), ("B", None, None, None))
+        assert store.region_event_tiles((1, 0), 0, 3, 0, 2) == [(0, 0)]
+        assert store.region_event_tiles((2, 0), 0, 3, 0, 2) == [(2, 0)]
+
+    def test_emptied_tile_leaves_region(self, store):
+        store.add_event((0, 0), ("A", None, None, None))
+        store.discard_subject((0, 0), "A")
+        assert store.region_tiles == {}
+        assert store.events == {}
+
+
+class TestTileView:
+    def test_view_matches_old_tile_dict(self, store):
+        view = store[0][0]
+        assert dict(view) == {
+            "world": "ed map",
+            "sector": "emergency department",
+            "arena": "triage room",
+            "game_object": "chair",
+            "spawning_location": "",
+            "collision": False,
+            "events": frozenset(),
+        }
+
+    def test_assignment_writes_through(self, store):
+        view = TileView(store, (0, 0))
+        view["game_object"] = None
+        assert store.get((0, 0), "game_object") is None
+
+    def test_collision_is_read_only(self, store):
+        # Collisions are static; the maze builds its paths on them.
+        with pytest.raises(TypeError):
+            store[0][0]["collision"] = True
+        assert not store.collision[0, 0]
+
+    def test_unknown_key(self, store):
+        with pytest.raises(KeyError):
+            store[0][0]["colour"]
@@ -0,0 +1,146 @@
+import json
+import random
+
+from time_accounts import TimeAccounts
+
+
+STATES = ["WAITING_FOR_TRIAGE", "TRIAGE", "WAITING_FOR_RESULT", None, "LEAVING"]
+AREAS = ["waiting room", "triage room", "", "major injuries zone", "exit"]
+
+
+def empty_bucket():
+    return {"time_spent_area": {}, "time_spent_state": {},
+            "tiles_traveled": 0, "travel_time_minutes": 0,
+            "travel_time_state": {}, "travel_time_area": {}}
+
+
+def reference_step(bucket, state, area, from_tile, to_tile, step, per_tile):
+    # The per-patient dictionary accounting TimeAccounts replaces.
+    bucket["time_spent_area"][area] = (
+        bucket["time_spent_area"][area] + step
+        if area in bucket["time_spent_area"] else step)
+    bucket["time_spent_state"][state] = (
+        bucket["time_spent_state"][state] + step
+        if state in bucket["time_spent_state"] else step)
+    tiles = abs(to_tile[0] - from_tile[0]) + abs(to_tile[1] - from_tile[1])
+    if per_tile > 0 and tiles > 0:
+        minutes = tiles * per_tile
+        bucket["tiles_traveled"] += tiles
+        bucket["travel_time_minutes"] += minutes
+        if state:
+            bucket["travel_time_state"][state] = (
+                bucket["travel_time_state"].get(state, 0) + minutes)
+        if area:
+            bucket["travel_time_area"][area] = (
+                bucket["travel_time_area"].get(area, 0) + minutes)
+
+
+def run(accounts, reference, buckets, rng, steps, step, per_tile):
+    for _ in range(steps):
+        for name in rng.sample(sorted(buckets), rng.randrange(len(buckets))):
+            state, area = rng.choice(STATES), rng.choice(AREAS)
+            from_tile = (rng.randrange(10), rng.randrange(10))
+            to_tile = rng.choice([from_tile, (rng.randrange(10),
+                                              rng.randrange(10))])
+            accounts.record(name, state, area, from_tile)
+            accounts.record_move(name, to_tile)
+            reference_step(reference[name], state, area, from_tile, to_tile,
+                           step, per_tile)
+        accounts.flush()
+
+
+class TestTimeAccounts:
+    def test_matches_dictionary_accounting(self):
+        rng = random.Random(0)
+        step, per_tile = 1 / 6, 0.0125
+        names = [f"Patient {i}" for i in range(40)]
+        accounts = TimeAccounts(step, per_tile)
+        buckets = {name: empty_bucket() for name in names}
+        reference = {name: empty_bucket() for name in names}
+        run(accounts, reference, buckets, rng, 200, step, per_tile)
+        accounts.materialize(buckets)
+        for name in names:
+            assert buckets[name] == reference[name]
+            # Same values and the same key order as the dictionaries.
+            assert json.dumps(buckets[name]) == json.dumps(reference[name])
+
+    def test_resumes_from_saved_entries(self):
+        rng = random.Random(1)
+        step, per_tile = 0.5, 0.02
+        names = [f"Patient {i}" for i in range(10)]
+        accounts = TimeAccounts(step, per_tile)
+        buckets = {name: empty_bucket() for name in names}
+        reference = {name: empty_bucket() for name in names}
+        run(accounts, reference, buckets, rng, 50, step, per_tile)
+        accounts.materialize(buckets)
+
+        # As data_collection.json is reloaded when a simulation resumes.
+        buckets = json.loads(json.dumps(buckets))
+        reference = json.loads(json.dumps(reference))
+        resumed = TimeAccounts(step, per_tile)
+        resumed.load(buckets)
+        run(resumed, reference, buckets, rng, 50, step, per_tile)
+        resumed.materialize(buckets)
+        assert json.dumps(buckets) == json.dumps(reference)
+
+    def test_minutes_include_the_recorded_step(self):
+        accounts = TimeAccounts(0.5)
+        accounts.record("Patient 1", "TRIAGE", "triage room", (0, 0))
+        assert accounts.minutes("Patient 1", "TRIAGE") == 0.5
+        accounts.flush()
+        accounts.record("Patient 1", "TRIAGE", "triage room", (0, 0))
+        assert accounts.minutes("Patient 1", "TRIAGE") == 1.0
+        assert accounts.state_minutes("Patient 1") == {"TRIAGE": 0.5}
+        accounts.flush()
+        assert accounts.state_minutes("Patient 1") == {"TRIAGE": 1.0}
+        assert accounts.minutes("Patient 1", "LEAVING") == 0.0
+        assert accounts.minutes("Patient 2", "TRIAGE") == 0.0
+
+    def test_materializes_only_changed_entries(self):
+        accounts = TimeAccounts(1.0, 0.1)
+        buckets = {"Patient 1": empty_bucket(), "Patient 2": empty_bucket()}
+        accounts.record("Patient 1", "TRIAGE", "triage room", (0, 0))
+        accounts.flush()
+        accounts.materialize(buckets)
+        assert buckets["Patient 1"]["time_spent_state"] == {"TRIAGE": 1.0}
+        # Did not move: the travel figures are left as they were.
+        assert buckets["Patient 1"]["travel_time_minutes"] == 0
+        assert buckets["Patient 2"] == empty_bucket()
+
+        buckets["Patient 1"]["time_spent_state"] = {}
+        accounts.materialize(buckets)
+        assert buckets["Patient 1"]["time_spent_state"] == {}
+        accounts.materialize(buckets, ["Patient 1"])
+        assert buckets["Patient 1"]["time_spent_state"] == {"TRIAGE": 1.0}
+
+    def test_held_patients_are_added_every_flush(self):
+        step, per_tile = 0.5, 0.1
+        accounts = TimeAccounts(step, per_tile)
+        held = {"Patient 1": empty_bucket(), "Patient 2": empty_bucket()}
+        reference = {"Patient 1": empty_bucket(), "Patient 2": empty_bucket()}
+        for name in held:
+            accounts.record(name, "TRIAGE", "triage room", (0, 0))
+            accounts.record_move(name, (0, 1))
+            reference_step(reference[name], "TRIAGE", "triage room", (0, 0),
+                           (0, 1), step, per_tile)
+            # Recorded this step: held from the next one on.
+            accounts.hold(name, "WAITING_FOR_RESULT", "major injuries zone")
+        accounts.flush()
+        for _ in range(3):
+            for name in held:
+                reference_step(reference[name], "WAITING_FOR_RESULT",
+                               "major injuries zone", (0, 1), (0, 1), step,
+                               per_tile)
+            accounts.flush()
+        # Recording a held patient releases it.
+        accounts.record("Patient 2", "LEAVING", "exit", (0, 1))
+        accounts.flush()
+        accounts.flush()
+        reference_step(reference["Patient 1"], "WAITING_FOR_RESULT",
+                       "major injuries zone", (0, 1), (0, 1), step, per_tile)
+        reference_step(reference["Patient 1"], "WAITING_FOR_RESULT",
+                       "major injuries zone", (0, 1), (0, 1), step, per_tile)
+        reference_step(reference["Patient 2"], "LEAVING", "exit", (0, 1),
+                       (0, 1), step, per_tile)
+        accounts.materialize(held)
+        assert json.dumps(held) == json.dumps(reference)
@@ -1,3 +1,5 @@
+import json
+
 import pytest
 
 
@@ -28,3 +30,29 @@ def ctas_config():
             "disposition_to_exit":               {"p_zero": 0.745, "mu_pos": 5.25, "sigma_pos": 1.3, "high": 1440},
         },
     }
+
+
+@pytest.fixture
+def ed_maze(tmp_path):
+    """A Maze built from the bundled small ED layout with an empty ED status."""
+    from maze import Maze
+
+    fork = tmp_path / "fork"
+    sim = tmp_path / "sim"
+    (fork / "reverie").mkdir(parents=True)
+    (sim / "reverie").mkdir(parents=True)
+    status = {
+        "triage_patients": 0,
+        "triage_queue": [],
+        "injuries_zones": {
+            "change_bed_amount": [],
+            "diagnostic room": {},
+            "trauma room": {},
+            "minor injuries zone": {"current_patients": []},
+            "major injuries zone": {"current_patients": []},
+            "bedside_nurse_waiting": [],
+            "pager": [],
+        },
+    }
+    (fork / "reverie" / "maze_status.json").write_text(json.dumps(status))
+    return Maze("small_ed_layout", str(fork), str(sim), 0)